@@ -1,10 +1,10 @@
 import os
+import time
+from collections import namedtuple
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from sqlmodel import Session, select
 from models import User
 
@@ -13,14 +13,23 @@ SECRET_KEY = os.getenv("SECRET_KEY", "7b9e5c4a3d2b1f0e9d8c7b6a543210fedcba987654
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # 24 hours
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# passlib/bcrypt and jose are imported on first use to keep application import fast
+_pwd_context = None
+
+def get_pwd_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -29,11 +38,13 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
-    from db_utils import engine_pumps # Avoid circular import
+    from db_utils import get_pumps_engine # Avoid circular import
+    from jose import JWTError, jwt
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -47,7 +58,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except JWTError:
         raise credentials_exception
     
-    with Session(engine_pumps) as session:
+    with Session(get_pumps_engine()) as session:
         user = session.exec(select(User).where(User.email == email)).first()
         if user is None:
             raise credentials_exception
@@ -62,3 +73,38 @@ async def get_current_admin(current_user: User = Depends(get_current_active_user
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not enough permissions")
     return current_user
+
+# Rate-limit principal: "user:<email>" / "org:<id>" from the bearer token, "ip:<addr>" when anonymous.
+# Decoding the JWT is enough; the org of tokens issued without the "org" claim is looked up and cached.
+Principal = namedtuple("Principal", "user org")
+ORG_CACHE_SECONDS = 300
+_org_cache = {}
+
+def _org_for_email(email):
+    cached = _org_cache.get(email)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    from db_utils import get_conn
+    conn = get_conn()
+    try:
+        row = conn.execute("SELECT org_id FROM users WHERE email=?", (email,)).fetchone()
+    finally:
+        conn.close()
+    org_id = row[0] if row else None
+    _org_cache[email] = (org_id, time.monotonic() + ORG_CACHE_SECONDS)
+    return org_id
+
+def get_principal(request: Request) -> Principal:
+    auth = request.headers.get("authorization", "")
+    if auth[:7].lower() == "bearer ":
+        from jose import JWTError, jwt
+        try:
+            payload = jwt.decode(auth[7:], SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            payload = None
+        email = payload.get("sub") if payload else None
+        if email:
+            org_id = payload["org"] if "org" in payload else _org_for_email(email)
+            return Principal(f"user:{email}", f"org:{org_id}" if org_id is not None else None)
+    host = request.client.host if request.client else "unknown"
+    return Principal(f"ip:{host}", None)
@@ -1,4 +1,4 @@
-import numpy as np
+import json
 
 def parse_float_list(t: str):
     """Parses a space-separated string of numbers into a list of floats."""
@@ -8,7 +8,137 @@ def get_fit(x_vals, y_text):
     """Calculates polynomial coefficients (degree 3) for given X values and Y string data."""
     y_vals = parse_float_list(y_text)
     if len(y_vals) < 2: return [0.0]*4
+    import numpy as np # Imported on first fit, not at application import
     # Polyfit returns coefficients highest degree first
     c = np.polyfit(x_vals, y_vals, min(3, len(x_vals)-1)).tolist()
     # Ensure always 4 coefficients (ax^3 + bx^2 + cx + d)
     return [0.0]*(4-len(c)) + c
+
+def parse_coeffs(t: str):
+    """Parses stored coefficients: JSON list "[a3, a2, a1, a0]" or space-separated string."""
+    if not t or not t.strip():
+        return []
+    t = t.strip()
+    return [float(x) for x in json.loads(t)] if t.startswith('[') else parse_float_list(t)
+
+def coeff_matrix(coeff_lists, width=4):
+    """Stacks coefficient lists (highest degree first) into an (n, width) array, left-padded with zeros."""
+    import numpy as np
+    width = max([width] + [len(c) for c in coeff_lists])
+    m = np.zeros((len(coeff_lists), width))
+    for i, c in enumerate(coeff_lists):
+        if c: m[i, width - len(c):] = c
+    return m
+
+def polyval_rows(coeffs, x):
+    """Evaluates every row of a coefficient matrix at x (scalar, per-row vector or (n, k) grid) via Horner."""
+    import numpy as np
+    x = np.asarray(x, dtype=float)
+    if x.ndim == 2:
+        c = coeffs[:, :, None]
+    else:
+        c = coeffs
+    y = np.zeros(np.broadcast_shapes(c[:, 0].shape, x.shape))
+    for j in range(coeffs.shape[1]):
+        y = y * x + c[:, j]
+    return y
+
+def sample_curves(coeffs, q_min, q_max, samples=100):
+    """Samples every row on its own [q_min, q_max] range: returns (q, y) as (n, samples) arrays."""
+    import numpy as np
+    q_min = np.asarray(q_min, dtype=float)
+    q_max = np.asarray(q_max, dtype=float)
+    q = q_min[:, None] + (q_max - q_min)[:, None] * np.linspace(0.0, 1.0, samples)[None, :]
+    return q, polyval_rows(coeffs, q)
+
+def operating_points(h_coeffs, q_max, q_req, h_req, h_st, steps=2000, chunk=256):
+    """Intersection of each pump H(Q) curve with its system curve H = h_st + k*Q^2 through (q_req, h_req).
+
+    Same rules as the chart in the frontend: Q is scanned from 0 to 1.5*q_max in
+    max(0.05, q_max/steps) steps until the pump head turns negative, the first
+    downward crossing is refined linearly, and without a crossing the duty point
+    itself is used. Returns (q_int, h_int, draw_limit) arrays.
+    """
+    import numpy as np
+    q_max, q_req, h_req, h_st = (np.asarray(a, dtype=float) for a in (q_max, q_req, h_req, h_st))
+    n = len(h_coeffs)
+    k = (h_req - h_st) / np.where(q_req != 0, q_req * q_req, 1.0)
+    step = np.maximum(0.05, q_max / steps)
+    cols = np.arange(int(np.ceil(1.5 * steps)) + 1, dtype=float)
+    q_int = np.zeros(n)
+
+    for start in range(0, n, chunk): # Bounded (chunk, 3001) work arrays
+        sl = slice(start, min(start + chunk, n))
+        grid = step[sl, None] * cols[None, :]
+        h_pump = polyval_rows(h_coeffs[sl], grid)
+        diff = h_pump - (h_st[sl, None] + k[sl, None] * grid * grid)
+        inside = (grid <= 1.5 * q_max[sl, None]) & (np.cumsum(h_pump < 0, axis=1) == 0)
+        cross = inside[:, 1:] & (diff[:, 1:] <= 0) & (diff[:, :-1] > 0) & (diff[:, :1] > 0)
+        found = cross.any(axis=1)
+        rows = np.nonzero(found)[0]
+        j = cross[rows].argmax(axis=1)
+        prev, cur = diff[rows, j], diff[rows, j + 1]
+        q_int[start + rows] = grid[rows, j] + prev / (prev - cur) * step[start + rows]
+
+    h_int = polyval_rows(h_coeffs, q_int)
+    h_pump_at_req = polyval_rows(h_coeffs, q_req)
+    draw_limit = np.where((h_req <= h_pump_at_req) & (q_int > q_req), q_int, q_req)
+    no_point = q_int == 0
+    q_int = np.where(no_point, q_req, q_int)
+    h_int = np.where(no_point, h_req, h_int)
+    return q_int, h_int, draw_limit
+
+def profile_energy(p2_coeffs, q_points, hours):
+    """Energy [kWh] of every row over a load profile: sum of P2(q_i) [kW] * hours_i, one Horner pass."""
+    import numpy as np
+    q = np.asarray(q_points, dtype=float)[None, :]
+    power = polyval_rows(p2_coeffs, np.broadcast_to(q, (len(p2_coeffs), q.shape[1])))
+    return power @ np.asarray(hours, dtype=float)
+
+def npsh_available(surface_pressure_kpa, vapor_pressure_kpa, static_head=0.0, losses=0.0, density=998.0):
+    """NPSHa [m] = (p_surface - p_vapor) / (rho * g) + static head - suction losses."""
+    return (surface_pressure_kpa - vapor_pressure_kpa) * 1000 / (density * 9.81) + static_head - losses
+
+# Operating regions as fractions of the BEP flow (preferred: HI 9.6.3 default)
+POR_RANGE = (0.7, 1.2)
+AOR_RANGE = (0.5, 1.3)
+BEP_FIELDS = ("bep_q", "bep_h", "bep_eff", "por_q_min", "por_q_max", "aor_q_min", "aor_q_max")
+
+def best_efficiency_points(eff_coeffs, h_coeffs, q_min, q_max, samples=201):
+    """BEP flow/head/efficiency plus preferred and allowable flow ranges for every row.
+
+    The efficiency curve is sampled over [q_min, q_max] and the maximum refined with a
+    parabola through its neighbours. The allowable range is clipped to the curve range.
+    Rows without a usable efficiency curve get NaN. Returns a dict of BEP_FIELDS arrays.
+    """
+    import numpy as np
+    q_min = np.asarray(q_min, dtype=float)
+    q_max = np.asarray(q_max, dtype=float)
+    q, eff = sample_curves(eff_coeffs, q_min, q_max, samples)
+    rows = np.arange(len(q))
+    j = eff.argmax(axis=1) if len(q) else np.zeros(0, dtype=int)
+    interior = (j > 0) & (j < samples - 1)
+    jl, jr = np.clip(j - 1, 0, samples - 1), np.clip(j + 1, 0, samples - 1)
+    y0, y1, y2 = eff[rows, jl], eff[rows, j], eff[rows, jr]
+    denom = y0 - 2 * y1 + y2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        offset = np.where(interior & (denom < 0), 0.5 * (y0 - y2) / denom, 0.0)
+    bep_q = q[rows, j] + offset * (q_max - q_min) / (samples - 1)
+    bep_eff = polyval_rows(eff_coeffs, bep_q)
+    valid = (q_max > q_min) & (bep_eff > 0) & (bep_q > 0)
+    nan = np.full(len(q), np.nan)
+    bep_q = np.where(valid, bep_q, nan)
+    return {
+        "bep_q": bep_q,
+        "bep_h": np.where(valid, polyval_rows(h_coeffs, bep_q), nan),
+        "bep_eff": np.where(valid, bep_eff, nan),
+        "por_q_min": bep_q * POR_RANGE[0],
+        "por_q_max": bep_q * POR_RANGE[1],
+        "aor_q_min": np.maximum(bep_q * AOR_RANGE[0], q_min),
+        "aor_q_max": np.minimum(bep_q * AOR_RANGE[1], q_max),
+    }
+
+def bep_fields(eff_coeffs, h_coeffs, q_min, q_max):
+    """best_efficiency_points() for one pump as a {field: float or None} dict."""
+    bep = best_efficiency_points(coeff_matrix([eff_coeffs or []]), coeff_matrix([h_coeffs or []]), [q_min], [q_max])
+    return {k: (float(v[0]) if v[0] == v[0] else None) for k, v in bep.items()}
@@ -0,0 +1,207 @@
+import os
+import shutil
+import threading
+import numpy as np
+from sqlmodel import Session, select, text
+
+from models import Pump
+from calc_utils import parse_coeffs, coeff_matrix
+from spec_utils import NUMERIC_SPECS
+
+# Columnar, in-process view of the pump archive used by selection.
+#
+# Parsing JSON coefficients for every pump on every search is the expensive part,
+# so each worker keeps one Catalogue per scope (org_id, or None for all pumps).
+# It is rebuilt only when the scope's revision in `catalogue_revisions` changes,
+# which makes the cache coherent across worker processes.
+#
+# The arrays (coefficient matrices, limits, BEP columns, numeric specs) are also
+# written once per scope and revision as a snapshot: one .npy file per array in
+# DB_DIR/cache/catalogue/v<SNAPSHOT_VERSION>/<scope>/r<revision>. The first worker
+# to need a revision builds and writes it under a file lock; every other worker maps
+# the files read-only (np.load mmap_mode="r"), so the pages are shared through the OS
+# page cache instead of being parsed and held once per worker. Full pump records (the
+# dicts returned in results) are not part of it: they are read by id for the final
+# matches only (Catalogue.records_at) and a few thousand are kept per catalogue.
+
+SNAPSHOT_VERSION = 3 # Bump when the array layout changes: old snapshots are ignored
+RECORD_CACHE_SIZE = 4096 # Pump dicts kept per catalogue
+RECORD_BATCH = 500 # Ids per query when loading records
+
+
+class Catalogue:
+    """Pump curves as coefficient matrices plus per-pump columns (one row per pump, sorted by id)."""
+
+    def __init__(self, revision, pumps=None, arrays=None, org_id=None, bind=None):
+        self.revision = revision
+        self.org_id = org_id # Scope: one organization, or None for all pumps
+        self._bind = bind # Engine the records are read from
+        self._records = {} # id -> pump dict, insertion ordered (oldest dropped first)
+        self._records_lock = threading.Lock()
+        if arrays is not None: # Mapped from a snapshot
+            for name in ARRAY_FIELDS:
+                setattr(self, name, arrays[name])
+            return
+        self.ids = np.array([p.id for p in pumps], dtype=np.int64)
+
+        curves = {}
+        for field in ("h_coeffs", "p2_coeffs", "eff_coeffs", "npsh_coeffs"):
+            lists = []
+            for p in pumps:
+                try:
+                    lists.append(parse_coeffs(getattr(p, field)))
+                except (ValueError, TypeError):
+                    lists.append([])
+            m = coeff_matrix(lists)
+            # get_fit stores [0, 0, 0, 0] for a curve without points: only non-zero coefficients count as data
+            curves[field] = (m, np.any(m != 0, axis=1))
+
+        self.h, self.has_h = curves["h_coeffs"]
+        self.p2, self.has_p2 = curves["p2_coeffs"]
+        self.eff, self.has_eff = curves["eff_coeffs"]
+        self.npsh, self.has_npsh = curves["npsh_coeffs"]
+        self.q_min = np.array([p.q_min or 0.0 for p in pumps], dtype=float)
+        self.q_max = np.array([p.q_max or 0.0 for p in pumps], dtype=float)
+        # Precomputed BEP / operating regions (NaN when unknown): range checks instead of polynomials
+        for field in ("bep_q", "bep_eff", "por_q_min", "por_q_max", "aor_q_min", "aor_q_max"):
+            setattr(self, field, np.array([getattr(p, field) for p in pumps], dtype=float))
+        # Parsed numeric specs (NaN when unknown) and normalized company names for constraint masks
+        for column, _ in NUMERIC_SPECS.values():
+            setattr(self, column, np.array([getattr(p, column) for p in pumps], dtype=float))
+        self.company = np.array([normalize_company(p.company) for p in pumps], dtype=str)
+        # Per-pump values needed without a full record: chart memo keys, saved duty points, duplicate keys
+        self.pump_revision = np.array([p.revision or 0 for p in pumps], dtype=np.int64)
+        for field in ("q_req", "h_req", "h_st"):
+            setattr(self, field, np.array([getattr(p, field) or 0.0 for p in pumps], dtype=float))
+        self.curve_hash = np.array([(p.curve_hash or "").encode() for p in pumps], dtype="S40")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def records_at(self, rows):
+        """Pump dicts of the given rows, read in batched queries when not loaded yet.
+        None for pumps deleted since the catalogue was built."""
+        ids = [int(self.ids[r]) for r in rows]
+        with self._records_lock:
+            found = {i: self._records[i] for i in ids if i in self._records}
+        missing = [i for i in dict.fromkeys(ids) if i not in found]
+        if missing:
+            with Session(self._bind) as session:
+                for start in range(0, len(missing), RECORD_BATCH):
+                    batch = missing[start:start + RECORD_BATCH]
+                    for p in session.exec(select(Pump).where(Pump.id.in_(batch))).all():
+                        found[p.id] = p.model_dump()
+            with self._records_lock:
+                self._records.update((i, found[i]) for i in missing if i in found)
+                while len(self._records) > RECORD_CACHE_SIZE:
+                    del self._records[next(iter(self._records))]
+        return [found.get(i) for i in ids]
+
+
+ARRAY_FIELDS = ("ids", "h", "has_h", "p2", "has_p2", "eff", "has_eff", "npsh", "has_npsh", "q_min", "q_max",
+                "bep_q", "bep_eff", "por_q_min", "por_q_max", "aor_q_min", "aor_q_max",
+                *(column for column, _ in NUMERIC_SPECS.values()), "company",
+                "pump_revision", "q_req", "h_req", "h_st", "curve_hash")
+
+
+def snapshot_dir(org_id, revision=None):
+    from config import config
+    scope = os.path.join(str(config.DB_DIR), "cache", "catalogue", f"v{SNAPSHOT_VERSION}",
+                         "all" if org_id is None else f"org{org_id}")
+    return scope if revision is None else os.path.join(scope, f"r{revision}")
+
+
+def read_snapshot(org_id, revision):
+    """{array name: read-only memory map} of a snapshot, or None if it was not written yet."""
+    path = snapshot_dir(org_id, revision)
+    try:
+        return {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ARRAY_FIELDS}
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot(org_id, catalogue):
+    """Writes the arrays of a catalogue once per revision (file lock, atomic directory rename)
+    and removes the snapshots of older revisions of the scope."""
+    from lock_utils import file_lock
+    scope = snapshot_dir(org_id)
+    final = snapshot_dir(org_id, catalogue.revision)
+    with file_lock(os.path.join(scope, ".lock")):
+        if not os.path.isdir(final):
+            tmp = f"{final}.{os.getpid()}.tmp"
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+            for name in ARRAY_FIELDS:
+                np.save(os.path.join(tmp, f"{name}.npy"), getattr(catalogue, name), allow_pickle=False)
+            os.rename(tmp, final)
+        # Workers still mapping an old revision keep their pages (POSIX) until they reload
+        for entry in os.listdir(scope):
+            if entry.startswith("r") and entry != os.path.basename(final):
+                shutil.rmtree(os.path.join(scope, entry), ignore_errors=True)
+
+
+def normalize_company(name):
+    return " ".join(str(name or "").lower().split())
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_catalogue_revision(session: Session, org_id=None):
+    if org_id is None:
+        row = session.exec(text("SELECT COALESCE(SUM(revision), 0) FROM catalogue_revisions")).first()
+    else:
+        row = session.exec(text("SELECT revision FROM catalogue_revisions WHERE org_id = :org_id").bindparams(
+            org_id=org_id or 0)).first()
+    return row[0] if row else 0
+
+
+def load_catalogue(session: Session, org_id=None) -> Catalogue:
+    """Returns the cached catalogue for a scope, rebuilding it if another process changed the data."""
+    revision = get_catalogue_revision(session, org_id)
+    cached = _cache.get(org_id)
+    if cached is not None and cached.revision == revision:
+        return cached
+
+    bind = session.get_bind()
+    catalogue = _from_snapshot(session, org_id, revision, bind)
+    if catalogue is None:
+        statement = select(Pump).order_by(Pump.id)
+        if org_id is not None:
+            statement = statement.where(Pump.org_id == org_id)
+        catalogue = Catalogue(revision, session.exec(statement).all(), org_id=org_id, bind=bind)
+        if _snapshots_enabled():
+            try:
+                write_snapshot(org_id, catalogue)
+            except OSError as e:
+                print(f"CATALOGUE: Snapshot of scope {org_id} r{revision} not written: {e}")
+    with _cache_lock:
+        _cache[org_id] = catalogue
+    return catalogue
+
+
+def _snapshots_enabled():
+    from config import config
+    return config.CATALOGUE_SNAPSHOTS
+
+
+def _from_snapshot(session, org_id, revision, bind):
+    if not _snapshots_enabled():
+        return None
+    arrays = read_snapshot(org_id, revision)
+    if arrays is None:
+        return None
+    # Snapshot written in a race with a save (other rows than this revision's): rebuild instead
+    statement = select(Pump.id).order_by(Pump.id)
+    if org_id is not None:
+        statement = statement.where(Pump.org_id == org_id)
+    ids = np.array(session.exec(statement).all(), dtype=np.int64)
+    if not np.array_equal(arrays["ids"], ids):
+        return None
+    return Catalogue(revision, arrays=arrays, org_id=org_id, bind=bind)
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
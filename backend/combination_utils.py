@@ -0,0 +1,109 @@
+import numpy as np
+
+from calc_utils import polyval_rows
+
+# Pump combinations (stations with 2-4 pumps) built from stored cubic H(Q) coefficients.
+#
+# Parallel: flows add at equal head. Series: heads add at equal flow.
+# N identical pumps have an exact cubic of their own (see scale_identical), which
+# keeps the catalogue search a single vectorized pass like the single-pump search.
+# Mixed combinations are composed numerically on a sampled grid.
+
+ARRANGEMENTS = ("parallel", "series")
+
+
+def scale_identical(coeffs, count, arrangement):
+    """Coefficients (highest degree first) of `count` identical pumps as one curve.
+
+    Parallel: H_N(Q) = H(Q / N), i.e. a_j / N^j. Series: H_N(Q) = N * H(Q).
+    `count` may be a scalar or one value per row.
+    """
+    count = np.asarray(count, dtype=float).reshape(-1, 1) if np.ndim(count) else float(count)
+    if arrangement == "series":
+        return coeffs * count
+    powers = np.arange(coeffs.shape[1] - 1, -1, -1, dtype=float)
+    return coeffs / np.power(count, powers)
+
+
+def _sample_rows(coeffs, q_max, samples):
+    q = q_max[:, None] * np.linspace(0.0, 1.0, samples)[None, :]
+    return q, polyval_rows(coeffs, q)
+
+
+def parallel_curve(h_coeffs, q_max, samples=200):
+    """Combined curve of pumps in parallel: returns (q_total, h, q_each) with q_each shaped (pumps, samples).
+
+    Each H(Q) is made non-increasing and inverted on a common head grid. The grid
+    runs from the highest end-of-curve head (every pump still within its range)
+    up to the highest shutoff head; above its own shutoff a pump delivers nothing.
+    """
+    q_max = np.asarray(q_max, dtype=float)
+    q, h = _sample_rows(h_coeffs, q_max, max(samples, 64))
+    h = np.minimum.accumulate(h, axis=1)
+    h_top = float(h[:, 0].max())
+    h_floor = max(float(h[:, -1].max()), 0.0)
+    heads = np.linspace(h_top, h_floor, samples)
+    q_each = np.vstack([
+        np.interp(heads, h[i, ::-1], q[i, ::-1], left=q_max[i], right=0.0) for i in range(len(h_coeffs))
+    ])
+    return q_each.sum(axis=0), heads, q_each
+
+
+def series_curve(h_coeffs, q_max, samples=200):
+    """Combined curve of pumps in series over their common flow range: returns (q, h_total, h_each)."""
+    q_end = float(np.min(q_max)) if len(h_coeffs) else 0.0
+    q = np.linspace(0.0, q_end, samples)
+    h_each = polyval_rows(h_coeffs, q[None, :].repeat(len(h_coeffs), axis=0))
+    return q, h_each.sum(axis=0), h_each
+
+
+def system_k(q_req, h_req, h_st):
+    """Coefficient k of the system curve H = h_st + k * Q^2 through the duty point."""
+    return (h_req - h_st) / (q_req * q_req) if q_req else 0.0
+
+
+def intersect_system(q, h, h_st, k):
+    """First downward crossing of a sampled (increasing q) pump curve with H = h_st + k*Q^2, or None."""
+    diff = h - (h_st + k * q * q)
+    if diff[0] <= 0:
+        return None
+    cross = np.nonzero((diff[1:] <= 0) & (diff[:-1] > 0))[0]
+    if len(cross) == 0:
+        return None
+    j = cross[0]
+    frac = diff[j] / (diff[j] - diff[j + 1])
+    q_op = q[j] + frac * (q[j + 1] - q[j])
+    h_op = h[j] + frac * (h[j + 1] - h[j])
+    return float(q_op), float(h_op)
+
+
+def search_identical(cat, q_req, h_req, tolerance_percent, counts=(2, 3), arrangements=ARRANGEMENTS):
+    """Stations of N identical catalogue pumps meeting a duty point.
+
+    Returns (rows, counts, arrangements, h_at_point, deviation, q_each) arrays, one
+    entry per matching (pump, N, arrangement), sorted by deviation and then by the
+    number of pumps. Pumps whose per-pump flow is out of range are pruned before
+    any curve is evaluated.
+    """
+    blocks = []
+    for arrangement in arrangements:
+        for count in counts:
+            q_each = q_req / count if arrangement == "parallel" else q_req
+            # Same range check as the single-pump search, for the flow through each pump
+            keep = cat.has_h & ~((cat.q_max > 0) & (q_each > cat.q_max * 1.15))
+            rows = np.nonzero(keep)[0]
+            if len(rows) == 0:
+                continue
+            h_at = polyval_rows(scale_identical(cat.h[rows], count, arrangement), q_req)
+            deviation = np.abs(h_at - h_req) / h_req * 100
+            ok = np.isfinite(deviation) & (deviation <= tolerance_percent)
+            rows = rows[ok]
+            blocks.append((rows, np.full(len(rows), count), np.full(len(rows), arrangement, dtype=object),
+                           h_at[ok], deviation[ok], np.full(len(rows), q_each, dtype=float)))
+
+    if not blocks:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([], dtype=object), np.array([]), np.array([]), np.array([])
+    rows, counts_out, arr_out, h_at, deviation, q_each = (np.concatenate(parts) for parts in zip(*blocks))
+    order = np.lexsort((counts_out, deviation))
+    return rows[order], counts_out[order], arr_out[order], h_at[order], deviation[order], q_each[order]
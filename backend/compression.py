@@ -0,0 +1,131 @@
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError: # Optional: gzip only
+    brotli = None
+
+# Negotiated response compression (br / gzip) as a pure ASGI middleware.
+#
+# Only text-like payloads are compressed (JSON, HTML, JS, CSS, SVG, CSV); PDFs and
+# images are already compressed and are passed through untouched. Single-message
+# bodies are compressed in one shot with an exact Content-Length, streamed bodies
+# are compressed incrementally.
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "text/", "application/javascript", "image/svg+xml",
+    "application/xml", "application/x-ndjson",
+)
+
+
+def _parse_accept_encoding(value):
+    accepted = {}
+    for part in value.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(accept_encoding):
+    accepted = _parse_accept_encoding(accept_encoding or "")
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+class _Encoder:
+    def __init__(self, encoding, gzip_level, brotli_quality):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._c = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._c.finish() if self.encoding == "br" else self._c.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=1024, gzip_level=6, brotli_quality=4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict((k.lower(), v) for k, v in scope.get("headers", []))
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        encoder = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if encoder is None:
+                resp_headers = dict((k.lower(), v) for k, v in start_message.get("headers", []))
+                content_type = resp_headers.get(b"content-type", b"").decode("latin-1")
+                if (b"content-encoding" in resp_headers
+                        or not content_type.startswith(COMPRESSIBLE_TYPES)
+                        or (not more_body and len(body) < self.minimum_size)):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                encoder = _Encoder(encoding, self.gzip_level, self.brotli_quality)
+                new_headers = [(k, v) for k, v in start_message.get("headers", [])
+                               if k.lower() not in (b"content-length", b"vary")]
+                vary = resp_headers.get(b"vary")
+                new_headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+                new_headers.append((b"content-encoding", encoding.encode()))
+                if not more_body:
+                    if encoding == "gzip":
+                        compressed = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+                    else:
+                        compressed = brotli.compress(body, quality=self.brotli_quality)
+                    new_headers.append((b"content-length", str(len(compressed)).encode()))
+                    await send({**start_message, "headers": new_headers})
+                    await send({"type": "http.response.body", "body": compressed, "more_body": False})
+                    return
+                await send({**start_message, "headers": new_headers})
+
+            chunk = encoder.compress(body) if body else b""
+            if not more_body:
+                chunk += encoder.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
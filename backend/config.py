@@ -22,6 +22,43 @@ class Config:
     # Server Settings
     API_HOST = os.getenv("API_HOST", "0.0.0.0")
     API_PORT = int(os.getenv("API_PORT", "8000"))
+    # Number of uvicorn worker processes (`python manage.py serve`); WEB_CONCURRENCY is the common alias
+    WORKERS = int(os.getenv("WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
+    
+    # Fast-start mode: skip migrations on application startup.
+    # Run `python manage.py migrate` as a pre-start command instead (see Dockerfile).
+    FAST_START = os.getenv("FAST_START", "false").lower() in ("1", "true", "yes")
+    
+    # Request logging: fraction of requests logged as structured JSON lines.
+    # Errors (5xx) and requests slower than SLOW_REQUEST_MS are always logged.
+    LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+    SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+    
+    # Background job threads per worker process (imports, backups, bulk recomputation)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    
+    # Worker processes for bulk datasheet rendering and curve extraction (per job)
+    RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+    
+    # Disk cache for drawing page tiles (MB); least recently used tiles are removed above it
+    TILE_CACHE_MB = int(os.getenv("TILE_CACHE_MB", "512"))
+    
+    # Selection responses kept per worker (LRU, keyed by catalogue revision); 0 disables the cache
+    SELECTION_CACHE_SIZE = int(os.getenv("SELECTION_CACHE_SIZE", "256"))
+    
+    # Selection arrays shared between workers as memory-mapped .npy snapshots (DB_DIR/cache/catalogue)
+    CATALOGUE_SNAPSHOTS = os.getenv("CATALOGUE_SNAPSHOTS", "true").lower() in ("1", "true", "yes")
+    
+    # Upper limit for one uploaded drawing (MB); uploads are streamed, never held in memory
+    MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))
+    
+    # Rate limits per user/organization (policies in ratelimit.py, RATE_LIMIT_<SCOPE> overrides).
+    # RATE_LIMIT_DB: optional SQLite file to share buckets between workers and restarts.
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+    RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", "")
+    
+    # Responses smaller than this (bytes) are not compressed
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
     
     # Database Configuration
     # DB_DIR defaults to 'backend' inside project root if not specified
@@ -40,6 +77,8 @@ class Config:
     DB_PUMPS = DB_DIR / os.getenv("DB_PUMPS", "pumps.db")
     DB_SENSITIVE = DB_DIR / os.getenv("DB_SENSITIVE", "sensitive.db")
     DB_DRAWINGS = DB_DIR / os.getenv("DB_DRAWINGS", "drawings.db")
+    # Background job bookkeeping: separate file, so progress updates never wait on a job's own write transaction
+    DB_JOBS = DB_DIR / os.getenv("DB_JOBS", "jobs.db")
     
     # Uploads Configuration
     _upload_dir_raw = os.getenv("UPLOAD_DIR", "backend/uploads")
@@ -59,6 +98,8 @@ class Config:
         print(f"Active DBs: {cls.DB_PUMPS.name}, {cls.DB_SENSITIVE.name}")
         print(f"Uploads: {cls.UPLOAD_DIR}")
         print(f"Server: {cls.API_HOST}:{cls.API_PORT}")
+        print(f"Workers: {cls.WORKERS}")
+        print(f"Fast Start: {cls.FAST_START}")
         print(f"---------------------")
 
 config = Config()
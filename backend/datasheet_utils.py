@@ -0,0 +1,247 @@
+import glob
+import importlib.util
+import io
+import os
+import zipfile
+
+from calc_utils import parse_coeffs, coeff_matrix, sample_curves, operating_points
+
+# Server-side pump datasheets (the report the frontend builds with html2canvas + pdf-lib).
+#
+# Page 1 holds the specs and two charts drawn from the stored coefficients:
+# H + efficiency with the system curve and operating point, and P2 + NPSH. The stored
+# drawing follows (PDF pages appended, images placed on an A4 page). Rendered files
+# are cached on disk per pump revision, so unchanged pumps are never drawn twice.
+# Matplotlib is used through its object API only (no pyplot state), which is thread safe.
+# It is optional (datasheet endpoints answer 503 without it) and, like numpy and pypdf,
+# imported on the first render rather than at application import.
+
+FORMATS = {"pdf": "application/pdf", "png": "image/png"}
+LAYOUT_VERSION = 1 # Bump when the layout changes to invalidate cached files
+A4_INCHES = (8.27, 11.69)
+PNG_DPI = 150
+SAMPLES = 200
+
+SPEC_FIELDS = (
+    ("company", "Производитель"), ("oem_name", "OEM"), ("rpm", "Частота вращения, об/мин"),
+    ("p2_nom", "P2 ном., кВт"), ("dn_suction", "DN всас."), ("dn_discharge", "DN напор."),
+    ("impeller_actual", "Рабочее колесо, мм"),
+)
+
+
+def available():
+    return importlib.util.find_spec("matplotlib") is not None
+
+
+def cache_path(pump, fmt):
+    from config import config
+    return os.path.join(str(config.DB_DIR), "cache", "datasheets", str(pump.get("org_id") or 0),
+                        f"{pump['id']}_r{pump.get('revision') or 0}_v{LAYOUT_VERSION}.{fmt}")
+
+
+def load_drawing(pump):
+    """(bytes, mime) of the pump's stored drawing, or None."""
+    path = pump.get("drawing_path")
+    if not path:
+        return None
+    if path.startswith("/api/drawings/"):
+        from db_utils import get_files_conn
+        conn = get_files_conn()
+        try:
+            row = conn.execute("SELECT data, mime, filename FROM files WHERE id=?", (int(path.split("/")[-1]),)).fetchone()
+        finally:
+            conn.close()
+        if not row or not row[0]:
+            return None
+        data, mime, filename = row
+    else: # Legacy file in UPLOAD_DIR
+        from config import config
+        legacy = os.path.join(str(config.UPLOAD_DIR), os.path.basename(path))
+        if not os.path.exists(legacy):
+            return None
+        with open(legacy, "rb") as f:
+            data = f.read()
+        mime = None
+    if not mime:
+        from upload_utils import sniff_mime
+        mime = sniff_mime(data[:16])
+    return bytes(data), mime
+
+
+def _curve(pump, field, q):
+    try:
+        coeffs = parse_coeffs(pump.get(field))
+    except (ValueError, TypeError):
+        return None
+    if not coeffs:
+        return None
+    return sample_curves(coeff_matrix([coeffs]), [q[0]], [q[-1]], len(q))[1][0]
+
+
+def chart_figure(pump):
+    """A4 figure with the specs table and the two chart panels."""
+    import numpy as np
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=A4_INCHES)
+    fig.suptitle(pump.get("name") or f"Pump {pump['id']}", fontsize=14, fontweight="bold")
+    grid = fig.add_gridspec(3, 1, height_ratios=(0.7, 2, 2), hspace=0.3, top=0.93, bottom=0.06)
+
+    info = fig.add_subplot(grid[0])
+    info.axis("off")
+    specs = [(label, pump.get(field)) for field, label in SPEC_FIELDS if pump.get(field)]
+    if pump.get("bep_q") and pump.get("bep_h") is not None and pump.get("bep_eff") is not None:
+        specs.append(("Точка макс. КПД", f"Q={pump['bep_q']:.1f} м³/ч, H={pump['bep_h']:.1f} м, КПД={pump['bep_eff']:.1f} %"))
+    info.text(0.0, 1.0, "\n".join(f"{label}: {value}" for label, value in specs), va="top", fontsize=9)
+
+    q_min = float(pump.get("q_min") or 0.0)
+    q_max = float(pump.get("q_max") or 0.0) or 1.0
+    q = np.linspace(q_min, q_max, SAMPLES)
+    q_axis = (0.0, q_max * 1.1)
+
+    ax_h = fig.add_subplot(grid[1])
+    ax_eff = ax_h.twinx()
+    h = _curve(pump, "h_coeffs", q)
+    if h is not None:
+        ax_h.plot(q, h, color="#004085", linewidth=2, label="H")
+        q_req, h_req, h_st = (float(pump.get(f) or 0.0) for f in ("q_req", "h_req", "h_st"))
+        if q_req > 0 and h_req > 0:
+            q_int, h_int, draw_limit = operating_points(
+                coeff_matrix([parse_coeffs(pump["h_coeffs"])]), [q_max], [q_req], [h_req], [h_st])
+            q_sys = np.linspace(0.0, float(draw_limit[0]), 100)
+            k = (h_req - h_st) / (q_req * q_req)
+            ax_h.plot(q_sys, h_st + k * q_sys * q_sys, "--", color="#666666", linewidth=1.5, label="Сеть")
+            ax_h.plot([q_req], [h_req], "o", color="#dc3545", label="Задание")
+            ax_h.plot([q_int[0]], [h_int[0]], "o", color="#28a745", label="РТ")
+            q_axis = (0.0, max(q_axis[1], float(draw_limit[0]) * 1.05))
+    eff = _curve(pump, "eff_coeffs", q)
+    if eff is not None:
+        ax_eff.plot(q, eff, color="#28a745", linewidth=2, label="КПД")
+    ax_h.set_ylabel("H [м]")
+    ax_eff.set_ylabel("КПД [%]")
+
+    ax_p2 = fig.add_subplot(grid[2], sharex=ax_h)
+    ax_npsh = ax_p2.twinx()
+    p2 = _curve(pump, "p2_coeffs", q)
+    if p2 is not None:
+        ax_p2.plot(q, p2, color="#ffa500", linewidth=2, label="P2")
+    npsh = _curve(pump, "npsh_coeffs", q)
+    if npsh is not None:
+        ax_npsh.plot(q, npsh, color="#dc3545", linewidth=2, label="NPSH")
+    ax_p2.set_ylabel("P2 [кВт]")
+    ax_npsh.set_ylabel("NPSH [м]")
+    ax_p2.set_xlabel("Q [м³/ч]")
+
+    for left, right in ((ax_h, ax_eff), (ax_p2, ax_npsh)):
+        left.set_xlim(*q_axis)
+        left.grid(True, alpha=0.3)
+        lines = left.get_lines() + right.get_lines()
+        if lines:
+            left.legend(lines, [line.get_label() for line in lines], loc="upper right", fontsize=8)
+    return fig
+
+
+def _image_page(data):
+    from matplotlib import image as mpimg
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=A4_INCHES)
+    ax = fig.add_axes((0.03, 0.03, 0.94, 0.94))
+    ax.imshow(mpimg.imread(io.BytesIO(data)))
+    ax.axis("off")
+    return fig
+
+
+def render_datasheet(pump, fmt="pdf", drawing=None):
+    """Datasheet bytes: PNG of the chart page, or a PDF with the drawing appended."""
+    if fmt == "png":
+        buf = io.BytesIO()
+        chart_figure(pump).savefig(buf, format="png", dpi=PNG_DPI, facecolor="white")
+        return buf.getvalue()
+
+    from matplotlib.backends.backend_pdf import PdfPages
+    data, mime = drawing if drawing else (None, None)
+    buf = io.BytesIO()
+    with PdfPages(buf) as pdf:
+        pdf.savefig(chart_figure(pump))
+        if data and mime in ("image/png", "image/jpeg"):
+            pdf.savefig(_image_page(data))
+    if not data or mime != "application/pdf":
+        return buf.getvalue()
+    try:
+        import pypdf
+    except ImportError: # Optional: without it a PDF drawing is not appended to the datasheet
+        print(f"DATASHEET: pypdf not installed, drawing of pump {pump['id']} not appended")
+        return buf.getvalue()
+    writer = pypdf.PdfWriter()
+    writer.append(pypdf.PdfReader(io.BytesIO(buf.getvalue())))
+    try:
+        writer.append(pypdf.PdfReader(io.BytesIO(data)))
+    except Exception as e: # A broken drawing must not cost the whole datasheet
+        print(f"DATASHEET: drawing of pump {pump['id']} not appended: {e}")
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def get_datasheet(pump, fmt="pdf"):
+    """Path of the cached datasheet for the pump's current revision, rendering it on a miss."""
+    path = cache_path(pump, fmt)
+    if os.path.exists(path):
+        return path
+    data = render_datasheet(pump, fmt, load_drawing(pump) if fmt == "pdf" else None)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path) # Readers never see a partial file
+    for stale in glob.glob(os.path.join(os.path.dirname(path), f"{pump['id']}_r*.{fmt}")):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return path
+
+
+def _render_one(args):
+    """Process pool entry point: (pump, fmt) -> (pump id, path or None, error)."""
+    pump, fmt = args
+    try:
+        return pump["id"], get_datasheet(pump, fmt), None
+    except Exception as e:
+        return pump["id"], None, str(e)
+
+
+def archive_name(pump, fmt):
+    name = "".join(c if c.isalnum() or c in "-_." else "_" for c in (pump.get("name") or "pump"))
+    return f"{pump['id']}_{name}.{fmt}"
+
+
+def build_zip(pumps, fmt, out_path, workers, progress=None):
+    """Renders datasheets in `workers` processes (cached ones are reused) and zips them to out_path.
+
+    Returns (count, errors) with errors as {pump_id: message}.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    by_id = {p["id"]: p for p in pumps}
+    done = []
+    errors = {}
+    # spawn: the caller runs in a thread of a multi-threaded server, where fork is unsafe
+    with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn")) as pool:
+        for i, (pid, path, error) in enumerate(pool.map(_render_one, [(p, fmt) for p in pumps]), 1):
+            if path:
+                done.append((pid, path))
+            else:
+                errors[pid] = error
+            if progress:
+                progress(0.9 * i / len(pumps), f"{i}/{len(pumps)} datasheets rendered")
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp = f"{out_path}.tmp"
+    # PDF/PNG are already compressed
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_STORED) as zf:
+        for pid, path in done:
+            zf.write(path, archive_name(by_id[pid], fmt))
+    os.replace(tmp, out_path)
+    return len(done), errors
@@ -12,14 +12,70 @@ UPLOAD_DIR = str(config.UPLOAD_DIR)
 # But logic seems to not rely on BASE_DIR except for paths which are now from config.
 
 
-from sqlmodel import create_engine, Session, SQLModel, select, text
-from models import Pump, PrivateData, File
+import threading
+from sqlmodel import create_engine, Session
+from metrics import connect, instrument_engine
 
 # Engines
+# Created lazily on first use so importing the app (and every uvicorn worker) stays cheap.
 # check_same_thread=False is needed for SQLite in multithreaded (FastAPI) env
-engine_pumps = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False})
-engine_sensitive = create_engine(f"sqlite:///{SENSITIVE_DB_PATH}", connect_args={"check_same_thread": False})
-engine_files = create_engine(f"sqlite:///{FILES_DB_PATH}", connect_args={"check_same_thread": False})
+_engines = {}
+_engines_lock = threading.Lock()
+
+def _get_engine(path):
+    engine = _engines.get(path)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(path)
+            if engine is None:
+                engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+                instrument_engine(engine, os.path.basename(path))
+                _follow_file(engine, path)
+                _engines[path] = engine
+    return engine
+
+def _file_id(path):
+    try:
+        st = os.stat(path)
+        return st.st_dev, st.st_ino
+    except OSError:
+        return None
+
+def _follow_file(engine, path):
+    """Drops pooled connections to a file that was replaced (import_db renames a new file over it,
+    possibly in another worker process): each connection remembers the inode it opened and is
+    discarded at checkout when the path names a different file, so the pool reconnects."""
+    from sqlalchemy import event, exc
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_conn, record):
+        record.info["ruspump_file"] = _file_id(path)
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        if record.info.get("ruspump_file") != _file_id(path):
+            raise exc.DisconnectionError(f"{os.path.basename(path)} was replaced")
+
+def get_pumps_engine():
+    return _get_engine(DB_PATH)
+
+def get_sensitive_engine():
+    return _get_engine(SENSITIVE_DB_PATH)
+
+def get_files_engine():
+    return _get_engine(FILES_DB_PATH)
+
+_LEGACY_ENGINE_NAMES = {
+    "engine_pumps": get_pumps_engine,
+    "engine_sensitive": get_sensitive_engine,
+    "engine_files": get_files_engine,
+}
+
+def __getattr__(name):
+    # Keeps `from db_utils import engine_pumps` working for older modules
+    if name in _LEGACY_ENGINE_NAMES:
+        return _LEGACY_ENGINE_NAMES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def get_db_path():
     return DB_PATH
@@ -32,180 +88,127 @@ def get_files_db_path():
 
 # Legacy Raw Connections
 def get_conn():
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
 def get_sensitive_conn():
-    conn = sqlite3.connect(SENSITIVE_DB_PATH)
+    conn = connect(SENSITIVE_DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
     
 def get_files_conn():
-    return sqlite3.connect(FILES_DB_PATH)
+    return connect(FILES_DB_PATH)
 
 # New ORM Sessions
 def get_session():
-    with Session(engine_pumps) as session:
+    with Session(get_pumps_engine()) as session:
         yield session
 
 def get_sensitive_session():
-    with Session(engine_sensitive) as session:
+    with Session(get_sensitive_engine()) as session:
         yield session
 
 def get_files_session():
-    with Session(engine_files) as session:
+    with Session(get_files_engine()) as session:
         yield session
 
-def init_db():
-    """Initializes the database tables and performs necessary migrations."""
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    
-    # ensure tables exist via SQLModel
-    SQLModel.metadata.create_all(engine_pumps)
-    SQLModel.metadata.create_all(engine_sensitive)
-    SQLModel.metadata.create_all(engine_files)
-    
-    # 1. Main Data DB (Public/Technical) - Legacy Migration Check
-    conn = sqlite3.connect(DB_PATH)
-    # Note: create_all handles creation, but we keep this for consistency if needed
-    # ... migration logic follows ...
-    conn.execute("""CREATE TABLE IF NOT EXISTS pumps (
-        id INTEGER PRIMARY KEY AUTOINCREMENT, 
-        name TEXT, oem_name TEXT, company TEXT, executor TEXT,
-        dn_suction TEXT, dn_discharge TEXT, rpm TEXT, p2_nom TEXT, impeller_actual TEXT,
-        q_text TEXT, h_text TEXT, npsh_text TEXT, p2_text TEXT, eff_text TEXT,
-        h_coeffs TEXT, eff_coeffs TEXT, p2_coeffs TEXT, npsh_coeffs TEXT,
-        q_max REAL, q_min REAL, h_max REAL, h_min REAL, q_req REAL, h_req REAL,
-        drawing_path TEXT, drawing_filename TEXT, created_at TEXT, price REAL, currency TEXT, comment TEXT, updated_at TEXT, save_source TEXT
-    )""")
-    
-    # Simple Migration System for Columns
-    columns_to_ensure = [
-        ("h_max", "REAL"), ("h_min", "REAL"), ("q_req", "REAL"), ("h_req", "REAL"), 
-        ("q_max", "REAL"), ("q_min", "REAL"), ("h_st", "REAL"),
-        ("drawing_filename", "TEXT"),
-        ("price", "REAL"), ("currency", "TEXT"), ("comment", "TEXT"), ("updated_at", "TEXT"), ("save_source", "TEXT"),
-        ("org_id", "INTEGER")
-    ]
-    for col_name, col_type in columns_to_ensure:
-        try: 
-            conn.execute(f"ALTER TABLE pumps ADD COLUMN {col_name} {col_type}")
-            conn.commit()
-            print(f"Migration: Added column {col_name}")
-        except sqlite3.OperationalError as e:
-            if "duplicate column name" in str(e).lower():
-                pass # Already exists
-            else:
-                print(f"Migration Error on {col_name}: {e}")
-            
-    conn.commit()
-    
-    # 2. Sensitive DB (Private: Price, Original Name)
-    # Check if we need to migrate data from pumps.db -> sensitive.db
-    sensitive_exists = os.path.exists(SENSITIVE_DB_PATH)
-    conn_sens = sqlite3.connect(SENSITIVE_DB_PATH)
-    conn_sens.execute("""CREATE TABLE IF NOT EXISTS private_data (
-        id INTEGER PRIMARY KEY,
-        original_name TEXT,
-        price REAL,
-        currency TEXT
-    )""")
-    
-    # MIGRATION: If pumps.db has data but sensitive.db was just created (or is empty), migrate.
-    # We check if 'private_data' is empty.
-    count = conn_sens.execute("SELECT count(*) FROM private_data").fetchone()[0]
-    
-    if count == 0:
-        print("MIGRATION: Moving sensitive data to separate database...")
-        # Select sensitive data from public DB
-        rows = conn.execute("SELECT id, name, price, currency FROM pumps").fetchall()
-        migrated_count = 0
-        for row in rows:
-            rid, rname, rprice, rcurr = row
-            # If has sensitive data
-            if rname or rprice or rcurr:
-                conn_sens.execute("INSERT OR REPLACE INTO private_data (id, original_name, price, currency) VALUES (?, ?, ?, ?)", 
-                                  (rid, rname, rprice, rcurr))
-                migrated_count += 1
-                
-        if migrated_count > 0:
-            conn_sens.commit()
-            print(f"MIGRATION: Moved {migrated_count} records to sensitive.db")
-            
-            # OPTIONAL: Clear data from public DB immediately?
-            # Better to do it safe: update public db to use oem_name as name (if empty) or blank, and zero price.
-            # We will set 'name' = 'oem_name' (so list is not empty visually), and price=0.
-            conn.execute("UPDATE pumps SET name = oem_name, price = 0, currency = ''")
-            conn.commit()
-            print("MIGRATION: Cleared sensitive data from public pumps.db")
-            
-    conn_sens.close()
-
-    # MIGRATION: Synchronize drawing_filename with drawings.db
+# Catalogue Revisions
+# Every change to an organization's pumps increments its revision in pumps.db.
+# Worker processes compare it with the revision their in-process caches were built at.
+def bump_revision(conn, org_id, step=1):
+    """Increments and returns the catalogue revision of an organization (caller commits)."""
+    org_key = org_id or 0
+    conn.execute("""INSERT INTO catalogue_revisions (org_id, revision) VALUES (?, ?)
+        ON CONFLICT(org_id) DO UPDATE SET revision = revision + excluded.revision""", (org_key, step))
+    return conn.execute("SELECT revision FROM catalogue_revisions WHERE org_id=?", (org_key,)).fetchone()[0]
+
+def bump_all_revisions(conn, step=1):
+    """Invalidates every organization, e.g. after a bulk import or adoption (caller commits).
+
+    Every pump is re-stamped with its organization's new revision, so clients syncing
+    through /api/pumps/changes re-download the whole archive.
+    """
+    org_ids = {r[0] or 0 for r in conn.execute("SELECT DISTINCT org_id FROM pumps").fetchall()}
+    org_ids |= {r[0] for r in conn.execute("SELECT org_id FROM catalogue_revisions").fetchall()}
+    for org_id in org_ids:
+        bump_revision(conn, org_id, step)
+    conn.execute("""UPDATE pumps SET revision = (
+        SELECT r.revision FROM catalogue_revisions r WHERE r.org_id = COALESCE(pumps.org_id, 0))""")
+
+def reset_all_revisions(conn):
+    """Sets every organization's reset floor to its current revision (caller commits).
+
+    /api/pumps/changes answers reset=true for any `since` below the floor, so clients
+    drop their local copy instead of applying changes to a replaced archive.
+    """
+    conn.execute("UPDATE catalogue_revisions SET reset_revision = revision")
+
+def get_reset_revision(conn, org_id):
+    row = conn.execute("SELECT reset_revision FROM catalogue_revisions WHERE org_id=?", (org_id or 0,)).fetchone()
+    return row[0] if row else 0
+
+def stamp_pump(conn, pump_id, org_id):
+    """Bumps the org revision and stamps one saved pump with it (caller commits)."""
+    rev = bump_revision(conn, org_id)
+    conn.execute("UPDATE pumps SET revision=? WHERE id=? AND org_id IS ?", (rev, pump_id, org_id))
+    return rev
+
+def add_tombstone(conn, pump_id, org_id):
+    """Bumps the org revision and records a deletion for incremental sync (caller commits)."""
+    from datetime import datetime
+    rev = bump_revision(conn, org_id)
+    conn.execute("INSERT INTO pump_tombstones (id, org_id, revision, deleted_at) VALUES (?, ?, ?, ?)",
+                 (pump_id, org_id, rev, datetime.now().strftime("%d.%m.%Y %H:%M")))
+    return rev
+
+def merge_private_data(pumps_list):
+    """Overlays original name, price and currency from sensitive.db onto pump dicts (one batched query)."""
+    if not pumps_list:
+        return pumps_list
+    import json
+    conn_s = get_sensitive_conn()
     try:
-        rows = conn.execute("SELECT id, drawing_path, drawing_filename FROM pumps WHERE drawing_path LIKE '/api/drawings/%'").fetchall()
-        if rows:
-            print(f"MIGRATION: Synchronizing filenames for {len(rows)} records...")
-            conn_f = sqlite3.connect(FILES_DB_PATH)
-            for rid, dpath, dname in rows:
-                try:
-                    fid = int(str(dpath).split('/')[-1])
-                    res = conn_f.execute("SELECT filename FROM files WHERE id=?", (fid,)).fetchone()
-                    if res and res[0]:
-                        actual_name = str(res[0])
-                        # Update if missing, numeric (from previous fix), or different
-                        is_numeric = dname and str(dname).isdigit()
-                        if not dname or is_numeric or dname != actual_name:
-                            conn.execute("UPDATE pumps SET drawing_filename=? WHERE id=?", (actual_name, rid))
-                            print(f"  Synced record {rid}: {actual_name}")
-                except: pass
-            conn_f.close()
-            conn.commit()
-    except Exception as e:
-        print(f"MIGRATION ERROR: {e}")
-
-    conn.close()
-    
-    # 3. Files/Blob DB
-    conn_files = sqlite3.connect(FILES_DB_PATH)
-    conn_files.execute("CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT, data BLOB, org_id INTEGER)")
+        rows = conn_s.execute("""SELECT id, original_name, price, currency FROM private_data
+            WHERE id IN (SELECT value FROM json_each(?))""", (json.dumps([p["id"] for p in pumps_list]),)).fetchall()
+    finally:
+        conn_s.close()
+    sens_map = {r["id"]: r for r in rows}
+    for p in pumps_list:
+        s = sens_map.get(p["id"])
+        if s is None: continue
+        if s["original_name"]: p["name"] = s["original_name"]
+        if s["price"]: p["price"] = s["price"]
+        if s["currency"]: p["currency"] = s["currency"]
+    return pumps_list
+
+def get_private_prices(ids):
+    """Purchase price and currency per pump id from sensitive.db (one batched query): {id: (price, currency)}."""
+    if len(ids) == 0:
+        return {}
+    import json
+    conn_s = get_sensitive_conn()
     try:
-        conn_files.execute("ALTER TABLE files ADD COLUMN org_id INTEGER")
-        conn_files.commit()
-    except sqlite3.OperationalError:
-        pass # Already exists
-    conn_files.close()
+        rows = conn_s.execute("""SELECT id, price, currency FROM private_data
+            WHERE id IN (SELECT value FROM json_each(?))""", (json.dumps([int(i) for i in ids]),)).fetchall()
+    finally:
+        conn_s.close()
+    return {r["id"]: (r["price"] or 0.0, r["currency"]) for r in rows}
+
+def get_revision(conn, org_id=None):
+    """Current revision of one organization; with org_id=None, of the whole catalogue."""
+    if org_id is None:
+        return conn.execute("SELECT COALESCE(SUM(revision), 0) FROM catalogue_revisions").fetchone()[0]
+    row = conn.execute("SELECT revision FROM catalogue_revisions WHERE org_id=?", (org_id or 0,)).fetchone()
+    return row[0] if row else 0
 
-    conn_files.close()
+def init_db():
+    """Initializes the database tables and applies pending schema migrations (no-op when up to date).
 
-    # MIGRATION: Auto-adopt orphaned records to the first organization if one exists
-    # Using raw SQL to be 100% sure it executes during init_db correctly
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        
-        # Check if an organization exists (take the LATEST one, as the user probably just created it)
-        org_row = conn.execute("SELECT id FROM organizations ORDER BY id DESC LIMIT 1").fetchone()
-        if org_row:
-            org_id = org_row['id']
-            # Adoption for pumps ONLY if they are NULL
-            # We don't want to move records that already belong to someone
-            res_p = conn.execute("UPDATE pumps SET org_id = ? WHERE org_id IS NULL", (org_id,))
-            if res_p.rowcount > 0:
-                print(f"MIGRATION: Successfully adopted {res_p.rowcount} orphaned pumps to Org ID {org_id}")
-            
-            # Adoption for files
-            conn_f = sqlite3.connect(FILES_DB_PATH)
-            res_f = conn_f.execute("UPDATE files SET org_id = ? WHERE org_id IS NULL", (org_id,))
-            if res_f.rowcount > 0:
-                print(f"MIGRATION: Successfully adopted {res_f.rowcount} orphaned files to Org ID {org_id}")
-            conn_f.commit()
-            conn_f.close()
-            
-            conn.commit()
-        else:
-            print("MIGRATION: No organizations found yet to adopt legacy data.")
-        conn.close()
-    except Exception as e:
-        print(f"MIGRATION ERROR in auto-adoption: {e}")
+    Guarded by a file lock so that only one of several starting workers migrates.
+    """
+    from migrations import migrate
+    from lock_utils import file_lock
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    with file_lock(os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), ".init_db.lock")):
+        migrate(DB_PATH, SENSITIVE_DB_PATH, FILES_DB_PATH)
@@ -0,0 +1,104 @@
+import hashlib
+import json
+
+from calc_utils import polyval_rows
+
+# Duplicate detection for the pump archive.
+#
+# curve_hash: SHA-1 of the coefficients (6 significant digits), flow range and
+# normalized identifying metadata. Equal hashes are exact duplicates: a re-upload of
+# the same sheet or an unchanged clone saved through original_id.
+# curve_signature: H(Q) sampled at SIGNATURE_POINTS evenly spaced fractions of the flow range and
+# quantized on a log scale in SIGNATURE_STEP buckets, plus the quantized range. Pumps
+# whose curves agree within a few percent share it (near duplicates: refits, retyped
+# points, renamed copies). Values next to a bucket edge can land in neighbouring
+# buckets, so the signature finds most near duplicates, not all of them.
+# Both are stored on the pump and indexed with org_id. numpy is imported inside the
+# functions that need it: the pumps router imports this module at application import.
+
+SIGNATURE_POINTS = 5
+SIGNATURE_STEP = 0.03 # 3% buckets
+META_FIELDS = ("company", "rpm", "impeller_actual", "dn_suction", "dn_discharge", "p2_nom")
+
+
+def _norm_text(value):
+    return " ".join(str(value or "").lower().split())
+
+
+def _norm_coeffs(coeffs):
+    return [float(f"{float(c):.6g}") for c in (coeffs or [])]
+
+
+def curve_hash(h, eff, p2, npsh, q_min, q_max, name="", **meta):
+    """Exact-match key of a pump: normalized curves, range, name and META_FIELDS."""
+    payload = {
+        "curves": [_norm_coeffs(c) for c in (h, eff, p2, npsh)],
+        "range": [float(f"{float(q_min or 0):.6g}"), float(f"{float(q_max or 0):.6g}")],
+        "name": _norm_text(name),
+        **{f: _norm_text(meta.get(f)) for f in META_FIELDS},
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def signature_matrix(h_coeffs, q_min, q_max):
+    """Quantized H(Q) shape of every row as an int matrix (n, SIGNATURE_POINTS + 1)."""
+    import numpy as np
+    q_min = np.asarray(q_min, dtype=float)
+    q_max = np.asarray(q_max, dtype=float)
+    q = q_min[:, None] + np.maximum(q_max - q_min, 0.0)[:, None] * np.linspace(0.0, 1.0, SIGNATURE_POINTS)[None, :]
+    h = polyval_rows(h_coeffs, q)
+    step = np.log1p(SIGNATURE_STEP)
+    heads = np.round(np.log(np.maximum(h, 0.01)) / step)
+    flow = np.round(np.log(np.maximum(q_max, 0.01)) / step)
+    return np.column_stack([flow, heads]).astype(np.int64)
+
+
+def signature_text(row):
+    return ",".join(str(int(v)) for v in row)
+
+
+def curve_signature(h, q_min, q_max):
+    from calc_utils import coeff_matrix
+    if not h or not any(h):
+        return None
+    return signature_text(signature_matrix(coeff_matrix([h]), [q_min], [q_max])[0])
+
+
+def find_duplicates(cat):
+    """Exact and near duplicate groups of a catalogue in one vectorized pass.
+
+    Returns {"exact": [[ids], ...], "near": [[ids], ...]}. Near groups share a curve
+    signature without all members being exact duplicates of each other.
+    """
+    import numpy as np
+    ids = cat.ids
+    result = {"exact": [], "near": []}
+    if len(ids) == 0:
+        return result
+
+    hashes = np.asarray(cat.curve_hash)
+    known = np.nonzero(hashes != b"")[0]
+    if len(known):
+        _, inverse, counts = np.unique(hashes[known], return_inverse=True, return_counts=True)
+        result["exact"] = _groups(ids[known], inverse, counts)
+
+    rows = np.nonzero(cat.has_h & (cat.q_max > cat.q_min))[0]
+    if len(rows):
+        sig = signature_matrix(cat.h[rows], cat.q_min[rows], cat.q_max[rows])
+        _, inverse, counts = np.unique(sig, axis=0, return_inverse=True, return_counts=True)
+        exact_sets = {frozenset(g) for g in result["exact"]}
+        result["near"] = [g for g in _groups(ids[rows], inverse.ravel(), counts) if frozenset(g) not in exact_sets]
+    return result
+
+
+def _groups(ids, inverse, counts):
+    """Ids grouped by label for labels with more than one member (vectorized sort + split)."""
+    import numpy as np
+    dup = counts[inverse] > 1
+    if not dup.any():
+        return []
+    labels, members = inverse[dup], ids[dup]
+    order = np.argsort(labels, kind="stable")
+    labels, members = labels[order], members[order]
+    cuts = np.nonzero(np.diff(labels))[0] + 1
+    return [g.tolist() for g in np.split(members, cuts)]
@@ -0,0 +1,203 @@
+import importlib.util
+import io
+
+# Automatic curve tracing on chart images (the manual work of the digitizer).
+#
+# A page is turned into an RGB array, each curve is isolated by its colour (distance
+# to the target RGB within a tolerance) inside the calibrated plot area, and traced
+# column by column: the centroid of the matching pixels in a column is the curve's
+# y there. Columns where the matches are spread out (grid labels, legends, crossing
+# curves of the same colour) are dropped, and so are isolated blobs far from the
+# running median of their neighbours. Pixels are mapped to values with the same
+# two-point linear calibration as the digitizer, and all curves are resampled on one
+# common Q grid, so the output is the q_text/h_text/... form /api/calculate expects.
+# Pillow (PNG/JPEG) and pypdfium2 (PDF pages) are optional; they and numpy are
+# imported on the first extraction rather than at application import.
+
+MODES = {"QH": "h_text", "QP": "p2_text", "QN": "npsh_text", "QE": "eff_text"}
+RASTER_MIMES = ("image/png", "image/jpeg") # Besides PDF; other uploads (.dwg) cannot be traced
+DEFAULT_DPI = 150
+MAX_SPREAD_PX = 6.0 # Larger vertical spread in one column: ambiguous, not a line
+MIN_COVERAGE = 0.2 # Fraction of the calibrated X range a curve must span
+OUTLIER_WINDOW = 15 # Traced columns compared with their neighbours' median
+
+
+class ExtractionError(ValueError):
+    pass
+
+
+def supports(mime):
+    if mime == "application/pdf":
+        return importlib.util.find_spec("pypdfium2") is not None
+    return mime in RASTER_MIMES and importlib.util.find_spec("PIL") is not None
+
+
+def _open_pdf(source):
+    import pypdfium2 as pdfium
+    try:
+        return pdfium.PdfDocument(source)
+    except pdfium.PdfiumError as e:
+        raise ExtractionError(f"Cannot open the PDF: {e}")
+
+
+def load_pages(source, mime, pages=(0,), dpi=DEFAULT_DPI):
+    """Yields (page index, RGB uint8 array) for the requested pages of a PDF, or the single page of an image.
+
+    source is the file content or a path.
+    """
+    import numpy as np
+    if mime != "application/pdf":
+        from PIL import Image
+        try:
+            with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as img:
+                rgb = np.asarray(img.convert("RGB"))
+        except (OSError, Image.DecompressionBombError) as e: # Unidentified, truncated or oversized image
+            raise ExtractionError(f"Cannot read the image: {e}")
+        yield 0, rgb
+        return
+    import pypdfium2 as pdfium
+    doc = _open_pdf(source)
+    try:
+        for index in pages:
+            if not 0 <= index < len(doc):
+                raise ExtractionError(f"Page {index + 1} does not exist (document has {len(doc)} pages)")
+            try:
+                bitmap = doc[index].render(scale=dpi / 72.0, rev_byteorder=True)
+            except pdfium.PdfiumError as e:
+                raise ExtractionError(f"Cannot render page {index + 1}: {e}")
+            yield index, np.array(bitmap.to_numpy()[:, :, :3])
+    finally:
+        doc.close()
+
+
+def page_count(source):
+    doc = _open_pdf(source)
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
+
+def parse_color(color):
+    """'#rrggbb' -> (r, g, b)."""
+    value = color.lstrip("#")
+    if len(value) != 6:
+        raise ExtractionError(f"Colour must be #rrggbb, got {color!r}")
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def axis_map(px0, px1, val0, val1):
+    """Pixel -> value function of a two-point calibration (as in the digitizer)."""
+    import numpy as np
+    if px1 == px0:
+        raise ExtractionError("Calibration points must differ")
+    scale = (val1 - val0) / (px1 - px0)
+    return lambda px: val0 + (np.asarray(px, dtype=float) - px0) * scale
+
+
+def color_mask(rgb, color, tolerance):
+    """Pixels within `tolerance` (Euclidean RGB distance) of color, as a bool (rows, cols) array."""
+    import numpy as np
+    diff = rgb.astype(np.int32) - np.asarray(color, dtype=np.int32)
+    return np.einsum("ijk,ijk->ij", diff, diff) <= tolerance * tolerance
+
+
+def trace_columns(mask, max_spread=MAX_SPREAD_PX):
+    """Column-wise centroid of a mask: returns (columns, y centroids) of the unambiguous columns."""
+    import numpy as np
+    rows = np.arange(mask.shape[0], dtype=float)[:, None]
+    counts = mask.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (mask * rows).sum(axis=0) / counts
+        spread = np.sqrt(np.maximum((mask * rows * rows).sum(axis=0) / counts - mean * mean, 0.0))
+    ok = (counts > 0) & (spread <= max_spread)
+    columns = np.nonzero(ok)[0]
+    return columns, mean[columns]
+
+
+def drop_outliers(columns, ys, window=OUTLIER_WINDOW, max_dev=2 * MAX_SPREAD_PX):
+    """Drops isolated blobs (legend swatches, a curve hidden behind another one) far from the running median."""
+    import numpy as np
+    if len(ys) < window:
+        return columns, ys
+    half = window // 2
+    padded = np.pad(ys, half, mode="edge")
+    median = np.median(np.lib.stride_tricks.sliding_window_view(padded, window), axis=1)
+    keep = np.abs(ys - median) <= max_dev
+    return columns[keep], ys[keep]
+
+
+def trace_curve(rgb, x_cal, y_cal, color, tolerance=60, max_spread=MAX_SPREAD_PX):
+    """Traces one curve: returns (q, y) arrays over the columns where it was found.
+
+    x_cal / y_cal are (px0, px1, val0, val1). Only the plot area spanned by the
+    calibration points is searched, which keeps axis labels and titles out.
+    """
+    x_lo, x_hi = sorted((int(round(x_cal[0])), int(round(x_cal[1]))))
+    y_lo, y_hi = sorted((int(round(y_cal[0])), int(round(y_cal[1]))))
+    x_lo, y_lo = max(x_lo, 0), max(y_lo, 0)
+    area = rgb[y_lo:y_hi + 1, x_lo:x_hi + 1]
+    if area.size == 0:
+        raise ExtractionError("Calibration lies outside the image")
+    columns, ys = drop_outliers(*trace_columns(color_mask(area, color, tolerance), max_spread))
+    return axis_map(*x_cal)(columns + x_lo), axis_map(*y_cal)(ys + y_lo)
+
+
+def extract_curves(rgb, x_axis, curves, points=15):
+    """Traces every curve and resamples all of them on one Q grid.
+
+    x_axis: (px0, px1, val0, val1); curves: [{"mode", "color", "tolerance", "y_axis"}].
+    The grid spans the Q range covered by every curve. Returns the form fields for
+    /api/calculate (q_text plus one y text per mode) and per-curve coverage.
+    """
+    import numpy as np
+    span = abs(x_axis[3] - x_axis[2])
+    traced = {}
+    for spec in curves:
+        q, y = trace_curve(rgb, x_axis, spec["y_axis"], parse_color(spec["color"]), spec.get("tolerance", 60))
+        order = np.argsort(q)
+        q, y = q[order], y[order]
+        coverage = float((q[-1] - q[0]) / span) if len(q) > 1 and span else 0.0
+        if coverage < MIN_COVERAGE:
+            raise ExtractionError(f"Curve {spec['mode']} ({spec['color']}) not found on the page")
+        traced[spec["mode"]] = (q, y, coverage)
+
+    q_lo = max(t[0][0] for t in traced.values())
+    q_hi = min(t[0][-1] for t in traced.values())
+    if q_hi <= q_lo:
+        raise ExtractionError("Traced curves do not share a Q range")
+    grid = np.linspace(q_lo, q_hi, points)
+    result = {"q_text": " ".join(f"{v:.6f}" for v in grid), "coverage": {}}
+    for mode, (q, y, coverage) in traced.items():
+        result[MODES[mode]] = " ".join(f"{v:.6f}" for v in np.interp(grid, q, y))
+        result["coverage"][mode] = round(coverage, 3)
+    return result
+
+
+def extract_page(args):
+    """Process pool entry point: (path, mime, page, dpi, x_axis, curves, points) -> result dict for one page."""
+    path, mime, page, dpi, x_axis, curves, points = args
+    try:
+        for index, rgb in load_pages(path, mime, (page,), dpi):
+            return {"page": index + 1, **extract_curves(rgb, x_axis, curves, points)}
+    except ExtractionError as e:
+        return {"page": page + 1, "error": str(e)}
+
+
+def extract_document(path, mime, pages, dpi, x_axis, curves, points, workers, progress=None):
+    """Extracts the same calibrated chart from many pages of a file in `workers` processes; one result per page.
+
+    Workers open the file themselves, so only the path crosses the process boundary.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    tasks = [(path, mime, page, dpi, x_axis, curves, points) for page in pages]
+    results = []
+    # spawn: the caller runs in a thread of a multi-threaded server, where fork is unsafe
+    with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn")) as pool:
+        for i, result in enumerate(pool.map(extract_page, tasks), 1):
+            results.append(result)
+            if progress:
+                progress(i / len(tasks), f"{i}/{len(tasks)} pages traced")
+    return results
@@ -0,0 +1,286 @@
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# In-process background jobs with a persistent SQLite job table (`jobs` in jobs.db).
+#
+# Handlers are registered with @job_handler("kind") and receive a JobContext plus the
+# job's JSON params; whatever they return is stored as the JSON result. Jobs run on a
+# small thread pool in the worker process that submitted them. A job row is claimed
+# atomically (queued -> running), so with several worker processes each job runs once;
+# on startup a worker re-queues jobs left running by a process that no longer exists.
+
+STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED = ("succeeded", "failed", "cancelled")
+
+_handlers = {}
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def job_handler(kind):
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+def _now():
+    return time.time()
+
+
+JOBS_DDL = """CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT,
+    result TEXT,
+    error TEXT,
+    message TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 1,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    org_id INTEGER,
+    worker_pid INTEGER,
+    created_at REAL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+)"""
+
+_schema_ready = set()
+
+
+def _conn():
+    """Connection to jobs.db; the table is created on first use (no pumps.db migration involved)."""
+    import sqlite3
+    from config import config
+    from metrics import connect
+    path = str(config.DB_JOBS)
+    conn = connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    if path not in _schema_ready:
+        conn.execute("PRAGMA journal_mode=WAL") # Status polling never blocks progress writes
+        conn.execute(JOBS_DDL)
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_org ON jobs (org_id, id)")
+        conn.commit()
+        _schema_ready.add(path)
+    return conn
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                from config import config
+                _executor = ThreadPoolExecutor(max_workers=config.JOB_WORKERS, thread_name_prefix="ruspump-job")
+    return _executor
+
+
+class JobContext:
+    """Passed to handlers: progress reporting and cooperative cancellation."""
+
+    def __init__(self, job_id, attempt):
+        self.id = job_id
+        self.attempt = attempt
+        self._last_write = 0.0
+
+    def progress(self, fraction, message=None, force=False):
+        """Records progress (0..1) and raises JobCancelled if cancellation was requested.
+
+        Cheap to call in tight loops: the job row is touched at most every 0.5 s unless force.
+        """
+        now = _now()
+        if not force and now - self._last_write < 0.5:
+            return
+        self._last_write = now
+        conn = _conn()
+        try:
+            conn.execute("UPDATE jobs SET progress=?, message=COALESCE(?, message), heartbeat_at=? WHERE id=?",
+                         (max(0.0, min(1.0, float(fraction))), message, now, self.id))
+            conn.commit()
+            cancelled = conn.execute("SELECT cancel_requested FROM jobs WHERE id=?", (self.id,)).fetchone()
+        finally:
+            conn.close()
+        if cancelled and cancelled[0]:
+            raise JobCancelled()
+
+
+
+def submit(kind, params=None, org_id=None, max_attempts=1):
+    """Queues a job and schedules it on this process's pool. Returns the job id."""
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+    conn = _conn()
+    try:
+        cur = conn.execute("""INSERT INTO jobs (kind, status, params, org_id, max_attempts, created_at)
+            VALUES (?, 'queued', ?, ?, ?, ?)""", (kind, json.dumps(params or {}), org_id, max(1, max_attempts), _now()))
+        conn.commit()
+        job_id = cur.lastrowid
+    finally:
+        conn.close()
+    _schedule(job_id)
+    return job_id
+
+
+def _schedule(job_id, delay=0.0):
+    if delay > 0:
+        timer = threading.Timer(delay, _schedule, (job_id,))
+        timer.daemon = True
+        timer.start()
+        return
+    _get_executor().submit(_run, job_id)
+
+
+def _claim(job_id):
+    conn = _conn()
+    try:
+        cur = conn.execute("""UPDATE jobs SET status='running', attempts=attempts+1, worker_pid=?,
+                started_at=?, heartbeat_at=?, error=NULL
+            WHERE id=? AND status='queued' AND cancel_requested=0""", (os.getpid(), _now(), _now(), job_id))
+        conn.commit()
+        if cur.rowcount != 1:
+            return None
+        return conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+
+
+def _finish(job_id, status, result=None, error=None, requeue=False):
+    conn = _conn()
+    try:
+        if requeue:
+            conn.execute("UPDATE jobs SET status='queued', error=?, worker_pid=NULL WHERE id=?", (error, job_id))
+        else:
+            conn.execute("""UPDATE jobs SET status=?, result=?, error=?, finished_at=?,
+                    progress=CASE WHEN ?='succeeded' THEN 1.0 ELSE progress END
+                WHERE id=?""", (status, json.dumps(result) if result is not None else None, error, _now(), status, job_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _run(job_id):
+    job = _claim(job_id)
+    if job is None:
+        return # Cancelled, finished or taken by another worker
+    ctx = JobContext(job_id, job["attempts"])
+    try:
+        result = _handlers[job["kind"]](ctx, **json.loads(job["params"] or "{}"))
+        _finish(job_id, "succeeded", result=result)
+    except JobCancelled:
+        _finish(job_id, "cancelled")
+    except Exception as e:
+        error = f"{e}\n{traceback.format_exc()}"
+        print(f"JOB ERROR: {job['kind']} #{job_id} (attempt {job['attempts']}/{job['max_attempts']}): {e}")
+        if job["attempts"] < job["max_attempts"]:
+            _finish(job_id, "queued", error=error, requeue=True)
+            _schedule(job_id, delay=min(60.0, 2.0 ** job["attempts"])) # Exponential backoff
+        else:
+            _finish(job_id, "failed", error=error)
+
+
+def get_job(job_id):
+    conn = _conn()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return job_to_dict(row) if row else None
+
+
+def list_jobs(org_id=None, include_global=False, limit=50):
+    """Most recent jobs of an organization (plus jobs without an organization, e.g. admin imports)."""
+    conn = _conn()
+    try:
+        rows = conn.execute("SELECT * FROM jobs WHERE org_id IS ? OR (? AND org_id IS NULL) ORDER BY id DESC LIMIT ?",
+                            (org_id, int(include_global), limit)).fetchall()
+    finally:
+        conn.close()
+    return [job_to_dict(r) for r in rows]
+
+
+def job_to_dict(row):
+    job = dict(row)
+    job["params"] = json.loads(job["params"]) if job["params"] else {}
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+
+def cancel(job_id):
+    """Queued jobs are cancelled at once; running jobs stop at their next progress() call."""
+    conn = _conn()
+    try:
+        conn.execute("UPDATE jobs SET status='cancelled', cancel_requested=1, finished_at=? WHERE id=? AND status='queued'",
+                     (_now(), job_id))
+        conn.execute("UPDATE jobs SET cancel_requested=1 WHERE id=? AND status='running'", (job_id,))
+        conn.commit()
+    finally:
+        conn.close()
+    return get_job(job_id)
+
+
+def retry(job_id):
+    """Re-queues a failed or cancelled job (one more attempt)."""
+    conn = _conn()
+    try:
+        cur = conn.execute("""UPDATE jobs SET status='queued', cancel_requested=0, progress=0, finished_at=NULL,
+                max_attempts=attempts+1
+            WHERE id=? AND status IN ('failed', 'cancelled')""", (job_id,))
+        conn.commit()
+    finally:
+        conn.close()
+    if cur.rowcount:
+        _schedule(job_id)
+    return get_job(job_id)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def recover():
+    """Startup: re-queues jobs orphaned by dead worker processes and schedules all queued jobs."""
+    conn = _conn()
+    try:
+        running = conn.execute("SELECT id, worker_pid, attempts, max_attempts FROM jobs WHERE status='running'").fetchall()
+        for job in running:
+            if job["worker_pid"] and job["worker_pid"] != os.getpid() and _pid_alive(job["worker_pid"]):
+                continue
+            if job["attempts"] < job["max_attempts"]:
+                conn.execute("UPDATE jobs SET status='queued', worker_pid=NULL WHERE id=?", (job["id"],))
+            else:
+                conn.execute("UPDATE jobs SET status='failed', error='Worker process exited', finished_at=? WHERE id=?",
+                             (_now(), job["id"]))
+        conn.commit()
+        queued = [r[0] for r in conn.execute("SELECT id FROM jobs WHERE status='queued' ORDER BY id").fetchall()]
+    finally:
+        conn.close()
+    for job_id in queued:
+        _schedule(job_id)
+    return len(queued)
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
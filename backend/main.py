@@ -1,11 +1,14 @@
 from fastapi import FastAPI, Request, Depends
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from models import User
 from auth_utils import get_current_active_user
 import os
 import sys
+import json
+import time
+import random
 import logging
 
 # Configure logging
@@ -20,8 +23,12 @@ logger = logging.getLogger(__name__)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(BASE_DIR)
 
+from config import config
+import metrics
+from compression import CompressionMiddleware
 from db_utils import init_db, UPLOAD_DIR
-from routers import pumps, drawings, admin, selection, auth
+import jobs
+from routers import pumps, drawings, admin, selection, auth, curves, datasheets, extraction, tiles, jobs as jobs_router
 
 app = FastAPI(
     title="RusPump HQ-Chart Backend v2.36",
@@ -38,6 +45,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"]
 )
+# Negotiated br/gzip compression for JSON and other text responses
+app.add_middleware(CompressionMiddleware, minimum_size=config.COMPRESSION_MIN_SIZE)
 
 # Mount Static Directories
 app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
@@ -48,6 +57,11 @@ app.include_router(drawings.router)
 app.include_router(admin.router)
 app.include_router(selection.router)
 app.include_router(auth.router)
+app.include_router(curves.router)
+app.include_router(jobs_router.router)
+app.include_router(datasheets.router)
+app.include_router(extraction.router)
+app.include_router(tiles.router)
 
 @app.get("/api/debug-db-stats")
 async def debug_db_stats():
@@ -124,15 +138,58 @@ async def self_check(current_user: User = Depends(get_current_active_user)):
 
 @app.on_event("startup")
 def on_startup():
-    init_db()
-    logger.info("Application Startup: DB Initialized.")
+    if config.FAST_START:
+        # Migrations are applied by the pre-start command (`python manage.py migrate`)
+        logger.info("Application Startup: Fast start, DB initialization skipped.")
+    else:
+        init_db()
+        logger.info("Application Startup: DB Initialized.")
+    resumed = jobs.recover()
+    if resumed:
+        logger.info(f"Application Startup: Resumed {resumed} queued background jobs.")
+
+@app.on_event("shutdown")
+def on_shutdown():
+    jobs.shutdown()
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    logger.info(f"INCOMING: {request.method} {request.url.path} | Client: {request.client.host}")
-    response = await call_next(request)
-    logger.info(f"OUTGOING: {response.status_code}")
-    return response
+    stats = metrics.start_request()
+    start = time.perf_counter()
+    response = None
+    try:
+        response = await call_next(request)
+        return response
+    finally:
+        # Also on unhandled exceptions: they are recorded and logged as 500
+        duration = time.perf_counter() - start
+        status = response.status_code if response is not None else 500
+
+        # Route template (e.g. /api/pumps/{id}) keeps label cardinality bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        method = request.method
+        req_bytes = int(request.headers.get("content-length") or 0)
+        resp_bytes = int(response.headers.get("content-length") or 0) if response is not None else 0
+        metrics.HTTP_LATENCY.observe(duration, (method, route, status))
+        metrics.HTTP_REQUEST_SIZE.observe(req_bytes, (method, route))
+        metrics.HTTP_RESPONSE_SIZE.observe(resp_bytes, (method, route))
+        metrics.DB_QUERIES_PER_REQUEST.observe(stats.db_queries, (route,))
+        metrics.DB_TIME_PER_REQUEST.observe(stats.db_seconds, (route,))
+
+        duration_ms = duration * 1000
+        if status >= 500 or duration_ms >= config.SLOW_REQUEST_MS or random.random() < config.LOG_SAMPLE_RATE:
+            logger.info(json.dumps({
+                "event": "request", "method": method, "path": request.url.path, "route": route,
+                "status": status, "duration_ms": round(duration_ms, 2),
+                "db_queries": stats.db_queries, "db_ms": round(stats.db_seconds * 1000, 2),
+                "req_bytes": req_bytes, "resp_bytes": resp_bytes,
+                "client": request.client.host if request.client else None
+            }))
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus text exposition of this worker's metrics."""
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
 
 # Serve Assets (JS/CSS from Vite build)
 if os.path.exists(FRONTEND_DIR):
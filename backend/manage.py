@@ -0,0 +1,71 @@
+"""
+Maintenance commands for the RusPump backend.
+
+Usage:
+    python manage.py migrate     Apply pending database migrations (pre-start command)
+    python manage.py version     Print the current schema version
+    python manage.py serve       Run uvicorn with Config.WORKERS worker processes
+    python manage.py backfill-bep [--force]
+                                 Recompute BEP and operating regions from stored curves
+"""
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BASE_DIR)
+
+
+def cmd_migrate(args):
+    from db_utils import init_db, get_db_path
+    from migrations import get_schema_version
+    init_db()
+    print(f"Schema version: {get_schema_version(get_db_path())}")
+
+
+def cmd_version(args):
+    from db_utils import get_db_path
+    from migrations import get_schema_version, LATEST_VERSION
+    print(f"Schema version: {get_schema_version(get_db_path())} (latest: {LATEST_VERSION})")
+
+
+def cmd_backfill_bep(args):
+    from db_utils import init_db, get_conn, bump_all_revisions
+    from migrations import backfill_bep
+    init_db()
+    conn = get_conn()
+    try:
+        updated = backfill_bep(conn, force=args.force)
+        if updated:
+            bump_all_revisions(conn) # Workers rebuild their catalogues with the new values
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"BEP computed for {updated} pumps")
+
+
+def cmd_serve(args):
+    import uvicorn
+    from config import config
+    workers = args.workers or config.WORKERS
+    # Every worker imports main:app; migrations are expected to be applied already (FAST_START)
+    uvicorn.run("main:app", host=config.API_HOST, port=config.API_PORT, workers=workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RusPump backend maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="Apply pending database migrations").set_defaults(func=cmd_migrate)
+    sub.add_parser("version", help="Print the current schema version").set_defaults(func=cmd_version)
+    backfill = sub.add_parser("backfill-bep", help="Recompute BEP and operating regions")
+    backfill.add_argument("--force", action="store_true", help="Recompute pumps that already have a BEP")
+    backfill.set_defaults(func=cmd_backfill_bep)
+    serve = sub.add_parser("serve", help="Run the API server")
+    serve.add_argument("--workers", type=int, default=None, help="Overrides Config.WORKERS")
+    serve.set_defaults(func=cmd_serve)
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import bisect
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+
+# Lightweight in-process metrics with Prometheus text exposition (GET /metrics).
+#
+# Each worker process keeps its own registry. Per-request DB statistics are
+# collected through a context variable that both the SQLAlchemy engine hooks
+# and the instrumented raw sqlite3 connections update.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = [(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in pairs]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[tuple(labels)] = self._values.get(tuple(labels), 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(tuple(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[tuple(labels)] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {} # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(tuple(labels))
+            if series is None:
+                series = self._series[tuple(labels)] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, labels=()):
+        series = self._series.get(tuple(labels))
+        return series[-1] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, series):
+                    cumulative += n
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', _format_value(float(bound))))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', '+Inf'))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(float(series[-2]))}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+REGISTRY = []
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_LATENCY = register(Histogram(
+    "ruspump_http_request_duration_seconds", "HTTP request latency by route",
+    ("method", "route", "status")))
+HTTP_REQUEST_SIZE = register(Histogram(
+    "ruspump_http_request_size_bytes", "HTTP request body size by route",
+    ("method", "route"), SIZE_BUCKETS))
+HTTP_RESPONSE_SIZE = register(Histogram(
+    "ruspump_http_response_size_bytes", "HTTP response body size by route",
+    ("method", "route"), SIZE_BUCKETS))
+DB_QUERIES_PER_REQUEST = register(Histogram(
+    "ruspump_db_queries_per_request", "Number of DB queries executed per HTTP request",
+    ("route",), COUNT_BUCKETS))
+DB_TIME_PER_REQUEST = register(Histogram(
+    "ruspump_db_time_per_request_seconds", "Total DB time spent per HTTP request",
+    ("route",), LATENCY_BUCKETS))
+DB_QUERY_LATENCY = register(Histogram(
+    "ruspump_db_query_duration_seconds", "Duration of single DB statements by database",
+    ("db",), DB_LATENCY_BUCKETS))
+
+
+# --- Per-request DB statistics ---
+
+class RequestStats:
+    __slots__ = ("db_queries", "db_seconds")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+
+_request_stats = contextvars.ContextVar("ruspump_request_stats", default=None)
+
+def start_request():
+    stats = RequestStats()
+    _request_stats.set(stats)
+    return stats
+
+def record_query(db, seconds):
+    DB_QUERY_LATENCY.observe(seconds, (db,))
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += seconds
+
+
+# --- SQLAlchemy engines ---
+
+def instrument_engine(engine, db_name):
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("ruspump_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("ruspump_query_start")
+        if starts:
+            record_query(db_name, time.perf_counter() - starts.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # A failed statement gets no after_cursor_execute: pop its start here so the list
+        # of a pooled connection does not grow and later timings pair with the right entry
+        starts = context.connection.info.get("ruspump_query_start") if context.connection is not None else None
+        if starts:
+            record_query(db_name, time.perf_counter() - starts.pop())
+
+    return engine
+
+
+# --- Raw sqlite3 connections ---
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args, **kwargs)
+        finally:
+            record_query(self.connection.db_name, time.perf_counter() - start)
+
+    def executemany(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args, **kwargs)
+        finally:
+            record_query(self.connection.db_name, time.perf_counter() - start)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection (use as `factory=`) that reports every statement to the request stats."""
+    db_name = "sqlite"
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args, **kwargs)
+        finally:
+            record_query(self.db_name, time.perf_counter() - start)
+
+    def executemany(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args, **kwargs)
+        finally:
+            record_query(self.db_name, time.perf_counter() - start)
+
+
+def connect(path, **kwargs):
+    """sqlite3.connect() returning an InstrumentedConnection labelled with the DB file name."""
+    conn = sqlite3.connect(path, factory=InstrumentedConnection, **kwargs)
+    conn.db_name = os.path.basename(str(path))
+    return conn
@@ -0,0 +1,369 @@
+import json
+import sqlite3
+from datetime import datetime
+
+# Versioned, one-shot schema migrations.
+#
+# Every step runs exactly once per pumps.db, inside its own transaction, and is
+# recorded in the `schema_version` table. sensitive.db and drawings.db are
+# ATTACHed to the same connection (as `sensitive` and `drawings`), so steps that
+# touch several databases are plain batched SQL instead of per-row loops.
+# A normal startup only reads MAX(version) and returns.
+
+SCHEMA_VERSION_DDL = """CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TEXT NOT NULL
+)"""
+
+
+def _table_columns(conn, table, schema="main"):
+    return {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})").fetchall()}
+
+
+def _add_missing_columns(conn, table, columns, schema="main"):
+    existing = _table_columns(conn, table, schema)
+    added = []
+    for col_name, col_type in columns:
+        if col_name not in existing:
+            conn.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {col_name} {col_type}")
+            added.append(col_name)
+    if added:
+        print(f"MIGRATION: Added columns to {schema}.{table}: {', '.join(added)}")
+
+
+def _m001_legacy_columns(conn):
+    """Columns added to pumps.db / drawings.db before migrations were versioned."""
+    _add_missing_columns(conn, "pumps", [
+        ("h_max", "REAL"), ("h_min", "REAL"), ("q_req", "REAL"), ("h_req", "REAL"),
+        ("q_max", "REAL"), ("q_min", "REAL"), ("h_st", "REAL"),
+        ("drawing_filename", "TEXT"),
+        ("price", "REAL"), ("currency", "TEXT"), ("comment", "TEXT"), ("updated_at", "TEXT"), ("save_source", "TEXT"),
+        ("org_id", "INTEGER")
+    ])
+    _add_missing_columns(conn, "files", [("org_id", "INTEGER")], schema="drawings")
+
+
+def _m002_move_sensitive_data(conn):
+    """Moves original names and prices from pumps.db into sensitive.db (only if it is still empty)."""
+    count = conn.execute("SELECT count(*) FROM sensitive.private_data").fetchone()[0]
+    if count:
+        return
+    cur = conn.execute("""INSERT OR REPLACE INTO sensitive.private_data (id, original_name, price, currency)
+        SELECT id, name, price, currency FROM main.pumps
+        WHERE (name IS NOT NULL AND name != '') OR (price IS NOT NULL AND price != 0)
+           OR (currency IS NOT NULL AND currency != '')""")
+    if cur.rowcount > 0:
+        # Public DB keeps the OEM name only, so the archive list is not empty visually
+        conn.execute("UPDATE main.pumps SET name = oem_name, price = 0, currency = ''")
+        print(f"MIGRATION: Moved {cur.rowcount} records to sensitive.db")
+
+
+def _m003_sync_drawing_filenames(conn):
+    """Copies the real filename from drawings.db for every pump linked to /api/drawings/<id>."""
+    # len('/api/drawings/') == 14
+    cur = conn.execute("""UPDATE main.pumps SET drawing_filename = (
+            SELECT f.filename FROM drawings.files f
+            WHERE f.id = CAST(substr(main.pumps.drawing_path, 15) AS INTEGER))
+        WHERE drawing_path LIKE '/api/drawings/%'
+          AND EXISTS (
+            SELECT 1 FROM drawings.files f
+            WHERE f.id = CAST(substr(main.pumps.drawing_path, 15) AS INTEGER)
+              AND f.filename IS NOT NULL AND f.filename != ''
+              AND (main.pumps.drawing_filename IS NULL OR main.pumps.drawing_filename != f.filename))""")
+    if cur.rowcount > 0:
+        print(f"MIGRATION: Synchronized drawing filenames for {cur.rowcount} records")
+
+
+def adopt_orphans(conn):
+    """Auto-adopts orphaned records to the latest organization if one exists (idempotent).
+
+    Runs as migration 4 and again on every init_db(): records imported without an
+    organization later on are adopted as soon as an organization exists.
+    """
+    org_row = conn.execute("SELECT id FROM main.organizations ORDER BY id DESC LIMIT 1").fetchone()
+    if not org_row:
+        print("MIGRATION: No organizations found yet to adopt legacy data.")
+        return
+    org_id = org_row[0]
+    orphans = [r[0] for r in conn.execute("SELECT id FROM main.pumps WHERE org_id IS NULL").fetchall()]
+    if orphans:
+        conn.execute("UPDATE main.pumps SET org_id = ? WHERE org_id IS NULL", (org_id,))
+        print(f"MIGRATION: Successfully adopted {len(orphans)} orphaned pumps to Org ID {org_id}")
+        if "revision" in _table_columns(conn, "pumps"):
+            # Adopted pumps reach worker caches and syncing clients of the organization
+            conn.execute("""INSERT INTO main.catalogue_revisions (org_id, revision) VALUES (?, 1)
+                ON CONFLICT(org_id) DO UPDATE SET revision = revision + 1""", (org_id,))
+            conn.execute("""UPDATE main.pumps SET revision = (SELECT revision FROM main.catalogue_revisions WHERE org_id = ?)
+                WHERE id IN (SELECT value FROM json_each(?))""", (org_id, json.dumps(orphans)))
+    res_f = conn.execute("UPDATE drawings.files SET org_id = ? WHERE org_id IS NULL", (org_id,))
+    if res_f.rowcount > 0:
+        print(f"MIGRATION: Successfully adopted {res_f.rowcount} orphaned files to Org ID {org_id}")
+
+
+def _m004_adopt_orphans(conn):
+    adopt_orphans(conn)
+
+
+def _m005_catalogue_revisions(conn):
+    """Per-organization change counter shared by all worker processes (cache invalidation)."""
+    conn.execute("""CREATE TABLE IF NOT EXISTS main.catalogue_revisions (
+        org_id INTEGER PRIMARY KEY,
+        revision INTEGER NOT NULL DEFAULT 0
+    )""")
+
+
+def _m006_pump_revisions_and_tombstones(conn):
+    """Per-pump revision stamps and deletion tombstones for incremental archive sync."""
+    _add_missing_columns(conn, "pumps", [("revision", "INTEGER NOT NULL DEFAULT 0")])
+    conn.execute("CREATE INDEX IF NOT EXISTS main.ix_pumps_org_revision ON pumps (org_id, revision)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS main.pump_tombstones (
+        id INTEGER NOT NULL,
+        org_id INTEGER,
+        revision INTEGER NOT NULL,
+        deleted_at TEXT
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS main.ix_pump_tombstones_org_revision ON pump_tombstones (org_id, revision)")
+    # Existing pumps get their organization's (bumped) current revision
+    conn.execute("""INSERT INTO main.catalogue_revisions (org_id, revision)
+        SELECT DISTINCT COALESCE(org_id, 0), 1 FROM main.pumps WHERE true
+        ON CONFLICT(org_id) DO UPDATE SET revision = revision + 1""")
+    conn.execute("""UPDATE main.pumps SET revision = (
+        SELECT r.revision FROM main.catalogue_revisions r WHERE r.org_id = COALESCE(main.pumps.org_id, 0))""")
+
+
+def backfill_bep(conn, force=False, batch_size=1000):
+    """Computes BEP and operating regions from stored coefficients (only pumps without them unless force).
+
+    Returns the number of pumps updated. Works on a plain connection or inside a migration step.
+    """
+    from calc_utils import BEP_FIELDS, best_efficiency_points, coeff_matrix, parse_coeffs
+
+    def coeffs(t):
+        try:
+            return parse_coeffs(t)
+        except (ValueError, TypeError):
+            return []
+
+    if not {"eff_coeffs", "h_coeffs", "q_min", "q_max"} <= _table_columns(conn, "pumps"):
+        return 0 # No curves stored yet
+    where = "" if force else "WHERE bep_q IS NULL"
+    rows = conn.execute(f"SELECT id, eff_coeffs, h_coeffs, q_min, q_max FROM main.pumps {where} ORDER BY id").fetchall()
+    updated = 0
+    for start in range(0, len(rows), batch_size):
+        chunk = rows[start:start + batch_size]
+        bep = best_efficiency_points(coeff_matrix([coeffs(r[1]) for r in chunk]), coeff_matrix([coeffs(r[2]) for r in chunk]),
+                                     [r[3] or 0.0 for r in chunk], [r[4] or 0.0 for r in chunk])
+        params = []
+        for n, r in enumerate(chunk):
+            values = [float(bep[f][n]) for f in BEP_FIELDS]
+            params.append(tuple(v if v == v else None for v in values) + (r[0],))
+        assignments = ", ".join(f"{f} = ?" for f in BEP_FIELDS)
+        conn.executemany(f"UPDATE main.pumps SET {assignments} WHERE id = ?", params)
+        updated += len(params)
+    return updated
+
+
+def _m007_best_efficiency_points(conn):
+    """BEP and preferred/allowable operating regions per pump, indexed for range filters."""
+    _add_missing_columns(conn, "pumps", [
+        ("bep_q", "REAL"), ("bep_h", "REAL"), ("bep_eff", "REAL"),
+        ("por_q_min", "REAL"), ("por_q_max", "REAL"), ("aor_q_min", "REAL"), ("aor_q_max", "REAL"),
+    ])
+    conn.execute("CREATE INDEX IF NOT EXISTS main.ix_pumps_org_bep ON pumps (org_id, bep_q)")
+    conn.execute("CREATE INDEX IF NOT EXISTS main.ix_pumps_org_por ON pumps (org_id, por_q_min, por_q_max)")
+    updated = backfill_bep(conn)
+    if updated:
+        # New values reach syncing clients and worker caches through a revision bump
+        conn.execute("""INSERT INTO main.catalogue_revisions (org_id, revision)
+            SELECT DISTINCT COALESCE(org_id, 0), 1 FROM main.pumps WHERE true
+            ON CONFLICT(org_id) DO UPDATE SET revision = revision + 1""")
+        conn.execute("""UPDATE main.pumps SET revision = (
+            SELECT r.revision FROM main.catalogue_revisions r WHERE r.org_id = COALESCE(main.pumps.org_id, 0))""")
+        print(f"MIGRATION: Computed BEP for {updated} pumps")
+
+
+def _m008_file_metadata(conn):
+    """Content hash, MIME type and size of stored drawings (streamed uploads, deduplication)."""
+    _add_missing_columns(conn, "files", [("sha256", "TEXT"), ("mime", "TEXT"), ("size", "INTEGER")], schema="drawings")
+    conn.execute("UPDATE drawings.files SET size = length(data) WHERE size IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS drawings.ix_files_org_sha256 ON files (org_id, sha256)")
+
+
+def backfill_dedup(conn, force=False, batch_size=1000):
+    """Computes curve_hash / curve_signature (dedup_utils) for pumps without them unless force. Returns the count."""
+    from calc_utils import coeff_matrix, parse_coeffs
+    from dedup_utils import META_FIELDS, curve_hash, signature_matrix, signature_text
+
+    def coeffs(t):
+        try:
+            return parse_coeffs(t)
+        except (ValueError, TypeError):
+            return []
+
+    needed = {"h_coeffs", "eff_coeffs", "p2_coeffs", "npsh_coeffs", "q_min", "q_max", "name", *META_FIELDS}
+    if not needed <= _table_columns(conn, "pumps"):
+        return 0 # Legacy table without curves
+    where = "" if force else "WHERE curve_hash IS NULL"
+    rows = conn.execute(f"""SELECT id, name, h_coeffs, eff_coeffs, p2_coeffs, npsh_coeffs, q_min, q_max, {', '.join(META_FIELDS)}
+        FROM main.pumps {where} ORDER BY id""").fetchall()
+    updated = 0
+    for start in range(0, len(rows), batch_size):
+        chunk = rows[start:start + batch_size]
+        curves = [[coeffs(r[i]) for i in range(2, 6)] for r in chunk]
+        signatures = signature_matrix(coeff_matrix([c[0] for c in curves]), [r[6] or 0.0 for r in chunk], [r[7] or 0.0 for r in chunk])
+        params = []
+        for n, r in enumerate(chunk):
+            has_h = any(curves[n][0]) and (r[7] or 0.0) > (r[6] or 0.0)
+            params.append((curve_hash(*curves[n], r[6], r[7], r[1], **dict(zip(META_FIELDS, r[8:]))),
+                           signature_text(signatures[n]) if has_h else None, r[0]))
+        conn.executemany("UPDATE main.pumps SET curve_hash = ?, curve_signature = ? WHERE id = ?", params)
+        updated += len(params)
+    return updated
+
+
+def _m009_curve_dedup(conn):
+    """Exact (curve_hash) and near-duplicate (curve_signature) keys per pump, indexed per organization."""
+    _add_missing_columns(conn, "pumps", [("curve_hash", "TEXT"), ("curve_signature", "TEXT")])
+    conn.execute("CREATE INDEX IF NOT EXISTS main.ix_pumps_org_curve_hash ON pumps (org_id, curve_hash)")
+    conn.execute("CREATE INDEX IF NOT EXISTS main.ix_pumps_org_curve_signature ON pumps (org_id, curve_signature)")
+    updated = backfill_dedup(conn)
+    if updated:
+        print(f"MIGRATION: Computed duplicate keys for {updated} pumps")
+
+
+def backfill_specs(conn, force=False, batch_size=1000):
+    """Parses the numeric shadow columns (spec_utils.NUMERIC_SPECS) for pumps not parsed yet unless force."""
+    from spec_utils import NUMERIC_SPECS, numeric_specs
+
+    if not set(NUMERIC_SPECS) <= _table_columns(conn, "pumps"):
+        return 0
+    fields = list(NUMERIC_SPECS)
+    columns = [c for c, _ in NUMERIC_SPECS.values()]
+    # specs_parsed marks rows already done (all shadow columns may legitimately stay NULL)
+    where = "" if force else "WHERE specs_parsed IS NULL"
+    rows = conn.execute(f"SELECT id, {', '.join(fields)} FROM main.pumps {where} ORDER BY id").fetchall()
+    assignments = ", ".join(f"{c} = ?" for c in columns)
+    for start in range(0, len(rows), batch_size):
+        params = []
+        for r in rows[start:start + batch_size]:
+            values = numeric_specs(dict(zip(fields, r[1:])))
+            params.append(tuple(values[c] for c in columns) + (r[0],))
+        conn.executemany(f"UPDATE main.pumps SET {assignments}, specs_parsed = 1 WHERE id = ?", params)
+    return len(rows)
+
+
+def _m010_numeric_specs(conn):
+    """REAL shadow columns for rpm / P2 / DN / impeller parsed from the text specs, indexed with org_id."""
+    from spec_utils import NUMERIC_SPECS
+    _add_missing_columns(conn, "pumps", [(c, "REAL") for c, _ in NUMERIC_SPECS.values()] + [("specs_parsed", "INTEGER")])
+    for column, _ in NUMERIC_SPECS.values():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS main.ix_pumps_org_{column} ON pumps (org_id, {column})")
+    updated = backfill_specs(conn)
+    if updated:
+        print(f"MIGRATION: Parsed numeric specs of {updated} pumps")
+
+
+def _m011_revision_reset(conn):
+    """Reset floor per organization: clients synced before it (e.g. before a database replace) must reload."""
+    _add_missing_columns(conn, "catalogue_revisions", [("reset_revision", "INTEGER NOT NULL DEFAULT 0")])
+
+
+# (version, name, step). Append only: never renumber or edit an applied step.
+MIGRATIONS = [
+    (1, "legacy_columns", _m001_legacy_columns),
+    (2, "move_sensitive_data", _m002_move_sensitive_data),
+    (3, "sync_drawing_filenames", _m003_sync_drawing_filenames),
+    (4, "adopt_orphans", _m004_adopt_orphans),
+    (5, "catalogue_revisions", _m005_catalogue_revisions),
+    (6, "pump_revisions_and_tombstones", _m006_pump_revisions_and_tombstones),
+    (7, "best_efficiency_points", _m007_best_efficiency_points),
+    (8, "file_metadata", _m008_file_metadata),
+    (9, "curve_dedup", _m009_curve_dedup),
+    (10, "numeric_specs", _m010_numeric_specs),
+    (11, "revision_reset", _m011_revision_reset),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return _current_version(conn)
+    finally:
+        conn.close()
+
+
+def _current_version(conn):
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0  # Table missing: database predates versioned migrations
+    return row[0] or 0
+
+
+def _create_model_tables(*paths):
+    """Runs SQLModel create_all for every database (idempotent, only needed when a step is pending)."""
+    from sqlmodel import SQLModel, create_engine
+    import models  # noqa: F401 - registers table metadata
+
+    for path in paths:
+        engine = create_engine(f"sqlite:///{path}")
+        try:
+            SQLModel.metadata.create_all(engine)
+        finally:
+            engine.dispose()
+
+
+def migrate(db_path, sensitive_path, files_path):
+    """Applies pending migrations. Returns the number of steps applied."""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        current = _current_version(conn)
+        if current >= LATEST_VERSION:
+            conn.execute("ATTACH DATABASE ? AS drawings", (str(files_path),))
+            _adopt_pass(conn)
+            return 0
+
+        _create_model_tables(db_path, sensitive_path, files_path)
+        conn.execute(SCHEMA_VERSION_DDL)
+        conn.execute("ATTACH DATABASE ? AS sensitive", (str(sensitive_path),))
+        conn.execute("ATTACH DATABASE ? AS drawings", (str(files_path),))
+
+        applied = 0
+        for version, name, step in MIGRATIONS:
+            if version <= current:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                step(conn)
+                conn.execute("INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                             (version, name, datetime.now().strftime("%d.%m.%Y %H:%M")))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                print(f"MIGRATION ERROR: step {version} ({name}) rolled back")
+                raise
+            print(f"MIGRATION: Applied {version} ({name})")
+            applied += 1
+        if current >= 4: # Migration 4 did not run in this pass
+            _adopt_pass(conn)
+        return applied
+    finally:
+        conn.close()
+
+
+def _adopt_pass(conn):
+    """adopt_orphans() outside migration 4 (drawings attached); the write transaction is only opened for orphans."""
+    orphaned = conn.execute("""SELECT EXISTS (SELECT 1 FROM main.pumps WHERE org_id IS NULL)
+        OR EXISTS (SELECT 1 FROM drawings.files WHERE org_id IS NULL)""").fetchone()[0]
+    if not orphaned:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        adopt_orphans(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
@@ -66,6 +66,26 @@ class PumpBase(SQLModel):
     save_source: Optional[str] = "points"
     
     updated_at: Optional[str] = None
+    # Catalogue revision of the last change (incremental sync); server default keeps raw INSERTs valid
+    revision: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # Best efficiency point and operating regions (flow ranges), derived on save (calc_utils.bep_fields)
+    bep_q: Optional[float] = None
+    bep_h: Optional[float] = None
+    bep_eff: Optional[float] = None
+    por_q_min: Optional[float] = None
+    por_q_max: Optional[float] = None
+    aor_q_min: Optional[float] = None
+    aor_q_max: Optional[float] = None
+    # Duplicate detection keys (dedup_utils): exact match and quantized H(Q) shape
+    curve_hash: Optional[str] = None
+    curve_signature: Optional[str] = None
+    # Numeric shadows of the text specs above, parsed on save (spec_utils.NUMERIC_SPECS)
+    rpm_value: Optional[float] = None
+    p2_nom_kw: Optional[float] = None
+    dn_suction_mm: Optional[float] = None
+    dn_discharge_mm: Optional[float] = None
+    impeller_mm: Optional[float] = None
+    specs_parsed: Optional[int] = None
 
 class Pump(PumpBase, table=True):
     __tablename__ = "pumps"
@@ -85,4 +105,7 @@ class File(SQLModel, table=True):
     filename: Optional[str] = None
     org_id: Optional[int] = Field(default=None, foreign_key="organizations.id")
     data: bytes
+    sha256: Optional[str] = None
+    mime: Optional[str] = None
+    size: Optional[int] = None
 
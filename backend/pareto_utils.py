@@ -0,0 +1,45 @@
+import numpy as np
+
+# Multi-criteria selection: the non-dominated (Pareto) set of candidate pumps.
+#
+# Every objective is a cost column (lower is better; maximized objectives are negated
+# by the caller, unknown values are +inf). A row is dominated when another row is no
+# worse in every column and better in at least one. pareto_front is sort-filter-skyline:
+# rows are sorted lexicographically, so any dominator of a row comes before it, and each
+# surviving row removes the rows it dominates with one vectorized comparison. The cost
+# is O(n * front size) NumPy work instead of O(n^2) Python comparisons.
+
+
+def pareto_front(costs):
+    """Row indices of the non-dominated rows of an (n, k) cost matrix, in lexicographic cost order."""
+    costs = np.asarray(costs, dtype=float)
+    if len(costs) == 0:
+        return np.array([], dtype=np.int64)
+    costs = np.where(np.isnan(costs), np.inf, costs)
+    order = np.lexsort(costs.T[::-1])
+    c = costs[order]
+    keep = np.ones(len(c), dtype=bool)
+    for i in range(len(c)):
+        if not keep[i]:
+            continue
+        rest = c[i + 1:]
+        dominated = (rest >= c[i]).all(axis=1) & (rest > c[i]).any(axis=1)
+        keep[i + 1:] &= ~dominated
+    return order[keep]
+
+
+def weighted_scores(costs, weights):
+    """Weighted sum of min-max normalized costs per row (0 = best in every weighted objective).
+
+    Infinite (unknown) costs count as the worst value of their column.
+    """
+    costs = np.asarray(costs, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    finite = np.isfinite(costs)
+    lo = np.where(finite, costs, np.inf).min(axis=0)
+    hi = np.where(finite, costs, -np.inf).max(axis=0)
+    span = np.where(hi > lo, hi - lo, 1.0)
+    with np.errstate(invalid="ignore"):
+        norm = np.where(finite, (costs - lo) / span, 1.0)
+    norm = np.where(np.isfinite(lo), norm, 1.0) # Column without any known value
+    return norm @ weights
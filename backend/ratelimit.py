@@ -0,0 +1,208 @@
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+
+from fastapi import HTTPException, Request
+
+import metrics
+
+# Per-user / per-organization rate limits and per-organization concurrency caps.
+#
+# Each expensive endpoint group ("scope") has a token bucket per user and per
+# organization (rate per minute, burst) plus a cap on requests in flight per
+# organization. The principal comes from the JWT (auth_utils.get_principal);
+# anonymous requests are keyed by client address. Buckets live in memory, or in
+# a small SQLite file (RATE_LIMIT_DB) to survive restarts and be shared between
+# worker processes. Concurrency slots are always per process.
+
+Policy = namedtuple("Policy", "user_rpm user_burst org_rpm org_burst concurrency")
+
+POLICIES = {
+    "selection": Policy(120, 30, 600, 120, 4),
+    "calculate": Policy(60, 20, 300, 60, 4),
+    "drawings": Policy(300, 60, 1200, 200, 8),
+    "datasheets": Policy(30, 10, 120, 30, 2),
+    "extraction": Policy(30, 10, 120, 30, 2),
+    "tiles": Policy(1200, 200, 6000, 600, 16),
+    "admin": Policy(6, 3, 12, 4, 1),
+}
+
+def _env_policy(scope, default):
+    # e.g. RATE_LIMIT_SELECTION="120,30,600,120,4" (user_rpm, user_burst, org_rpm, org_burst, concurrency)
+    raw = os.getenv(f"RATE_LIMIT_{scope.upper()}")
+    if not raw:
+        return default
+    values = raw.split(",")
+    return Policy(*[float(x) for x in values[:4]], int(values[4]))
+
+POLICIES = {scope: _env_policy(scope, policy) for scope, policy in POLICIES.items()}
+
+RATE_LIMITED = metrics.register(metrics.Counter(
+    "ruspump_rate_limited_total", "Requests rejected with 429 by scope and reason", ("scope", "reason")))
+
+
+class MemoryBuckets:
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rpm, burst, cost=1.0, now=None):
+        """Takes `cost` tokens; returns 0 if allowed, else the seconds until enough tokens refill."""
+        now = time.monotonic() if now is None else now
+        rate = rpm / 60.0
+        with self._lock:
+            tokens, updated = self._state.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                self._state[key] = (tokens - cost, now)
+                return 0.0
+            self._state[key] = (tokens, now)
+            return (cost - tokens) / rate if rate > 0 else 60.0
+
+    def refund(self, key, burst, cost=1.0):
+        with self._lock:
+            if key in self._state:
+                tokens, updated = self._state[key]
+                self._state[key] = (min(burst, tokens + cost), updated)
+
+    def reset(self):
+        with self._lock:
+            self._state.clear()
+
+
+class SqliteBuckets:
+    """Same interface as MemoryBuckets, state in a SQLite table shared by worker processes (wall clock)."""
+
+    def __init__(self, path):
+        self.path = path
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS rate_buckets (
+                key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)""")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        import sqlite3
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def take(self, key, rpm, burst, cost=1.0, now=None):
+        now = time.time() if now is None else now
+        rate = rpm / 60.0
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE key=?", (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute("INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) VALUES (?, ?, ?)", (key, tokens, now))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        if allowed:
+            return 0.0
+        return (cost - tokens) / rate if rate > 0 else 60.0
+
+    def refund(self, key, burst, cost=1.0):
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE rate_buckets SET tokens = MIN(?, tokens + ?) WHERE key=?", (burst, cost, key))
+        finally:
+            conn.close()
+
+    def reset(self):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM rate_buckets")
+        finally:
+            conn.close()
+
+
+class Slots:
+    """Requests in flight per key (non-blocking: a full key is rejected, not queued)."""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, limit):
+        with self._lock:
+            if self._counts.get(key, 0) >= limit:
+                return False
+            self._counts[key] = self._counts.get(key, 0) + 1
+            return True
+
+    def release(self, key):
+        with self._lock:
+            n = self._counts.get(key, 0) - 1
+            if n > 0:
+                self._counts[key] = n
+            else:
+                self._counts.pop(key, None)
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+_buckets = None
+_slots = Slots()
+
+
+def get_buckets():
+    global _buckets
+    if _buckets is None:
+        from config import config
+        _buckets = SqliteBuckets(config.RATE_LIMIT_DB) if config.RATE_LIMIT_DB else MemoryBuckets()
+    return _buckets
+
+
+def reset():
+    get_buckets().reset()
+    _slots.reset()
+
+
+def _reject(scope, reason, retry_after, detail):
+    RATE_LIMITED.inc((scope, reason))
+    raise HTTPException(status_code=429, detail=detail,
+                        headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+def rate_limit(scope):
+    """FastAPI dependency for a scope in POLICIES: 429 + Retry-After when over a limit."""
+
+    async def dependency(request: Request):
+        from config import config
+        if not config.RATE_LIMIT_ENABLED:
+            yield
+            return
+        from auth_utils import get_principal
+        policy = POLICIES[scope]
+        principal = get_principal(request)
+        buckets = get_buckets()
+
+        user_key = f"{scope}:{principal.user}"
+        wait = buckets.take(user_key, policy.user_rpm, policy.user_burst)
+        if wait:
+            _reject(scope, "user", wait, "Too many requests, please retry later")
+        if principal.org is not None:
+            wait = buckets.take(f"{scope}:{principal.org}", policy.org_rpm, policy.org_burst)
+            if wait:
+                buckets.refund(user_key, policy.user_burst)
+                _reject(scope, "org", wait, "Your organization is sending too many requests, please retry later")
+
+        slot_key = f"{scope}:{principal.org or principal.user}"
+        if not _slots.acquire(slot_key, policy.concurrency):
+            _reject(scope, "concurrency", 1, "Too many concurrent requests, please retry later")
+        try:
+            yield
+        finally:
+            _slots.release(slot_key)
+
+    return dependency
@@ -0,0 +1,58 @@
+import json
+from typing import Any, List, Optional
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError: # Optional: falls back to the standard library encoder
+    orjson = None
+
+
+def _default(obj):
+    # numpy scalars/arrays (selection, curves) when orjson is not available
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """Compact JSON response rendered with orjson, bypassing FastAPI's jsonable_encoder.
+
+    Content must already be plain JSON types (dicts, lists, str, numbers, None, numpy values).
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def to_columnar(rows: List[dict], fields: Optional[List[str]] = None) -> dict:
+    """Column-oriented list payload: field names once, one value array per field.
+
+    {"format": "columnar", "count": 2, "fields": ["id", "name"], "columns": [[1, 2], ["A", "B"]]}
+    """
+    if fields is None:
+        fields = list(rows[0].keys()) if rows else []
+    return {
+        "format": "columnar",
+        "count": len(rows),
+        "fields": fields,
+        "columns": [[row.get(f) for row in rows] for f in fields],
+    }
+
+
+def list_response(rows: List[dict], format: str = "json", fields: Optional[str] = None, headers=None):
+    """Renders a list endpoint in the requested format ("json" rows or "columnar") with optional field projection."""
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    if format == "columnar":
+        return FastJSONResponse(to_columnar(rows, selected), headers=headers)
+    if selected:
+        rows = [{f: row.get(f) for f in selected} for row in rows]
+    return FastJSONResponse(rows, headers=headers)
@@ -1,5 +1,6 @@
-from fastapi import APIRouter, UploadFile, File, Form, Response
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, Form, Response, Depends
+from fastapi.responses import FileResponse, JSONResponse
+from datetime import datetime
 import shutil
 import os
 import sqlite3
@@ -7,9 +8,120 @@ import sys
 
 # Adjust path to import utils from parent directory
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from db_utils import get_db_path, get_conn
+from db_utils import get_db_path, get_sensitive_db_path, get_files_db_path, get_conn, init_db, bump_all_revisions, reset_all_revisions, get_pumps_engine
+from jobs import job_handler, submit
+from migrations import backfill_bep, backfill_dedup, backfill_specs
+from routers.jobs import job_accepted
+from ratelimit import rate_limit
+from auth_utils import get_current_admin
 
-router = APIRouter(prefix="/api/admin", tags=["admin"])
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(rate_limit("admin"))])
+
+MERGE_BATCH = 500
+
+
+def _merge_import(temp_path, progress=None):
+    """Appends every pump of an uploaded pumps.db (common columns only). Returns the number of records."""
+    conn_src = sqlite3.connect(temp_path); conn_src.row_factory = sqlite3.Row
+    rows = conn_src.execute("SELECT * FROM pumps").fetchall()
+    src_cols = [d[0] for d in conn_src.execute("SELECT * FROM pumps LIMIT 1").description]
+    conn_src.close()
+    if not rows:
+        return 0
+
+    conn_dest = get_conn()
+    try:
+        dest_cols = [row[1] for row in conn_dest.execute("PRAGMA table_info(pumps)").fetchall()]
+        common_cols = [c for c in src_cols if c in dest_cols and c != 'id']
+        if not common_cols:
+            raise ValueError("No common columns found")
+
+        col_names = ",".join(common_cols)
+        placeholders = ",".join(["?"] * len(common_cols))
+        sql = f"INSERT INTO pumps ({col_names}) VALUES ({placeholders})"
+        for start in range(0, len(rows), MERGE_BATCH):
+            conn_dest.executemany(sql, ([row[c] for c in common_cols] for row in rows[start:start + MERGE_BATCH]))
+            if progress:
+                progress(min(start + MERGE_BATCH, len(rows)) / len(rows), f"{start + MERGE_BATCH} / {len(rows)}")
+
+        # Sources from older versions carry no BEP columns, duplicate keys or numeric specs
+        backfill_bep(conn_dest)
+        backfill_dedup(conn_dest)
+        backfill_specs(conn_dest)
+        bump_all_revisions(conn_dest)
+        conn_dest.commit() # All or nothing: a cancelled merge rolls back on close
+    finally:
+        conn_dest.close()
+    return len(rows)
+
+
+def _replace_import(temp_path):
+    db_path = get_db_path()
+    # The new file carries its own (older) revisions: move every org past the current ones
+    conn = get_conn()
+    try: old_max = conn.execute("SELECT COALESCE(MAX(revision), 0) FROM catalogue_revisions").fetchone()[0]
+    except sqlite3.OperationalError: old_max = 0
+    conn.close()
+    shutil.move(temp_path, db_path)
+    init_db() # Older backups are upgraded to the current schema version
+    conn = get_conn()
+    bump_all_revisions(conn, step=old_max + 1)
+    reset_all_revisions(conn) # Synced clients hold pumps the new file may not have: they must reload
+    conn.commit(); conn.close()
+    get_pumps_engine().dispose() # Other workers drop their pooled connections at checkout (db_utils._follow_file)
+
+
+@job_handler("import_db")
+def import_db_job(job, temp_path, merge=False):
+    try:
+        if merge:
+            count = _merge_import(temp_path, job.progress)
+            return {"message": f"Successfully merged {count} records." if count else "Imported DB is empty", "count": count}
+        job.progress(0.1, "Replacing database", force=True)
+        _replace_import(temp_path)
+        return {"message": "Database replaced successfully"}
+    finally:
+        if os.path.exists(temp_path): os.remove(temp_path)
+
+
+def _backup_dir():
+    path = os.path.join(os.path.dirname(get_db_path()), "backups")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@job_handler("backup")
+def backup_job(job):
+    """Consistent online copies of all three databases (sqlite3 backup API) in <DB_DIR>/backups."""
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    sources = [get_db_path(), get_sensitive_db_path(), get_files_db_path()]
+    files = []
+    for n, src_path in enumerate(sources):
+        name = f"{stamp}_{os.path.basename(src_path)}"
+        src = sqlite3.connect(src_path); dst = sqlite3.connect(os.path.join(_backup_dir(), name))
+        try:
+            src.backup(dst, pages=256, progress=lambda status, remaining, total:
+                       job.progress((n + (total - remaining) / max(total, 1)) / len(sources), f"Copying {os.path.basename(src_path)}"))
+        finally:
+            dst.close(); src.close()
+        files.append({"name": name, "size": os.path.getsize(os.path.join(_backup_dir(), name)),
+                      "download": f"/api/admin/backups/{name}"})
+    return {"files": files}
+
+
+@job_handler("backfill_bep")
+def backfill_bep_job(job, force=False):
+    from migrations import backfill_bep
+    conn = get_conn()
+    try:
+        job.progress(0.0, "Computing BEP", force=True)
+        updated = backfill_bep(conn, force=force)
+        if updated:
+            bump_all_revisions(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    return {"updated": updated}
 
 @router.get("/export_db")
 async def export_db():
@@ -18,58 +130,70 @@ async def export_db():
         return FileResponse(db_path, filename="pumps_backup.db", media_type="application/x-sqlite3")
     return Response(status_code=404, content="Database not found")
 
+def _receive_upload(file, temp_path):
+    """Copies an uploaded pumps.db to temp_path; returns a 400 response if it is not a pump database."""
+    with open(temp_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+    try:
+        conn_chk = sqlite3.connect(temp_path)
+        conn_chk.execute("SELECT count(*) FROM pumps")
+        conn_chk.close()
+    except Exception as e:
+        if os.path.exists(temp_path): os.remove(temp_path)
+        return Response(status_code=400, content=f"Invalid database file: {str(e)}")
+    return None
+
 @router.post("/import_db")
 async def import_db(file: UploadFile = File(...), merge: str = Form("false")):
     try:
         db_path = get_db_path()
         temp_path = db_path + ".tmp"
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Verify
-        try:
-            conn_chk = sqlite3.connect(temp_path)
-            conn_chk.execute("SELECT count(*) FROM pumps")
-            conn_chk.close()
-        except Exception as e:
-            if os.path.exists(temp_path): os.remove(temp_path)
-            return Response(status_code=400, content=f"Invalid database file: {str(e)}")
+        invalid = _receive_upload(file, temp_path)
+        if invalid is not None:
+            return invalid
 
         if merge.lower() == "true":
             # MERGE
-            conn_src = sqlite3.connect(temp_path); conn_src.row_factory = sqlite3.Row
-            rows = conn_src.execute("SELECT * FROM pumps").fetchall()
-            src_cols = [d[0] for d in conn_src.execute("SELECT * FROM pumps LIMIT 1").description]
-            conn_src.close()
-
-            if not rows:
+            try:
+                count = _merge_import(temp_path)
+            finally:
                 if os.path.exists(temp_path): os.remove(temp_path)
+            if not count:
                 return {"status": "ok", "message": "Imported DB is empty"}
-
-            conn_dest = get_conn()
-            dest_cols = [row[1] for row in conn_dest.execute("PRAGMA table_info(pumps)").fetchall()]
-            common_cols = [c for c in src_cols if c in dest_cols and c != 'id']
-
-            if not common_cols:
-                return {"status": "error", "message": "No common columns found"}
-
-            col_names = ",".join(common_cols)
-            placeholders = ",".join(["?"] * len(common_cols))
-            sql = f"INSERT INTO pumps ({col_names}) VALUES ({placeholders})"
-
-            count = 0
-            for row in rows:
-                conn_dest.execute(sql, [row[c] for c in common_cols])
-                count += 1
-            
-            conn_dest.commit(); conn_dest.close()
-            if os.path.exists(temp_path): os.remove(temp_path)
             return {"status": "ok", "message": f"Successfully merged {count} records."}
         else:
             # REPLACE
-            shutil.move(temp_path, db_path)
+            _replace_import(temp_path)
             return {"status": "ok", "message": "Database replaced successfully"}
             
     except Exception as e:
         if os.path.exists(db_path + ".tmp"): os.remove(db_path + ".tmp")
         return {"status": "error", "message": str(e)}
+
+@router.post("/import_db/background", dependencies=[Depends(get_current_admin)])
+async def import_db_background(file: UploadFile = File(...), merge: str = Form("false")):
+    """Validates the upload, then merges/replaces in a job and answers 202 with its id."""
+    # The job owns the file from here on: a unique name so a second upload cannot clobber it
+    job_path = f"{get_db_path()}.import-{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+    invalid = _receive_upload(file, job_path)
+    if invalid is not None:
+        return invalid
+    job_id = submit("import_db", {"temp_path": job_path, "merge": merge.lower() == "true"})
+    return JSONResponse(job_accepted(job_id), status_code=202)
+
+@router.post("/backup", dependencies=[Depends(get_current_admin)])
+async def start_backup():
+    """Starts a background backup of all databases; the finished job lists download links."""
+    return JSONResponse(job_accepted(submit("backup")), status_code=202)
+
+@router.get("/backups/{name}", dependencies=[Depends(get_current_admin)])
+async def download_backup(name: str):
+    path = os.path.join(_backup_dir(), os.path.basename(name))
+    if not os.path.isfile(path):
+        return Response(status_code=404, content="Backup not found")
+    return FileResponse(path, filename=os.path.basename(path), media_type="application/x-sqlite3")
+
+@router.post("/backfill-bep", dependencies=[Depends(get_current_admin)])
+async def start_backfill_bep(force: bool = False):
+    """Recomputes BEP and operating regions for all pumps in the background."""
+    return JSONResponse(job_accepted(submit("backfill_bep", {"force": force})), status_code=202)
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlmodel import Session, select
-from db_utils import engine_pumps
+from db_utils import get_pumps_engine, get_conn, bump_revision, bump_all_revisions
 from models import User, Organization
 from auth_utils import get_password_hash, verify_password, create_access_token, get_current_active_user, get_current_admin
 from pydantic import BaseModel, EmailStr
@@ -31,7 +31,7 @@ class UserOut(BaseModel):
 
 @router.post("/register", response_model=Token)
 async def register(data: UserRegister):
-    with Session(engine_pumps) as session:
+    with Session(get_pumps_engine()) as session:
         # Check if this is the first organization ever created
         first_org = session.exec(select(Organization)).first() is None
         
@@ -62,16 +62,17 @@ async def register(data: UserRegister):
             session.execute(text("UPDATE pumps SET org_id = :org_id"), {"org_id": org.id})
             session.execute(text("UPDATE files SET org_id = :org_id"), {"org_id": org.id})
             session.commit()
+            conn = get_conn(); bump_all_revisions(conn); bump_revision(conn, org.id); conn.commit(); conn.close()
             print(f"MIGRATION: All legacy data moved to NEW Organization ID {org.id}")
         except Exception as e:
             print(f"MIGRATION ERROR in adoption: {e}")
         
-        access_token = create_access_token(data={"sub": user.email})
+        access_token = create_access_token(data={"sub": user.email, "org": user.org_id})
         return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    with Session(engine_pumps) as session:
+    with Session(get_pumps_engine()) as session:
         user = session.exec(select(User).where(User.email == form_data.username)).first()
         if not user or not verify_password(form_data.password, user.hashed_password):
             raise HTTPException(
@@ -79,7 +80,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
                 detail="Incorrect email or password",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        access_token = create_access_token(data={"sub": user.email})
+        access_token = create_access_token(data={"sub": user.email, "org": user.org_id})
         return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserOut)
@@ -88,13 +89,13 @@ async def read_users_me(current_user: User = Depends(get_current_active_user)):
 
 @router.get("/users", response_model=List[UserOut])
 async def list_org_users(admin: User = Depends(get_current_admin)):
-    with Session(engine_pumps) as session:
+    with Session(get_pumps_engine()) as session:
         users = session.exec(select(User).where(User.org_id == admin.org_id)).all()
         return users
 
 @router.post("/users", response_model=UserOut)
 async def add_user_to_org(email: EmailStr, password: str, admin: User = Depends(get_current_admin)):
-    with Session(engine_pumps) as session:
+    with Session(get_pumps_engine()) as session:
         existing = session.exec(select(User).where(User.email == email)).first()
         if existing:
             raise HTTPException(status_code=400, detail="User already exists")
@@ -112,7 +113,7 @@ async def add_user_to_org(email: EmailStr, password: str, admin: User = Depends(
 
 @router.delete("/users/{user_id}")
 async def remove_user_from_org(user_id: int, admin: User = Depends(get_current_admin)):
-    with Session(engine_pumps) as session:
+    with Session(get_pumps_engine()) as session:
         user = session.get(User, user_id)
         if not user or user.org_id != admin.org_id:
             raise HTTPException(status_code=404, detail="User not found")
@@ -0,0 +1,146 @@
+import threading
+from collections import OrderedDict
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import Session
+
+from auth_utils import get_current_active_user
+from db_utils import get_session
+from models import User
+from responses import FastJSONResponse
+from ratelimit import rate_limit
+
+router = APIRouter(prefix="/api", tags=["curves"])
+
+MAX_IDS = 200
+MEMO_SIZE = 4096
+
+# Sampled curves per (pump id, pump revision, samples, duty): a saved pump gets a
+# new revision on every change, so entries never need explicit invalidation.
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def _memo_get(key):
+    with _memo_lock:
+        entry = _memo.get(key)
+        if entry is not None:
+            _memo.move_to_end(key)
+        return entry
+
+
+def _memo_put(key, entry):
+    with _memo_lock:
+        _memo[key] = entry
+        _memo.move_to_end(key)
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+
+
+def clear_memo():
+    with _memo_lock:
+        _memo.clear()
+
+
+def _rounded(a):
+    import numpy as np
+    return np.round(a, 4).tolist()
+
+
+def _sample(cat, rows, duty, samples):
+    """Curves, system curve and operating point for catalogue rows, all pumps at once."""
+    import numpy as np
+    from calc_utils import sample_curves, operating_points, polyval_rows
+
+    q_req, h_req, h_st = (np.array([d[i] for d in duty], dtype=float) for i in range(3))
+    q_min, q_max = cat.q_min[rows], cat.q_max[rows]
+    h_coeffs = cat.h[rows]
+    q, h = sample_curves(h_coeffs, q_min, q_max, samples)
+    curves = {"h": h}
+    for name in ("eff", "p2", "npsh"):
+        curves[name] = polyval_rows(getattr(cat, name)[rows], q)
+
+    q_int, h_int, draw_limit = operating_points(h_coeffs, q_max, q_req, h_req, h_st)
+    k = (h_req - h_st) / np.where(q_req != 0, q_req * q_req, 1.0)
+    q_sys = draw_limit[:, None] * np.linspace(0.0, 1.0, samples)[None, :]
+    h_sys = h_st[:, None] + k[:, None] * q_sys * q_sys
+    at_point = {name: polyval_rows(getattr(cat, name)[rows], q_int) for name in ("eff", "p2", "npsh")}
+
+    entries = []
+    for n, i in enumerate(rows):
+        has = {name: bool(getattr(cat, "has_" + name)[i]) for name in ("h", "eff", "p2", "npsh")}
+        entries.append({
+            "id": int(cat.ids[i]),
+            "revision": int(cat.pump_revision[i]),
+            "q_min": float(q_min[n]), "q_max": float(q_max[n]),
+            "q_axis_max": float(max(q_max[n], draw_limit[n])),
+            "duty": {"q_req": float(q_req[n]), "h_req": float(h_req[n]), "h_st": float(h_st[n])},
+            "curves": {
+                "q": _rounded(q[n]),
+                **{name: _rounded(values[n]) if has[name] else None for name, values in curves.items()},
+            },
+            "system": {"q": _rounded(q_sys[n]), "h": _rounded(h_sys[n])},
+            "operating_point": {
+                "q": float(q_int[n]), "h": float(h_int[n]),
+                **{name: float(values[n]) if has[name] else None for name, values in at_point.items()},
+            },
+        })
+    return entries
+
+
+@router.get("/curves", dependencies=[Depends(rate_limit("selection"))])
+async def get_curves(
+    ids: str,
+    samples: int = Query(100, ge=2, le=1000),
+    q_req: Optional[float] = None, h_req: Optional[float] = None, h_st: Optional[float] = None,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Pre-sampled chart data for one or many pumps: ids=1,2,3.
+
+    Each pump gets `samples` points of H, eff, P2 and NPSH over [q_min, q_max],
+    the system curve up to the chart limit and the operating point. The duty point
+    defaults to the one saved with each pump; q_req/h_req/h_st override it for all.
+    """
+    import numpy as np
+    from catalogue import load_catalogue
+
+    try:
+        wanted = list(dict.fromkeys(int(x) for x in ids.split(",") if x.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if not wanted:
+        raise HTTPException(status_code=400, detail="No pump ids given")
+    if len(wanted) > MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IDS} pumps per request")
+
+    cat = load_catalogue(session, current_user.org_id)
+    pos = np.searchsorted(cat.ids, wanted)
+    found = {pid: int(p) for pid, p in zip(wanted, pos) if p < len(cat.ids) and cat.ids[p] == pid}
+
+    results = {}
+    misses = []
+    for pid, i in found.items():
+        duty = (
+            q_req if q_req is not None else float(cat.q_req[i]),
+            h_req if h_req is not None else float(cat.h_req[i]),
+            h_st if h_st is not None else float(cat.h_st[i]),
+        )
+        key = (pid, int(cat.pump_revision[i]), samples, duty)
+        entry = _memo_get(key)
+        if entry is None:
+            misses.append((i, duty, key))
+        else:
+            results[pid] = entry
+
+    if misses:
+        entries = _sample(cat, np.array([m[0] for m in misses], dtype=np.int64), [m[1] for m in misses], samples)
+        for (_, _, key), entry in zip(misses, entries):
+            _memo_put(key, entry)
+            results[key[0]] = entry
+
+    return FastJSONResponse({
+        "samples": samples,
+        "pumps": [results[pid] for pid in wanted if pid in results],
+        "missing": [pid for pid in wanted if pid not in found],
+    })
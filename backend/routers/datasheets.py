@@ -0,0 +1,97 @@
+import os
+from typing import List, Literal
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse, JSONResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+
+import datasheet_utils
+from auth_utils import get_current_active_user
+from config import config
+from db_utils import get_conn
+from jobs import job_handler, submit
+from models import User
+from ratelimit import rate_limit
+from routers.jobs import job_accepted, _visible_job
+
+router = APIRouter(prefix="/api", tags=["datasheets"], dependencies=[Depends(rate_limit("datasheets"))])
+
+MAX_BULK = 2000
+
+
+class BulkDatasheetRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BULK) # e.g. the ids of a selection result
+    format: Literal["pdf", "png"] = "pdf"
+
+
+def _require_renderer():
+    if not datasheet_utils.available():
+        raise HTTPException(status_code=503, detail="Datasheet rendering is not available (matplotlib is not installed)")
+
+
+def _load_pumps(org_id, ids):
+    """Pump rows of an organization as dicts, in the order of ids."""
+    conn = get_conn()
+    try:
+        rows = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            for row in conn.execute(f"SELECT * FROM pumps WHERE org_id IS ? AND id IN ({','.join('?' * len(chunk))})",
+                                    (org_id, *chunk)):
+                rows[row["id"]] = dict(row)
+    finally:
+        conn.close()
+    return [rows[i] for i in dict.fromkeys(ids) if i in rows]
+
+
+def _exports_dir():
+    return os.path.join(str(config.DB_DIR), "exports")
+
+
+@job_handler("datasheets_zip")
+def datasheets_zip_job(job, org_id, ids, format="pdf"):
+    pumps = _load_pumps(org_id, ids)
+    job.progress(0.0, f"Rendering {len(pumps)} datasheets", force=True)
+    name = f"datasheets_{job.id}.zip"
+    count, errors = datasheet_utils.build_zip(pumps, format, os.path.join(_exports_dir(), name),
+                                              config.RENDER_WORKERS, progress=job.progress)
+    found = {p["id"] for p in pumps}
+    return {"file": name, "count": count, "missing": [i for i in ids if i not in found], "errors": errors}
+
+
+@router.get("/pumps/{pump_id}/datasheet")
+async def get_datasheet(pump_id: int, format: Literal["pdf", "png"] = "pdf",
+                        current_user: User = Depends(get_current_active_user)):
+    """Datasheet of one pump (charts + drawing), served from the render cache while the pump is unchanged."""
+    _require_renderer()
+    pumps = _load_pumps(current_user.org_id, [pump_id])
+    if not pumps:
+        raise HTTPException(status_code=404, detail="Pump not found")
+    pump = pumps[0]
+    path = await run_in_threadpool(datasheet_utils.get_datasheet, pump, format)
+    return FileResponse(path, media_type=datasheet_utils.FORMATS[format],
+                        filename=datasheet_utils.archive_name(pump, format),
+                        headers={"ETag": f'"{pump_id}-{pump.get("revision") or 0}-{format}"'})
+
+
+@router.post("/datasheets/bulk")
+async def start_bulk_datasheets(data: BulkDatasheetRequest, current_user: User = Depends(get_current_active_user)):
+    """Zip of datasheets for many pumps, rendered in worker processes by a background job (202)."""
+    _require_renderer()
+    job_id = submit("datasheets_zip", {"org_id": current_user.org_id, "ids": data.ids, "format": data.format},
+                    org_id=current_user.org_id)
+    return JSONResponse(job_accepted(job_id), status_code=202)
+
+
+@router.get("/datasheets/bulk/{job_id}")
+async def download_bulk_datasheets(job_id: int, current_user: User = Depends(get_current_active_user)):
+    job = _visible_job(job_id, current_user)
+    if job["kind"] != "datasheets_zip":
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    path = os.path.join(_exports_dir(), os.path.basename(job["result"]["file"]))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Archive no longer exists")
+    return FileResponse(path, media_type="application/zip", filename=job["result"]["file"])
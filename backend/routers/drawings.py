@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Response, Depends, HTTPException
+from fastapi import APIRouter, Response, Depends, HTTPException, UploadFile, File
 from fastapi.responses import JSONResponse
 import os
 import sys
@@ -12,26 +12,48 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(BASE_DIR)
 
 from db_utils import get_files_conn
+from upload_utils import spool_upload, store_drawing
+from config import config
+from ratelimit import rate_limit
 
-router = APIRouter(prefix="/api/drawings", tags=["drawings"])
+router = APIRouter(prefix="/api/drawings", tags=["drawings"], dependencies=[Depends(rate_limit("drawings"))])
+
+@router.post("")
+async def upload_drawing(file: UploadFile = File(...), current_user: User = Depends(get_current_active_user)):
+    """Stores a drawing on its own; link it to a pump with the `drawing_id` form field of /api/calculate.
+
+    The upload is streamed (temp file + incremental BLOB write) and limited to MAX_UPLOAD_MB.
+    """
+    spooled = await spool_upload(file, config.MAX_UPLOAD_MB * 1024 * 1024)
+    try:
+        conn = get_files_conn()
+        try:
+            file_id = store_drawing(conn, spooled, current_user.org_id)
+        finally:
+            conn.close()
+    finally:
+        spooled.discard()
+    return {"id": file_id, "path": f"/api/drawings/{file_id}", "filename": spooled.filename,
+            "size": spooled.size, "sha256": spooled.sha256, "mime": spooled.mime}
 
 @router.get("/{file_id}")
 async def get_drawing(file_id: int, current_user: User = Depends(get_current_active_user)):
     try:
         conn = get_files_conn()
         # Security: check org_id or if it's a legacy public file (org_id IS NULL)
-        row = conn.execute("SELECT filename, data FROM files WHERE id=? AND (org_id=? OR org_id IS NULL)", 
+        row = conn.execute("SELECT filename, data, mime FROM files WHERE id=? AND (org_id=? OR org_id IS NULL)", 
                            (file_id, current_user.org_id)).fetchone()
         conn.close()
         
         if not row:
             return Response(status_code=404, content="File not found or unauthorized")
             
-        fname, data = row
+        fname, data, mime = row
         if not data:
             return Response(content="File data is empty", status_code=500)
 
-        mime = "application/pdf" if fname.lower().endswith(".pdf") else "application/octet-stream"
+        if not mime: # Stored before uploads were sniffed
+            mime = "application/pdf" if fname.lower().endswith(".pdf") else "application/octet-stream"
         safe_fname = quote(fname)
         
         return Response(
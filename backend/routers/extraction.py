@@ -0,0 +1,171 @@
+import os
+import tempfile
+from typing import List, Literal, Optional, Tuple
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, ValidationError
+from starlette.concurrency import run_in_threadpool
+
+import extraction_utils
+from auth_utils import get_current_active_user
+from config import config
+from db_utils import get_files_conn
+from jobs import job_handler, submit
+from models import User
+from ratelimit import rate_limit
+from routers.jobs import job_accepted
+from upload_utils import spool_upload, CHUNK_SIZE
+
+router = APIRouter(prefix="/api/extraction", tags=["extraction"], dependencies=[Depends(rate_limit("extraction"))])
+
+MAX_PAGES = 1000
+
+
+class CurveSpec(BaseModel):
+    mode: Literal["QH", "QP", "QN", "QE"]
+    color: str # "#rrggbb" of the curve on the page
+    tolerance: float = Field(60, gt=0, le=442) # RGB distance
+    y_axis: Tuple[float, float, float, float] # px0, px1 (pixel rows), val0, val1
+
+
+class ExtractionSpec(BaseModel):
+    """Calibration as in the digitizer: two pixel/value pairs per axis, one Y axis per curve."""
+    x_axis: Tuple[float, float, float, float] # px0, px1 (pixel columns), val0, val1
+    curves: List[CurveSpec] = Field(..., min_length=1, max_length=4)
+    points: int = Field(15, ge=2, le=200)
+    dpi: int = Field(extraction_utils.DEFAULT_DPI, ge=36, le=600) # PDF pages: pixel coordinates refer to this DPI
+
+
+def _parse_spec(calibration: str) -> ExtractionSpec:
+    try:
+        return ExtractionSpec.model_validate_json(calibration)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
+
+def _parse_pages(text, count):
+    """'1-5,8' -> zero-based page indexes; empty means all pages."""
+    if not text or not text.strip():
+        return list(range(count))
+    pages = []
+    for part in text.split(","):
+        lo, _, hi = part.strip().partition("-")
+        try:
+            lo, hi = int(lo), int(hi or lo)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="pages must look like '1-5,8'")
+        if lo > hi:
+            raise HTTPException(status_code=400, detail=f"Page range {lo}-{hi} is reversed")
+        # Bounds first: a range is expanded only once it is known to fit the document
+        if lo < 1 or hi > count:
+            raise HTTPException(status_code=400, detail=f"Document has {count} pages")
+        pages.extend(range(lo - 1, hi))
+    return list(dict.fromkeys(pages))
+
+
+def _require(mime):
+    if mime != "application/pdf" and mime not in extraction_utils.RASTER_MIMES:
+        raise HTTPException(status_code=415, detail=f"Curves can be traced on PDF, PNG or JPEG files, not {mime or 'unknown types'}")
+    if not extraction_utils.supports(mime):
+        lib = "pypdfium2" if mime == "application/pdf" else "Pillow"
+        raise HTTPException(status_code=503, detail=f"Curve extraction from {mime} is not available ({lib} is not installed)")
+
+
+def _drawing_to_temp(file_id, org_id):
+    """Copies a stored drawing to a temp file through a BLOB handle; returns (path, mime)."""
+    conn = get_files_conn()
+    try:
+        row = conn.execute("SELECT id, mime, filename FROM files WHERE id=? AND (org_id IS ? OR org_id IS NULL)",
+                           (file_id, org_id)).fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="Drawing not found")
+        mime = row[1] or ("application/pdf" if (row[2] or "").lower().endswith(".pdf") else None)
+        fd, path = tempfile.mkstemp(prefix="extract_")
+        with os.fdopen(fd, "wb") as out, conn.blobopen("files", "data", file_id, readonly=True) as blob:
+            while True:
+                chunk = blob.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                out.write(chunk)
+    finally:
+        conn.close()
+    return path, mime
+
+
+def _spec_args(spec: ExtractionSpec):
+    return spec.x_axis, [c.model_dump() for c in spec.curves], spec.points
+
+
+@job_handler("extract_curves")
+def extract_curves_job(job, org_id, drawing_id, pages, spec):
+    spec = ExtractionSpec.model_validate(spec)
+    path, mime = _drawing_to_temp(drawing_id, org_id)
+    try:
+        job.progress(0.0, f"Tracing {len(pages)} pages", force=True)
+        results = extraction_utils.extract_document(path, mime, pages, spec.dpi, *_spec_args(spec),
+                                                    workers=config.RENDER_WORKERS, progress=job.progress)
+    finally:
+        os.remove(path)
+    return {"drawing_id": drawing_id, "pages": results,
+            "failed": sum(1 for r in results if "error" in r)}
+
+
+@router.post("/trace")
+async def trace(
+    calibration: str = Form(...),
+    file: Optional[UploadFile] = File(None),
+    drawing_id: Optional[int] = Form(None),
+    page: int = Form(1),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Traces the calibrated curves on one page of an upload or a stored drawing.
+
+    Returns q_text and h_text/p2_text/npsh_text/eff_text ready for /api/calculate.
+    """
+    spec = _parse_spec(calibration)
+    if file is not None:
+        spooled = await spool_upload(file, config.MAX_UPLOAD_MB * 1024 * 1024)
+        path, mime, cleanup = spooled.path, spooled.mime, spooled.discard
+    elif drawing_id is not None:
+        path, mime = _drawing_to_temp(drawing_id, current_user.org_id)
+        cleanup = lambda: os.remove(path)
+    else:
+        raise HTTPException(status_code=400, detail="Send a file or a drawing_id")
+    try:
+        _require(mime)
+        result = await run_in_threadpool(extraction_utils.extract_page,
+                                         (path, mime, page - 1, spec.dpi, *_spec_args(spec)))
+    finally:
+        cleanup()
+    if "error" in result:
+        raise HTTPException(status_code=422, detail=result["error"])
+    return result
+
+
+@router.post("/bulk")
+async def trace_bulk(
+    calibration: str = Form(...),
+    drawing_id: int = Form(...), # A catalogue PDF uploaded through POST /api/drawings
+    pages: str = Form(""),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Traces the same calibrated chart layout on many pages of a catalogue in a background job (202)."""
+    spec = _parse_spec(calibration)
+    path, mime = _drawing_to_temp(drawing_id, current_user.org_id)
+    try:
+        _require(mime)
+        if mime != "application/pdf":
+            raise HTTPException(status_code=415, detail="Bulk extraction needs a PDF")
+        try:
+            count = extraction_utils.page_count(path)
+        except extraction_utils.ExtractionError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        page_list = _parse_pages(pages, count)
+    finally:
+        os.remove(path)
+    if len(page_list) > MAX_PAGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PAGES} pages per job")
+    job_id = submit("extract_curves", {"org_id": current_user.org_id, "drawing_id": drawing_id,
+                                       "pages": page_list, "spec": spec.model_dump()}, org_id=current_user.org_id)
+    return JSONResponse(job_accepted(job_id), status_code=202)
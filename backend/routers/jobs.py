@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+import jobs
+from auth_utils import get_current_active_user
+from models import User
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+def _visible_job(job_id: int, user: User):
+    job = jobs.get_job(job_id)
+    # Jobs without an organization (admin imports, backups) are visible to admins only
+    if job is None or not (job["org_id"] == user.org_id or (job["org_id"] is None and user.role == "admin")):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def job_accepted(job_id: int):
+    """Response body for endpoints that start a background job (HTTP 202)."""
+    return {"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}
+
+
+@router.get("")
+async def list_jobs(limit: int = 50, current_user: User = Depends(get_current_active_user)):
+    return jobs.list_jobs(current_user.org_id, include_global=current_user.role == "admin", limit=min(limit, 500))
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: int, current_user: User = Depends(get_current_active_user)):
+    """Status, progress (0..1), message and, when finished, the result or error of a job."""
+    return _visible_job(job_id, current_user)
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: int, current_user: User = Depends(get_current_active_user)):
+    job = _visible_job(job_id, current_user)
+    if job["status"] in jobs.FINISHED:
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    return jobs.cancel(job_id)
+
+
+@router.post("/{job_id}/retry")
+async def retry_job(job_id: int, current_user: User = Depends(get_current_active_user)):
+    job = _visible_job(job_id, current_user)
+    if job["status"] not in ("failed", "cancelled"):
+        raise HTTPException(status_code=409, detail="Only failed or cancelled jobs can be retried")
+    return jobs.retry(job_id)
@@ -1,31 +1,31 @@
-from fastapi import APIRouter, UploadFile, File, Form, Request, Response, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, Query, Request, Response, Depends, HTTPException
 from typing import Optional, List
 import json
 import os
+import zlib
 import sys
 from datetime import datetime
 from sqlmodel import Session, select
 from auth_utils import get_current_active_user
-from models import User, Pump, PrivateData
+from models import User, Pump
 
 # Adjust path to import utils from parent directory
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(BASE_DIR)
 
-from db_utils import get_conn, get_files_conn, get_sensitive_conn, UPLOAD_DIR, engine_pumps, engine_sensitive
-from calc_utils import get_fit, parse_float_list
+from db_utils import get_conn, get_files_conn, get_sensitive_conn, get_revision, get_reset_revision, stamp_pump, add_tombstone, merge_private_data, UPLOAD_DIR, get_pumps_engine, get_session
+from upload_utils import spool_upload, store_drawing
+from config import config
+from calc_utils import get_fit, parse_float_list, bep_fields, BEP_FIELDS
+from dedup_utils import curve_hash, curve_signature
+from spec_utils import NUMERIC_SPECS, numeric_specs
+from responses import list_response, FastJSONResponse
+from ratelimit import rate_limit
 
 router = APIRouter(prefix="/api", tags=["pumps"])
 
-ALLOWED_EXTENSIONS = {'.pdf', '.png', '.jpg', '.jpeg', '.dwg'}
-
-def validate_file_extension(filename: str):
-    ext = os.path.splitext(filename)[1].lower()
-    if ext not in ALLOWED_EXTENSIONS:
-        raise ValueError(f"File type '{ext}' is not allowed. Allowed: {', '.join(ALLOWED_EXTENSIONS)}")
-
-@router.post("/calculate")
-@router.get("/calculate")
+@router.post("/calculate", dependencies=[Depends(rate_limit("calculate"))])
+@router.get("/calculate", dependencies=[Depends(rate_limit("calculate"))])
 async def calculate(
     request: Request,
     name: str = Form(""), oem_name: str = Form(""), company: str = Form(""), executor: str = Form(""),
@@ -42,6 +42,7 @@ async def calculate(
     h_min: str = Form("0"), h_max: str = Form("100"),
     h_st: str = Form("0"),
     drawing: Optional[UploadFile] = File(None),
+    drawing_id: Optional[int] = Form(None), # File already uploaded via POST /api/drawings
     client_time: Optional[str] = Form(None),
     save_source: str = Form("points"),
     original_id: Optional[str] = Form(None),
@@ -65,6 +66,14 @@ async def calculate(
             q_req_val = float(q_req) if q_req else 0; h_req_val = float(h_req) if h_req else 0; h_st_val = float(h_st) if h_st else 0
             q_max_val = max(q) if q else 0; q_min_val = min(q) if q else 0
 
+        bep = bep_fields(ec, hc, q_min_val, q_max_val)
+        public_name = oem_name if oem_name else name # Stored name (the original one is private)
+        dedup_keys = (
+            curve_hash(hc, ec, pc, nc, q_min_val, q_max_val, public_name, company=company, rpm=rpm,
+                       impeller_actual=impeller_actual, dn_suction=dn_suction, dn_discharge=dn_discharge, p2_nom=p2_nom),
+            curve_signature(hc, q_min_val, q_max_val) if q_max_val > q_min_val else None,
+        )
+
         # 3. Drawing File Logic
         draw_path = ""; draw_filename = ""
         
@@ -82,30 +91,47 @@ async def calculate(
              if exist:
                  draw_path = exist['drawing_path']; draw_filename = exist['drawing_filename']
 
-        if drawing:
-            validate_file_extension(drawing.filename)
-            conn_f = get_files_conn(); cur_f = conn_f.cursor(); file_bytes = await drawing.read()
-            cur_f.execute("INSERT INTO files (filename, data, org_id) VALUES (?, ?, ?)", (drawing.filename, file_bytes, current_user.org_id))
-            fid = cur_f.lastrowid; conn_f.commit(); conn_f.close()
-            draw_path = f"/api/drawings/{fid}"; draw_filename = drawing.filename
+        if drawing_id is not None:
+            conn_f = get_files_conn()
+            row = conn_f.execute("SELECT filename FROM files WHERE id=? AND org_id IS ?", (drawing_id, current_user.org_id)).fetchone()
+            conn_f.close()
+            if not row:
+                raise HTTPException(status_code=404, detail="Drawing not found")
+            draw_path = f"/api/drawings/{drawing_id}"; draw_filename = row[0]
+        elif drawing:
+            # Streamed to a temp file and into the BLOB in chunks (size cap, type check)
+            spooled = await spool_upload(drawing, config.MAX_UPLOAD_MB * 1024 * 1024)
+            try:
+                conn_f = get_files_conn()
+                try: fid = store_drawing(conn_f, spooled, current_user.org_id)
+                finally: conn_f.close()
+            finally:
+                spooled.discard()
+            draw_path = f"/api/drawings/{fid}"; draw_filename = spooled.filename
 
         # 4. Save Logic
         res_id = "NEW"
         if id and id != "NEW": res_id = id
 
+        # Existing pumps with the same curves: reported as a warning, saving is never blocked
+        duplicates = _find_duplicates_of(current_user.org_id if current_user else None, res_id, dedup_keys)
+
         if save.lower() == "true":
             conn = get_conn(); cur = conn.cursor()
             
             # Sanitized Data for Public DB: Name=OEM, Price=0
-            public_name = oem_name if oem_name else name 
             p_price = 0.0; p_curr = ""
             now_str = client_time if client_time else datetime.now().strftime("%d.%m.%Y %H:%M")
+            bep_values = tuple(bep[f] for f in BEP_FIELDS)
+            specs = numeric_specs({"rpm": rpm, "p2_nom": p2_nom, "dn_suction": dn_suction,
+                                   "dn_discharge": dn_discharge, "impeller_actual": impeller_actual})
+            spec_values = tuple(specs[c] for c, _ in NUMERIC_SPECS.values()) + (1,)
 
             common_params = (public_name, oem_name, company, executor, dn_suction, dn_discharge, rpm, p2_nom, impeller_actual, 
                  q_text, h_text, npsh_text, p2_text, eff_text, 
                  json.dumps(hc), json.dumps(ec), json.dumps(pc), json.dumps(nc), 
                  q_max_val, q_min_val, h_max_val, h_min_val, q_req_val, h_req_val, h_st_val,
-                 draw_path, draw_filename, p_price, p_curr, comment, save_source, current_user.org_id)
+                 draw_path, draw_filename, p_price, p_curr, comment, save_source, current_user.org_id) + bep_values + dedup_keys + spec_values
 
             if id and id != "NEW":
                 cur.execute("""UPDATE pumps SET 
@@ -113,7 +139,10 @@ async def calculate(
                     p2_nom=?, impeller_actual=?, q_text=?, h_text=?, npsh_text=?, p2_text=?, eff_text=?,
                     h_coeffs=?, eff_coeffs=?, p2_coeffs=?, npsh_coeffs=?,
                     q_max=?, q_min=?, h_max=?, h_min=?, q_req=?, h_req=?, h_st=?, drawing_path=?, drawing_filename=?,
-                    price=?, currency=?, comment=?, save_source=?, org_id=?, updated_at=?
+                    price=?, currency=?, comment=?, save_source=?, org_id=?,
+                    bep_q=?, bep_h=?, bep_eff=?, por_q_min=?, por_q_max=?, aor_q_min=?, aor_q_max=?,
+                    curve_hash=?, curve_signature=?,
+                    rpm_value=?, p2_nom_kw=?, dn_suction_mm=?, dn_discharge_mm=?, impeller_mm=?, specs_parsed=?, updated_at=?
                     WHERE id=? AND org_id=?""", common_params + (now_str, id, current_user.org_id))
                 res_id = id
             else:
@@ -122,13 +151,16 @@ async def calculate(
                     q_text, h_text, npsh_text, p2_text, eff_text, 
                     h_coeffs, eff_coeffs, p2_coeffs, npsh_coeffs, 
                     q_max, q_min, h_max, h_min, q_req, h_req, h_st,
-                    drawing_path, drawing_filename, price, currency, comment, save_source, org_id, created_at, updated_at
-                ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
+                    drawing_path, drawing_filename, price, currency, comment, save_source, org_id,
+                    bep_q, bep_h, bep_eff, por_q_min, por_q_max, aor_q_min, aor_q_max, curve_hash, curve_signature,
+                    rpm_value, p2_nom_kw, dn_suction_mm, dn_discharge_mm, impeller_mm, specs_parsed, created_at, updated_at
+                ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
                 common_params + (now_str, now_str))
                 res_id = cur.lastrowid
             
-            conn.commit(); conn.close()
-            
+            stamp_pump(conn, res_id, current_user.org_id)
+
+            # Written before the revision bump commits: results cached per revision never see stale prices
             try:
                 conn_s = get_sensitive_conn()
                 conn_s.execute("INSERT OR REPLACE INTO private_data (id, original_name, price, currency) VALUES (?, ?, ?, ?)",
@@ -136,39 +168,166 @@ async def calculate(
                 conn_s.commit(); conn_s.close()
             except Exception as e:
                 print(f"Warning: Failed to save sensitive data: {e}")
-            
+
+            conn.commit(); conn.close()
+
         return {
             "id": res_id, "h_coeffs": hc, "eff_coeffs": ec, "p2_coeffs": pc, "npsh_coeffs": nc, 
-            "q_max": q_max_val, "q_min": q_min_val, "draw_path": draw_path
+            "q_max": q_max_val, "q_min": q_min_val, "draw_path": draw_path, **bep,
+            "duplicates": [d for d in duplicates if str(d["id"]) != str(res_id)]
         }
+    except HTTPException:
+        raise
     except Exception as e: 
         import traceback
         return {"id": "ERROR", "message": f"{str(e)} | {traceback.format_exc()}"}
 
+def _find_duplicates_of(org_id, pump_id, dedup_keys, limit=20):
+    """Pumps of the organization sharing the exact hash or the curve signature (indexed lookups)."""
+    exact, signature = dedup_keys
+    own_id = pump_id if str(pump_id).isdigit() else -1
+    conn = get_conn()
+    try:
+        # One lookup per index: with an OR, SQLite scans every pump of the organization
+        rows = conn.execute("""SELECT id, name, curve_hash FROM pumps WHERE org_id IS ? AND curve_hash = ? AND id != ?
+            UNION SELECT id, name, curve_hash FROM pumps WHERE org_id IS ? AND curve_signature = ? AND id != ?
+            ORDER BY id LIMIT ?""", (org_id, exact, own_id, org_id, signature, own_id, limit)).fetchall()
+    finally:
+        conn.close()
+    return [{"id": r["id"], "name": r["name"], "match": "exact" if r["curve_hash"] == exact else "near"} for r in rows]
+
+def spec_ranges(query_params):
+    """{numeric column: (min, max)} from `<field>_min` / `<field>_max` query parameters (NUMERIC_SPECS units)."""
+    ranges = {}
+    for field, (column, _) in NUMERIC_SPECS.items():
+        bounds = []
+        for suffix in ("min", "max"):
+            raw = query_params.get(f"{field}_{suffix}")
+            try:
+                bounds.append(float(raw) if raw not in (None, "") else None)
+            except ValueError:
+                raise HTTPException(status_code=422, detail=f"{field}_{suffix} must be a number")
+        if bounds != [None, None]:
+            ranges[column] = tuple(bounds)
+    return ranges
+
+def _load_org_pumps(org_id, since=None, ranges=None):
+    """Pump dicts of an organization (newest first) with private data merged; only changes after `since` if given.
+    `ranges` ({numeric column: (min, max)}) become range conditions on the (org_id, column) indexes."""
+    with Session(get_pumps_engine()) as session:
+        statement = select(Pump).where(Pump.org_id == org_id)
+        if since is not None:
+            statement = statement.where(Pump.revision > since)
+        for column, (low, high) in (ranges or {}).items():
+            # NULL (unparsed) specs never match a range
+            if low is not None:
+                statement = statement.where(getattr(Pump, column) >= low)
+            if high is not None:
+                statement = statement.where(getattr(Pump, column) <= high)
+        results = session.exec(statement.order_by(Pump.id.desc())).all()
+        pumps_list = [p.model_dump() for p in results]
+    return merge_private_data(pumps_list)
+
+def _list_etag(org_id, revision, format, fields, ranges=None):
+    # One validator per representation: the same revision rendered differently must not match
+    variant = zlib.crc32(f"{format}|{fields or ''}|{sorted((ranges or {}).items())}".encode())
+    return f'W/"{org_id or 0}-{revision}-{variant:x}"'
+
 @router.get("/pumps")
-async def get_pumps(response: Response, current_user: User = Depends(get_current_active_user)):
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+async def get_pumps(request: Request, format: str = "json", fields: Optional[str] = None,
+                    current_user: User = Depends(get_current_active_user)):
+    """Archive listing. format=columnar returns field names once and one value array per field;
+    fields=id,name,... limits the payload to the listed fields.
+    rpm_min/rpm_max, p2_nom_min/_max (kW), dn_suction_min/_max, dn_discharge_min/_max and
+    impeller_actual_min/_max (mm) filter on the parsed numeric specs.
+
+    Supports If-None-Match: the ETag changes only when the organization's catalogue revision does.
+    """
     print(f"FETCH PUMPS: User={current_user.email}, OrgID={current_user.org_id}")
     try:
-        with Session(engine_pumps) as session:
-            statement = select(Pump).where(Pump.org_id == current_user.org_id).order_by(Pump.id.desc())
-            results = session.exec(statement).all()
-            print(f"FETCH PUMPS: Found {len(results)} records for OrgID={current_user.org_id}")
-            pumps_list = [p.model_dump() for p in results]
-            
-            with Session(engine_sensitive) as session_s:
-                priv_data = session_s.exec(select(PrivateData)).all()
-                sens_map = {r.id: r for r in priv_data}
-                for p in pumps_list:
-                    if p["id"] in sens_map:
-                        s = sens_map[p["id"]]
-                        if s.original_name: p["name"] = s.original_name
-                        if s.price: p["price"] = s.price
-                        if s.currency: p["currency"] = s.currency
-            return pumps_list
+        ranges = spec_ranges(request.query_params)
+        conn = get_conn(); revision = get_revision(conn, current_user.org_id); conn.close()
+        etag = _list_etag(current_user.org_id, revision, format, fields, ranges)
+        headers = {
+            "Cache-Control": "private, no-cache", # Reusable, but always revalidated
+            "ETag": etag,
+            "X-Catalogue-Revision": str(revision),
+            "Access-Control-Expose-Headers": "ETag, X-Catalogue-Revision"
+        }
+        if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=headers)
+
+        pumps_list = _load_org_pumps(current_user.org_id, ranges=ranges)
+        print(f"FETCH PUMPS: Found {len(pumps_list)} records for OrgID={current_user.org_id}")
+        return list_response(pumps_list, format, fields, headers)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching pumps: {e}")
-        return []
+        return list_response([], format, fields, {"Cache-Control": "no-cache, no-store, must-revalidate"})
+
+@router.get("/pumps/changes")
+async def get_pump_changes(since: int = 0, current_user: User = Depends(get_current_active_user)):
+    """Incremental archive sync: pumps saved and ids deleted after revision `since`.
+
+    Clients store the returned `revision` and pass it as `since` next time. If `reset` is true
+    (e.g. the database was replaced by an import), the client must reload the full /api/pumps list.
+    """
+    conn = get_conn()
+    try:
+        # Read the revision first: changes racing with this request are re-sent next time, never lost
+        revision = get_revision(conn, current_user.org_id)
+        # since=0 holds nothing locally; below the reset floor the client's copy predates a replace
+        if since > revision or 0 < since < get_reset_revision(conn, current_user.org_id):
+            return FastJSONResponse({"revision": revision, "since": since, "reset": True, "upserts": [], "deletes": []})
+        deletes = [r[0] for r in conn.execute(
+            "SELECT DISTINCT id FROM pump_tombstones WHERE org_id IS ? AND revision > ?",
+            (current_user.org_id, since)).fetchall()]
+    finally:
+        conn.close()
+    upserts = _load_org_pumps(current_user.org_id, since) if since < revision else []
+    # A pump deleted after being saved in this window is only reported as deleted
+    deleted = set(deletes)
+    upserts = [p for p in upserts if p["id"] not in deleted]
+    return FastJSONResponse({"revision": revision, "since": since, "reset": False, "upserts": upserts, "deletes": deletes})
+
+@router.get("/pumps/duplicates")
+async def get_duplicate_pumps(session: Session = Depends(get_session),
+                              current_user: User = Depends(get_current_active_user)):
+    """Exact and near-duplicate groups over the organization's whole archive (one vectorized pass)."""
+    import numpy as np
+    from catalogue import load_catalogue
+    from dedup_utils import find_duplicates
+
+    cat = load_catalogue(session, current_user.org_id)
+    groups = find_duplicates(cat)
+    members = np.array(sorted({i for found in groups.values() for g in found for i in g}), dtype=np.int64)
+    records = cat.records_at(np.searchsorted(cat.ids, members))
+    names = {int(i): r["name"] if r else None for i, r in zip(members, records)}
+    return FastJSONResponse({
+        "pumps": len(cat),
+        **{kind: [[{"id": i, "name": names[i]} for i in group] for group in found] for kind, found in groups.items()},
+    })
+
+@router.get("/pumps/{id}/similar", dependencies=[Depends(rate_limit("selection"))])
+async def get_similar_pumps(id: int, k: int = Query(10, ge=1, le=100), session: Session = Depends(get_session),
+                            current_user: User = Depends(get_current_active_user)):
+    """Ranked substitutes for a pump: nearest neighbours over H/efficiency/P2 curve fingerprints."""
+    import numpy as np
+    from catalogue import load_catalogue
+    from similarity_utils import get_fingerprints
+
+    cat = load_catalogue(session, current_user.org_id)
+    row = int(np.searchsorted(cat.ids, id))
+    if row >= len(cat.ids) or cat.ids[row] != id:
+        raise HTTPException(status_code=404, detail="Pump not found")
+    if not cat.has_h[row]:
+        raise HTTPException(status_code=422, detail="Pump has no H(Q) curve")
+    rows, distances = get_fingerprints(cat).nearest(row, k)
+    return FastJSONResponse({"id": id, "results": [
+        {"pump": pump, "distance": round(float(d), 4), "similarity": round(1.0 / (1.0 + float(d)), 4)}
+        for pump, d in zip(cat.records_at(rows), distances.tolist()) if pump is not None
+    ]})
 
 @router.delete("/pumps/{id}")
 async def delete_pump(id: int, current_user: User = Depends(get_current_active_user)):
@@ -181,6 +340,7 @@ async def delete_pump(id: int, current_user: User = Depends(get_current_active_u
         
         path = row['drawing_path']
         conn.execute("DELETE FROM pumps WHERE id=? AND org_id=?", (id, current_user.org_id))
+        add_tombstone(conn, id, current_user.org_id)
         conn.commit()
         
         if path and path.startswith("/api/drawings/"):
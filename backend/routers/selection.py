@@ -1,20 +1,74 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from typing import List, Optional
-from pydantic import BaseModel
-import json
-import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlmodel import Session
+from typing import Dict, List, Literal, Optional
+from pydantic import BaseModel, Field
 
-from db_utils import get_session, engine_pumps
-from models import Pump
-from calc_utils import parse_float_list
+from auth_utils import get_current_active_user
+from db_utils import get_session
+from models import User
+from responses import FastJSONResponse, to_columnar
+from ratelimit import rate_limit
+import selection_cache
 
-router = APIRouter(prefix="/api/selection", tags=["selection"])
+# Results carry private prices (lifecycle cost, price constraints and objectives): callers see their organization only
+router = APIRouter(prefix="/api/selection", tags=["selection"],
+                   dependencies=[Depends(rate_limit("selection")), Depends(get_current_active_user)])
+
+class LoadPoint(BaseModel):
+    q: float
+    h: float
+    hours: float = Field(..., ge=0) # Operating hours per year at this point
+
+class SuctionConditions(BaseModel):
+    surface_pressure_kpa: float = 101.325 # Absolute pressure on the liquid surface
+    static_head: float = 0.0 # Liquid level above the pump inlet [m], negative for suction lift
+    losses: float = 0.0 # Suction line losses at the duty flow [m]
+    vapor_pressure_kpa: float = 2.34 # Water at 20 °C
+    density: float = Field(998.0, gt=0)
+
+# Pareto objectives; efficiency and npsh_margin are maximized, the others minimized
+Objective = Literal["deviation", "efficiency", "power", "price", "npsh_margin", "lifecycle_cost"]
+DEFAULT_OBJECTIVES = ["deviation", "efficiency", "power"]
+
+class SpecRange(BaseModel):
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+class SearchConstraints(BaseModel):
+    # Ranges on the parsed specs (spec_utils.NUMERIC_SPECS units: rpm, kW, mm)
+    rpm: Optional[SpecRange] = None
+    p2_nom: Optional[SpecRange] = None
+    dn_suction: Optional[SpecRange] = None
+    dn_discharge: Optional[SpecRange] = None
+    impeller_actual: Optional[SpecRange] = None
+    companies: Optional[List[str]] = None # Case and whitespace insensitive
+    max_price: Optional[float] = Field(None, ge=0) # Pumps without a price never match
+    min_efficiency: Optional[float] = None # Efficiency at the duty point [%]
 
 class SearchRequest(BaseModel):
     q_req: float
     h_req: float
     tolerance_percent: float = 10.0  # Default 10%
+    # Lifecycle mode: with a load profile, results are ranked by total cost of ownership
+    load_profile: Optional[List[LoadPoint]] = None
+    tariff: float = Field(0.0, ge=0) # Energy price per kWh, in the currency of the pump prices
+    years: int = Field(10, ge=1, le=50)
+    discount_rate: float = Field(0.0, ge=0) # e.g. 0.08 for 8% per year
+    # Cavitation check: NPSH available given directly or derived from the suction conditions
+    npsh_available: Optional[float] = None
+    suction: Optional[SuctionConditions] = None
+    npsh_margin: float = 0.5 # Minimum NPSHa - NPSHr [m]
+    sort_by: Optional[Literal["deviation", "lifecycle_cost", "npsh_margin", "pareto"]] = None
+    # Pareto mode (sort_by="pareto" or objectives given): only non-dominated pumps are returned.
+    # With weights ({objective: weight}) they are ranked by weighted normalized score.
+    objectives: Optional[List[Objective]] = Field(None, min_length=1)
+    weights: Optional[Dict[Objective, float]] = None
+    # BEP proximity: duty flow inside the pump's preferred (70-120% BEP) or allowable region,
+    # and/or within bep_percent_min..bep_percent_max of the BEP flow
+    operating_region: Optional[Literal["preferred", "allowable"]] = None
+    bep_percent_min: Optional[float] = None
+    bep_percent_max: Optional[float] = None
+    constraints: Optional[SearchConstraints] = None
 
 class SearchResult(BaseModel):
     pump: dict
@@ -23,6 +77,16 @@ class SearchResult(BaseModel):
     power_at_point: Optional[float] = None
     eff_at_point: Optional[float] = None
     rpm: Optional[str] = None
+    # Lifecycle mode only
+    annual_energy_kwh: Optional[float] = None
+    annual_energy_cost: Optional[float] = None
+    price: Optional[float] = None
+    currency: Optional[str] = None
+    lifecycle_cost: Optional[float] = None
+    npsh_required: Optional[float] = None
+    npsh_margin: Optional[float] = None # With NPSH available only
+    bep_percent: Optional[float] = None # Duty flow as % of the BEP flow
+    score: Optional[float] = None # Weighted Pareto mode only, 0 = best
 
 def poly_val(coeffs: List[float], x: float) -> float:
     # Backend calc_utils uses [a3, a2, a1, a0] (numpy polyfit standard for high->low)
@@ -34,75 +98,405 @@ def poly_val(coeffs: List[float], x: float) -> float:
     return val
 
 @router.post("/search", response_model=List[SearchResult])
-async def search_pumps(req: SearchRequest, session: Session = Depends(get_session)):
-    results = []
-    
+async def search_pumps(req: SearchRequest, format: str = "json", session: Session = Depends(get_session),
+                       current_user: User = Depends(get_current_active_user)):
+    """format=columnar returns result fields once plus one value array per field
+    (pump fields are flattened as "pump.<field>").
+
+    With a load_profile, candidates must also reach the head of every profile point
+    (within the tolerance) and are ranked by lifecycle cost: purchase price plus
+    the energy cost of the profile over `years`, discounted at `discount_rate`.
+
+    With npsh_available (or suction conditions), pumps whose NPSHr at the duty point
+    leaves less than `npsh_margin` are dropped; pumps without an NPSH curve are kept
+    with an unknown margin. sort_by="npsh_margin" ranks the largest margin first.
+
+    sort_by="pareto" returns the pumps not dominated on `objectives` (default: deviation,
+    efficiency and power at the duty point), ordered by the first objective, or by
+    `score` when `weights` are given. Unknown values count as the worst.
+
+    `constraints` (spec ranges, companies, max price, min efficiency) are boolean masks
+    applied before any curve is evaluated, so tight constraints make searches cheaper.
+    """
+    from catalogue import load_catalogue
+    from calc_utils import npsh_available
+
+    sort_by = req.sort_by or ("pareto" if req.objectives else "lifecycle_cost" if req.load_profile else "deviation")
+    npsh_a = req.npsh_available
+    if npsh_a is None and req.suction is not None:
+        sc = req.suction
+        npsh_a = npsh_available(sc.surface_pressure_kpa, sc.vapor_pressure_kpa, sc.static_head, sc.losses, sc.density)
+    if sort_by == "lifecycle_cost" and not req.load_profile:
+        raise HTTPException(status_code=400, detail="sort_by=lifecycle_cost needs a load_profile")
+    if sort_by == "npsh_margin" and npsh_a is None:
+        raise HTTPException(status_code=400, detail="sort_by=npsh_margin needs npsh_available or suction conditions")
+    objectives = list(dict.fromkeys(req.objectives or DEFAULT_OBJECTIVES)) if sort_by == "pareto" else []
+    if "lifecycle_cost" in objectives and not req.load_profile:
+        raise HTTPException(status_code=400, detail="The lifecycle_cost objective needs a load_profile")
+    if "npsh_margin" in objectives and npsh_a is None:
+        raise HTTPException(status_code=400, detail="The npsh_margin objective needs npsh_available or suction conditions")
+    if req.weights and not set(req.weights) <= set(objectives):
+        raise HTTPException(status_code=400, detail="weights must refer to the chosen objectives")
+
     # Use injected session (which uses engine_pumps normally, but overridden in tests)
-    pumps = session.exec(select(Pump)).all()
-    
-    for pump in pumps:
-
-            # 1. Check Q Range
-            # If q_max is 0, we might skip or assume it's valid if coeffs exist. 
-            # Ideally strict check: q_req <= q_max * 1.2 (some overload allowed?)
-            # Let's stick to strict or slightly flexible
-            if pump.q_max > 0 and req.q_req > pump.q_max * 1.15:
-                continue
+    cat = load_catalogue(session, current_user.org_id)
+    return _cached("search", cat, format, req,
+                   lambda: _search_pumps(req, format, cat, sort_by, npsh_a, objectives))
+
+def _cached(endpoint, cat, format, req, compute):
+    """Response from the selection result cache, computed and stored on a miss (X-Cache tells which).
+    Entries are keyed by the catalogue's scope and revision: a change in one organization leaves
+    the entries of the others in place."""
+    key = selection_cache.request_key(endpoint, cat.org_id, cat.revision, format, req)
+    entry = selection_cache.get(key)
+    if entry is not None:
+        return Response(content=entry[0], media_type=entry[1], headers={"X-Cache": "HIT"})
+    response = compute()
+    selection_cache.put(key, response.body, response.media_type)
+    response.headers["X-Cache"] = "MISS"
+    return response
+
+def _search_pumps(req, format, cat, sort_by, npsh_a, objectives):
+    import numpy as np
+    from calc_utils import polyval_rows
+
+    if len(cat) == 0 or req.h_req == 0: # avert div by zero
+        return _render_results([], format)
+
+    # 1. Check Q Range (q_max == 0 means unknown range: keep the pump)
+    mask = cat.has_h & ~((cat.q_max > 0) & (req.q_req > cat.q_max * 1.15))
+
+    # BEP proximity from the precomputed columns: plain range checks (NaN never matches)
+    if req.operating_region == "preferred":
+        mask &= (cat.por_q_min <= req.q_req) & (req.q_req <= cat.por_q_max)
+    elif req.operating_region == "allowable":
+        mask &= (cat.aor_q_min <= req.q_req) & (req.q_req <= cat.aor_q_max)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bep_percent = req.q_req / cat.bep_q * 100
+    if req.bep_percent_min is not None:
+        mask &= bep_percent >= req.bep_percent_min
+    if req.bep_percent_max is not None:
+        mask &= bep_percent <= req.bep_percent_max
+    if req.constraints is not None:
+        mask = _constraint_mask(cat, req.constraints, req.q_req, mask)
+
+    # 2. Curves are evaluated only for the rows left by the masks above
+    rows = np.nonzero(mask)[0]
+    h_calc = np.full(len(cat), np.nan)
+    npsh_req = np.full(len(cat), np.nan)
+    # H at Q_req for all candidates at once, deviation = |H - H_req| / H_req * 100
+    h_calc[rows] = polyval_rows(cat.h[rows], req.q_req)
+    with np.errstate(invalid="ignore"):
+        deviation = np.abs(h_calc - req.h_req) / req.h_req * 100
+        mask &= np.isfinite(deviation) & (deviation <= req.tolerance_percent)
+
+    # NPSHr at the duty point in the same pass; margin filter only where the curve is known
+    npsh_req[rows] = polyval_rows(cat.npsh[rows], req.q_req)
+    margin = npsh_a - npsh_req if npsh_a is not None else None
+    if margin is not None:
+        with np.errstate(invalid="ignore"):
+            mask &= ~cat.has_npsh | (margin >= req.npsh_margin)
+
+    if req.load_profile:
+        rows = np.nonzero(mask)[0]
+        q_prof = np.array([p.q for p in req.load_profile])
+        h_prof = np.array([p.h for p in req.load_profile])
+        h_at_prof = polyval_rows(cat.h[rows], np.broadcast_to(q_prof[None, :], (len(rows), len(q_prof))))
+        in_range = (cat.q_max[rows, None] <= 0) | (q_prof[None, :] <= cat.q_max[rows, None] * 1.15)
+        mask[rows] = (in_range & (h_at_prof >= h_prof * (1 - req.tolerance_percent / 100))).all(axis=1)
+
+    idx = np.nonzero(mask)[0]
+    if len(idx) == 0:
+        return _render_results([], format)
+    # Sort by deviation (stable, so equal deviations keep archive order)
+    idx = idx[np.argsort(deviation[idx], kind="stable")]
+    lifecycle = _lifecycle_costs(cat, idx, req) if req.load_profile else None
+    if sort_by in ("lifecycle_cost", "npsh_margin"):
+        # Unknown values (no P2 / NPSH curve) sort last
+        if sort_by == "lifecycle_cost":
+            key = np.where(np.isnan(lifecycle["total"]), np.inf, lifecycle["total"])
+        else:
+            key = np.where(cat.has_npsh[idx], -margin[idx], np.inf)
+        idx_order = np.argsort(key, kind="stable")
+        idx = idx[idx_order]
+        if lifecycle is not None:
+            lifecycle = {k: v[idx_order] for k, v in lifecycle.items()}
+
+    # 3. Power & Eff only for the matches
+    p2_vals = polyval_rows(cat.p2[idx], req.q_req)
+    eff_vals = polyval_rows(cat.eff[idx], req.q_req)
+    if req.constraints is not None and req.constraints.min_efficiency is not None:
+        keep = cat.has_eff[idx] & (eff_vals >= req.constraints.min_efficiency)
+        idx, p2_vals, eff_vals = idx[keep], p2_vals[keep], eff_vals[keep]
+        if lifecycle is not None:
+            lifecycle = {k: v[keep] for k, v in lifecycle.items()}
+
+    scores = prices = None
+    if objectives:
+        order, scores, prices = _pareto_order(cat, idx, objectives, req.weights, deviation, margin, eff_vals, p2_vals, lifecycle)
+        idx, p2_vals, eff_vals = idx[order], p2_vals[order], eff_vals[order]
+        if lifecycle is not None:
+            lifecycle = {k: v[order] for k, v in lifecycle.items()}
+
+    results = []
+    for k, (i, pump) in enumerate(zip(idx, cat.records_at(idx))):
+        if pump is None: # Deleted while the search ran
+            continue
+        # Plain dicts in SearchResult layout: rendered directly by FastJSONResponse
+        results.append({
+            "pump": pump,
+            "h_at_point": float(h_calc[i]),
+            "deviation_percent": float(deviation[i]),
+            "power_at_point": float(p2_vals[k]) if cat.has_p2[i] else None,
+            "eff_at_point": float(eff_vals[k]) if cat.has_eff[i] else None,
+            "rpm": pump["rpm"],
+            "npsh_required": float(npsh_req[i]) if cat.has_npsh[i] else None,
+            "npsh_margin": float(margin[i]) if margin is not None and cat.has_npsh[i] else None,
+            "bep_percent": float(bep_percent[i]) if np.isfinite(bep_percent[i]) else None,
+        })
+        if scores is not None:
+            results[-1]["score"] = float(scores[k])
+        if prices is not None:
+            results[-1].update(price=prices[k][0] or None, currency=prices[k][1])
+        if lifecycle is not None:
+            results[-1].update(_nan_to_none({
+                "annual_energy_kwh": lifecycle["kwh"][k], "annual_energy_cost": lifecycle["cost"][k],
+                "price": lifecycle["price"][k], "lifecycle_cost": lifecycle["total"][k],
+            }), currency=lifecycle["currency"][k])
+    return _render_results(results, format)
+
+def _pareto_order(cat, idx, objectives, weights, deviation, margin, eff_vals, p2_vals, lifecycle):
+    """Positions in `idx` of the non-dominated candidates, best first, plus their scores
+    (weighted mode) and (price, currency) pairs (price objective without lifecycle)."""
+    import numpy as np
+    from db_utils import get_private_prices
+    from pareto_utils import pareto_front, weighted_scores
 
-            # 2. Parse H Coeffs
-            try:
-                # Coefficients are stored as space-separated string or JSON string of list
-                # check models.py: h_coeffs: Optional[str]
-                if not pump.h_coeffs:
-                    continue
-                
-                # Check if it looks like JSON list "[-0.1, ...]" or space string "-0.1 ..."
-                if pump.h_coeffs.strip().startswith('['):
-                    coeffs = json.loads(pump.h_coeffs)
-                else:
-                    coeffs = parse_float_list(pump.h_coeffs)
-                
-                if not coeffs: continue
-
-                # 3. Calculate H at Q_req
-                h_calc = poly_val(coeffs, req.q_req)
-                
-                # 4. Check Deviation
-                # deviation = abs(h_calc - h_req) / h_req * 100
-                if req.h_req == 0: continue # avert div by zero
-                
-                diff = h_calc - req.h_req
-                deviation = (abs(diff) / req.h_req) * 100
-                
-                if deviation <= req.tolerance_percent:
-                    # Found match!
-                    
-                    # Calc Power & Eff if available
-                    p2_val = None
-                    eff_val = None
-                    
-                    if pump.p2_coeffs:
-                        p2_c = parse_float_list(pump.p2_coeffs) if not pump.p2_coeffs.startswith('[') else json.loads(pump.p2_coeffs)
-                        if p2_c: p2_val = poly_val(p2_c, req.q_req)
-
-                    if pump.eff_coeffs:
-                        eff_c = parse_float_list(pump.eff_coeffs) if not pump.eff_coeffs.startswith('[') else json.loads(pump.eff_coeffs)
-                        if eff_c: eff_val = poly_val(eff_c, req.q_req)
-
-                    results.append(SearchResult(
-                        pump=pump.model_dump(),
-                        h_at_point=h_calc,
-                        deviation_percent=deviation,
-                        power_at_point=p2_val,
-                        eff_at_point=eff_val,
-                        rpm=pump.rpm
-                    ))
-
-            except Exception as e:
-                print(f"Error processing pump {pump.id}: {e}")
+    prices = None
+    columns = []
+    for objective in objectives:
+        if objective == "deviation":
+            cost = deviation[idx]
+        elif objective == "efficiency":
+            cost = np.where(cat.has_eff[idx], -eff_vals, np.inf)
+        elif objective == "power":
+            cost = np.where(cat.has_p2[idx], p2_vals, np.inf)
+        elif objective == "npsh_margin":
+            cost = np.where(cat.has_npsh[idx], -margin[idx], np.inf)
+        elif objective == "lifecycle_cost":
+            cost = lifecycle["total"]
+        else: # price; 0 means unknown
+            if lifecycle is not None:
+                price = lifecycle["price"]
+            else:
+                known = get_private_prices(cat.ids[idx].tolist())
+                prices = [known.get(int(pid), (0.0, None)) for pid in cat.ids[idx]]
+                price = np.array([p[0] for p in prices], dtype=float)
+            cost = np.where(price > 0, price, np.inf)
+        columns.append(cost)
+    costs = np.column_stack(columns) if len(idx) else np.zeros((0, len(objectives)))
+
+    front = pareto_front(costs)
+    scores = None
+    if weights:
+        w = [weights.get(o, 0.0) for o in objectives]
+        scores = weighted_scores(costs[front], w)
+        rank = np.argsort(scores, kind="stable")
+        front, scores = front[rank], scores[rank]
+    if prices is not None:
+        prices = [prices[i] for i in front]
+    return front, scores, prices
+
+def _constraint_mask(cat, constraints, q_req, mask):
+    """Narrows `mask` by the request constraints without evaluating any curve.
+
+    Spec ranges and companies are comparisons on catalogue columns (NaN specs never match).
+    Prices are read from sensitive.db for the remaining rows only. min_efficiency drops
+    pumps whose BEP efficiency (the highest on their flow range) is already below the limit
+    when the duty flow lies in that range; the efficiency at the duty point itself is
+    checked on the final matches.
+    """
+    import numpy as np
+    from catalogue import normalize_company
+    from db_utils import get_private_prices
+    from spec_utils import NUMERIC_SPECS
+
+    mask = mask.copy()
+    with np.errstate(invalid="ignore"):
+        for field, (column, _) in NUMERIC_SPECS.items():
+            bounds = getattr(constraints, field)
+            if bounds is None:
                 continue
+            values = getattr(cat, column)
+            if bounds.min is not None:
+                mask &= values >= bounds.min
+            if bounds.max is not None:
+                mask &= values <= bounds.max
+        if constraints.min_efficiency is not None:
+            # 0.5 points of slack: bep_eff is the best of 201 samples, not the exact maximum
+            in_range = (cat.q_min <= q_req) & (q_req <= cat.q_max)
+            mask &= cat.has_eff & ~(in_range & (cat.bep_eff < constraints.min_efficiency - 0.5))
+    if constraints.companies is not None:
+        mask &= np.isin(cat.company, [normalize_company(c) for c in constraints.companies])
+    if constraints.max_price is not None:
+        rows = np.nonzero(mask)[0]
+        prices = get_private_prices(cat.ids[rows].tolist())
+        price = np.array([prices.get(int(pid), (0.0, None))[0] for pid in cat.ids[rows]], dtype=float)
+        mask[rows] = (price > 0) & (price <= constraints.max_price)
+    return mask
+
+def _lifecycle_costs(cat, idx, req):
+    """Annual energy and total cost of ownership for the candidate rows (one pass over the P2 matrix)."""
+    import numpy as np
+    from calc_utils import profile_energy
+    from db_utils import get_private_prices
+
+    kwh = profile_energy(cat.p2[idx], [p.q for p in req.load_profile], [p.hours for p in req.load_profile])
+    kwh = np.where(cat.has_p2[idx], kwh, np.nan)
+    cost = kwh * req.tariff
+    r = req.discount_rate
+    # Present value of `years` equal annual payments
+    factor = req.years if r == 0 else (1 - (1 + r) ** -req.years) / r
+    prices = get_private_prices(cat.ids[idx].tolist())
+    price = np.array([prices.get(int(pid), (0.0, None))[0] for pid in cat.ids[idx]], dtype=float)
+    currency = np.array([prices.get(int(pid), (0.0, None))[1] for pid in cat.ids[idx]], dtype=object)
+    return {"kwh": kwh, "cost": cost, "price": price, "currency": currency, "total": price + cost * factor}
+
+def _nan_to_none(values):
+    return {k: (None if v != v else float(v)) for k, v in values.items()}
+
+def _render_results(results: List[dict], format: str):
+    if format == "columnar":
+        rows = []
+        for r in results:
+            row = {k: v for k, v in r.items() if k != "pump"}
+            row.update({f"pump.{k}": v for k, v in r["pump"].items()})
+            rows.append(row)
+        return FastJSONResponse(to_columnar(rows))
+    return FastJSONResponse(results)
+
+class ComboSearchRequest(BaseModel):
+    q_req: float
+    h_req: float
+    tolerance_percent: float = 10.0
+    min_pumps: int = Field(2, ge=2, le=4) # A station has at least two pumps
+    max_pumps: int = Field(3, ge=2, le=4)
+    arrangements: List[Literal["parallel", "series"]] = ["parallel", "series"]
+    limit: int = Field(50, ge=1, le=500)
+
+class CombinationRequest(BaseModel):
+    pump_ids: List[int] = Field(..., min_length=1, max_length=4) # Repeat an id for identical pumps
+    arrangement: Literal["parallel", "series"] = "parallel"
+    q_req: float
+    h_req: float
+    h_st: float = 0.0
+    samples: int = Field(100, ge=2, le=1000)
+
+@router.post("/combos")
+async def search_combos(req: ComboSearchRequest, format: str = "json", session: Session = Depends(get_session),
+                        current_user: User = Depends(get_current_active_user)):
+    """Stations of 2-4 identical pumps in parallel or series that meet the duty point.
+
+    Only identical-pump stations are searched; a mix of different pumps can be checked
+    with /api/selection/combination. Results are sorted by deviation, then by the number
+    of pumps; power_at_point is the station total, flow/head_per_pump is the duty of each pump.
+    """
+    from catalogue import load_catalogue
+
+    cat = load_catalogue(session, current_user.org_id)
+    return _cached("combos", cat, format, req, lambda: _search_combos(req, format, cat))
+
+def _search_combos(req, format, cat):
+    from calc_utils import polyval_rows
+    from combination_utils import search_identical
+
+    if len(cat) == 0 or req.h_req == 0 or req.min_pumps > req.max_pumps:
+        return _render_results([], format)
+
+    counts = range(req.min_pumps, req.max_pumps + 1)
+    rows, counts, arrangements, h_at, deviation, q_each = search_identical(
+        cat, req.q_req, req.h_req, req.tolerance_percent, counts, req.arrangements)
+    rows, counts, arrangements = rows[:req.limit], counts[:req.limit], arrangements[:req.limit]
+    h_at, deviation, q_each = h_at[:req.limit], deviation[:req.limit], q_each[:req.limit]
+    if len(rows) == 0:
+        return _render_results([], format)
+
+    # Power & Eff only for the kept combinations, at each pump's own duty
+    p2_vals = polyval_rows(cat.p2[rows], q_each)
+    eff_vals = polyval_rows(cat.eff[rows], q_each)
+
+    results = []
+    for k, (i, pump) in enumerate(zip(rows, cat.records_at(rows))):
+        if pump is None:
+            continue
+        count = int(counts[k])
+        results.append({
+            "pump": pump,
+            "arrangement": arrangements[k],
+            "count": count,
+            "h_at_point": float(h_at[k]),
+            "deviation_percent": float(deviation[k]),
+            "flow_per_pump": float(q_each[k]),
+            "head_per_pump": float(h_at[k] / count if arrangements[k] == "series" else h_at[k]),
+            "power_at_point": float(p2_vals[k] * count) if cat.has_p2[i] else None,
+            "eff_at_point": float(eff_vals[k]) if cat.has_eff[i] else None,
+            "rpm": pump["rpm"]
+        })
+    return _render_results(results, format)
+
+@router.post("/combination")
+async def combination_curve(req: CombinationRequest, session: Session = Depends(get_session),
+                            current_user: User = Depends(get_current_active_user)):
+    """Combined curve of the given pumps, the system curve through the duty point and the operating point."""
+    import numpy as np
+    from catalogue import load_catalogue
+    from calc_utils import polyval_rows
+    from combination_utils import parallel_curve, series_curve, system_k, intersect_system
+
+    cat = load_catalogue(session, current_user.org_id) # Pumps of other organizations are "not found"
+    pos = np.searchsorted(cat.ids, req.pump_ids)
+    missing = [pid for pid, p in zip(req.pump_ids, pos) if p >= len(cat.ids) or cat.ids[p] != pid]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Pumps not found: {missing}")
+    if not cat.has_h[pos].all() or not (cat.q_max[pos] > 0).all():
+        raise HTTPException(status_code=400, detail="Every pump needs an H(Q) curve and q_max")
+
+    k = system_k(req.q_req, req.h_req, req.h_st)
+    if req.arrangement == "parallel":
+        q, h, _ = parallel_curve(cat.h[pos], cat.q_max[pos], req.samples)
+    else:
+        q, h, _ = series_curve(cat.h[pos], cat.q_max[pos], req.samples)
+    point = intersect_system(q, h, req.h_st, k)
+
+    operating_point = None
+    if point is not None:
+        q_op, h_op = point
+        if req.arrangement == "parallel":
+            # Each pump runs at the common head: invert its curve there
+            _, heads, q_each = parallel_curve(cat.h[pos], cat.q_max[pos], 2000)
+            flows = np.array([np.interp(h_op, heads[::-1], qe[::-1]) for qe in q_each])
+            heads_each = np.full(len(pos), h_op)
+        else:
+            flows = np.full(len(pos), q_op)
+            heads_each = polyval_rows(cat.h[pos], q_op)
+        p2 = polyval_rows(cat.p2[pos], flows)
+        eff = polyval_rows(cat.eff[pos], flows)
+        pumps = [{
+            "id": int(cat.ids[i]),
+            "q": float(flows[n]), "h": float(heads_each[n]),
+            "p2": float(p2[n]) if cat.has_p2[i] else None,
+            "eff": float(eff[n]) if cat.has_eff[i] else None,
+        } for n, i in enumerate(pos)]
+        operating_point = {
+            "q": q_op, "h": h_op, "pumps": pumps,
+            "p2_total": float(sum(p["p2"] for p in pumps)) if all(p["p2"] is not None for p in pumps) else None,
+        }
 
-    # Sort by deviation
-    results.sort(key=lambda x: x.deviation_percent)
-    
-    return results
+    q_sys = np.linspace(0.0, max(float(q[-1]), req.q_req), req.samples)
+    return FastJSONResponse({
+        "arrangement": req.arrangement,
+        "pump_ids": req.pump_ids,
+        "curve": {"q": np.round(q, 4).tolist(), "h": np.round(h, 4).tolist()},
+        "system": {"q": np.round(q_sys, 4).tolist(), "h": np.round(req.h_st + k * q_sys * q_sys, 4).tolist()},
+        "operating_point": operating_point,
+    })
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from starlette.concurrency import run_in_threadpool
+
+import tile_utils
+from auth_utils import get_current_active_user
+from config import config
+from db_utils import get_files_conn
+from models import User
+from ratelimit import rate_limit
+
+# Tiles have a scope of their own: one viewport pulls dozens of them at once
+router = APIRouter(prefix="/api/drawings", tags=["drawings"], dependencies=[Depends(rate_limit("tiles"))])
+
+TILE_HEADERS = {"Cache-Control": "private, max-age=86400"} # A file id never changes content
+
+
+def _pdf_source(file_id, user):
+    if not tile_utils.available():
+        raise HTTPException(status_code=503, detail="Page tiles are not available (pypdfium2 is not installed)")
+    conn = get_files_conn()
+    try:
+        row = conn.execute("SELECT mime, filename FROM files WHERE id=? AND (org_id=? OR org_id IS NULL)",
+                           (file_id, user.org_id)).fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="File not found or unauthorized")
+        mime, filename = row
+        if (mime or ("application/pdf" if (filename or "").lower().endswith(".pdf") else None)) != "application/pdf":
+            raise HTTPException(status_code=415, detail="Tiles are available for PDF drawings only")
+        return tile_utils.ensure_source(file_id, conn, config.TILE_CACHE_MB * 1024 * 1024)
+    finally:
+        conn.close()
+
+
+@router.get("/{file_id}/pages/{page}/info")
+async def page_info(file_id: int, page: int, dpi: int = Query(150, ge=36, le=tile_utils.MAX_DPI),
+                    current_user: User = Depends(get_current_active_user)):
+    """Pyramid geometry of a page: pixel size at `dpi`, tile size and max_level (full resolution)."""
+    path = await run_in_threadpool(_pdf_source, file_id, current_user)
+    try:
+        return await run_in_threadpool(tile_utils.page_info, path, page - 1, dpi)
+    except IndexError:
+        raise HTTPException(status_code=404, detail="Page not found")
+
+
+@router.get("/{file_id}/pages/{page}/tiles/{level}/{col}_{row}.png")
+async def page_tile(file_id: int, page: int, level: int, col: int, row: int,
+                    dpi: int = Query(150, ge=36, le=tile_utils.MAX_DPI),
+                    current_user: User = Depends(get_current_active_user)):
+    """One 256 px tile; level 0 shows the whole page, max_level is the page at `dpi`."""
+    path = await run_in_threadpool(_pdf_source, file_id, current_user)
+    try:
+        data = await run_in_threadpool(tile_utils.get_tile, file_id, path, page - 1, dpi, level, col, row,
+                                       config.TILE_CACHE_MB * 1024 * 1024)
+    except IndexError:
+        data = None
+    if data is None:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    return Response(content=data, media_type="image/png", headers=TILE_HEADERS)
@@ -0,0 +1,72 @@
+import json
+import threading
+from collections import OrderedDict
+
+import metrics
+
+# Memoized selection responses.
+#
+# Engineers repeat the same duty-point searches while iterating on a project, so the
+# rendered response of a search is kept in a bounded LRU (SELECTION_CACHE_SIZE entries
+# per worker). The key is (endpoint, catalogue scope, catalogue revision, format,
+# normalized request). Every save, delete or import bumps the revision, so entries of
+# an older revision can never be returned; they are dropped as soon as a newer revision
+# is seen for the same scope, or by LRU eviction.
+
+CACHE_LOOKUPS = metrics.register(metrics.Counter(
+    "ruspump_selection_cache_total", "Selection result cache lookups by endpoint and result (hit/miss)",
+    ("endpoint", "result")))
+CACHE_ENTRIES = metrics.register(metrics.Gauge(
+    "ruspump_selection_cache_entries", "Responses held in the selection result cache"))
+
+_entries = OrderedDict() # key -> (body, media_type)
+_latest = {} # scope -> newest revision seen
+_lock = threading.Lock()
+
+
+def _max_entries():
+    from config import config
+    return config.SELECTION_CACHE_SIZE
+
+
+def request_key(endpoint, scope, revision, format, req):
+    """Cache key of a request model: the same search written differently maps to the same key."""
+    params = json.dumps(req.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return (endpoint, scope, revision, format, params)
+
+
+def get(key):
+    """(body, media_type) of a cached response, or None."""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+    CACHE_LOOKUPS.inc((key[0], "hit" if entry is not None else "miss"))
+    return entry
+
+
+def put(key, body, media_type):
+    limit = _max_entries()
+    if limit <= 0:
+        return
+    _, scope, revision = key[:3]
+    with _lock:
+        if _latest.get(scope, revision) < revision:
+            # The scope changed: everything cached for it is outdated
+            for old in [k for k in _entries if k[1] == scope and k[2] < revision]:
+                del _entries[old]
+        elif _latest.get(scope, revision) > revision:
+            return # Computed from a revision that is already outdated
+        _latest[scope] = revision
+        _entries[key] = (body, media_type)
+        _entries.move_to_end(key)
+        while len(_entries) > limit:
+            _entries.popitem(last=False)
+        CACHE_ENTRIES.set(len(_entries))
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _latest.clear()
+        CACHE_ENTRIES.set(0)
@@ -0,0 +1,76 @@
+import threading
+
+import numpy as np
+
+from calc_utils import polyval_rows
+
+# "Pumps like this one": nearest neighbours over fixed-length curve fingerprints.
+#
+# A fingerprint samples a pump's H, efficiency and P2 at GRID fractions of its flow
+# range. Values go through log (H, P2, Q range) so that distances measure relative
+# differences: 10 m vs 11 m counts like 100 m vs 110 m. The matrix for a catalogue is
+# float32 (n x 25, 100 bytes per pump) and is built once per catalogue revision.
+# Queries are exact: squared distances to every pump come from a single BLAS product
+# (per-block dot products), with a fixed penalty where either pump lacks the curve.
+
+GRID = np.linspace(0.1, 1.0, 8)
+BLOCKS = {"q": slice(0, 1), "h": slice(1, 9), "eff": slice(9, 17), "p2": slice(17, 25)}
+WEIGHTS = {"q": 1.0, "h": 1.0, "eff": 0.5, "p2": 0.5}
+MISSING_PENALTY = 1.0 # Per block, in squared RMS log units (about a factor e apart)
+
+_lock = threading.Lock()
+
+
+class Fingerprints:
+    def __init__(self, cat):
+        n = len(cat)
+        q_lo = cat.q_min
+        q_hi = np.where(cat.q_max > q_lo, cat.q_max, q_lo + 1.0)
+        q = q_lo[:, None] + (q_hi - q_lo)[:, None] * GRID[None, :]
+
+        x = np.zeros((n, BLOCKS["p2"].stop), dtype=np.float32)
+        x[:, BLOCKS["q"]] = np.log(np.maximum(q_hi, 0.1))[:, None]
+        x[:, BLOCKS["h"]] = np.log(np.maximum(polyval_rows(cat.h, q), 0.1))
+        x[:, BLOCKS["eff"]] = np.clip(polyval_rows(cat.eff, q), 0.0, 100.0) / 100.0
+        x[:, BLOCKS["p2"]] = np.log(np.maximum(polyval_rows(cat.p2, q), 0.01))
+        self.matrix = x
+        self.available = {"q": cat.has_h, "h": cat.has_h, "eff": cat.has_eff, "p2": cat.has_p2}
+        # Squared norms per block, reused by every query (|a-b|^2 = |a|^2 - 2ab + |b|^2)
+        self.norms = {b: np.einsum("ij,ij->i", x[:, s], x[:, s]) for b, s in BLOCKS.items()}
+
+    def distances(self, row):
+        """Weighted mean squared distance from pump `row` to every pump."""
+        # One BLAS product against a block-diagonal copy of the query: column j = dot product of block j
+        query = np.zeros((self.matrix.shape[1], len(BLOCKS)), dtype=np.float32)
+        for j, s in enumerate(BLOCKS.values()):
+            query[s, j] = self.matrix[row, s]
+        dots = self.matrix @ query
+        d = np.zeros(len(self.matrix), dtype=np.float32)
+        for j, (block, s) in enumerate(BLOCKS.items()):
+            dist = np.maximum(self.norms[block] - 2.0 * dots[:, j] + self.norms[block][row], 0.0) / (s.stop - s.start)
+            both = self.available[block] & self.available[block][row]
+            d += WEIGHTS[block] * np.where(both, dist, MISSING_PENALTY)
+        return d
+
+    def nearest(self, row, k):
+        """(rows, distances) of the k pumps closest to `row`, nearest first, excluding itself."""
+        d = self.distances(row)
+        d[row] = np.inf
+        d[~self.available["h"]] = np.inf
+        k = min(k, int(np.isfinite(d).sum()))
+        if k <= 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        top = np.argpartition(d, k - 1)[:k]
+        top = top[np.argsort(d[top], kind="stable")]
+        return top, np.sqrt(d[top])
+
+
+def get_fingerprints(cat) -> Fingerprints:
+    """Fingerprints of a catalogue, built on first use and kept with it (same lifetime and revision)."""
+    fp = getattr(cat, "_fingerprints", None)
+    if fp is None:
+        with _lock:
+            fp = getattr(cat, "_fingerprints", None)
+            if fp is None:
+                fp = cat._fingerprints = Fingerprints(cat)
+    return fp
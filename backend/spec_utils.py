@@ -0,0 +1,64 @@
+import re
+
+# Numeric shadow columns for the free-text technical specs.
+#
+# rpm, p2_nom, dn_suction, dn_discharge and impeller_actual are stored as entered
+# ("2900 об/мин", "5,5 кВт", "DN100", '4"', "Ø250 мм"). Each is parsed once on save
+# into a REAL column in a fixed unit, indexed with org_id, so archive and selection
+# filters are SQL range scans instead of parseFloat in the browser. Unparseable
+# text leaves the column NULL (it never matches a range filter).
+
+# Source field -> (numeric column, unit)
+NUMERIC_SPECS = {
+    "rpm": ("rpm_value", "rpm"),
+    "p2_nom": ("p2_nom_kw", "kW"),
+    "dn_suction": ("dn_suction_mm", "mm"),
+    "dn_discharge": ("dn_discharge_mm", "mm"),
+    "impeller_actual": ("impeller_mm", "mm"),
+}
+
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+# Nominal sizes for inch pipes (DN is a nominal value, not 25.4 * inches)
+_INCH_DN = {0.5: 15, 0.75: 20, 1: 25, 1.25: 32, 1.5: 40, 2: 50, 2.5: 65, 3: 80, 4: 100, 5: 125, 6: 150,
+            8: 200, 10: 250, 12: 300, 14: 350, 16: 400, 18: 450, 20: 500, 24: 600, 28: 700, 32: 800, 36: 900, 40: 1000}
+
+
+def _first_number(text):
+    # "2 900" -> 2900: spaces used as thousands separators
+    compact = re.sub(r"(?<=\d)\s+(?=\d{3}\b)", "", text)
+    match = _NUMBER.search(compact)
+    return float(match.group().replace(",", ".")) if match else None
+
+
+def parse_spec(field, text):
+    """Numeric value of a spec in its NUMERIC_SPECS unit, or None."""
+    if text is None:
+        return None
+    text = str(text).strip().lower()
+    value = _first_number(text)
+    if value is None:
+        return None
+    if field == "p2_nom":
+        if re.search(r"(hp|л\.?\s?с)", text):
+            return round(value * 0.7457, 4)
+        if re.search(r"\d\s*(w|вт)\b", text) and not re.search(r"(kw|квт|mw|мвт)", text):
+            return value / 1000.0
+        if re.search(r"(mw|мвт)", text):
+            return value * 1000.0
+        return value
+    if field in ("dn_suction", "dn_discharge"):
+        if '"' in text or "''" in text or "inch" in text or "дюйм" in text:
+            return float(_INCH_DN.get(value, round(value * 25.4)))
+        return value
+    if field == "impeller_actual":
+        if re.search(r"\d\s*cm\b|\d\s*см\b", text):
+            return value * 10.0
+        if '"' in text or "inch" in text:
+            return round(value * 25.4, 1)
+        return value
+    return value
+
+
+def numeric_specs(values):
+    """{numeric column: value} for a mapping of source fields (missing fields give None)."""
+    return {column: parse_spec(field, values.get(field)) for field, (column, _) in NUMERIC_SPECS.items()}
@@ -0,0 +1,220 @@
+import importlib.util
+import math
+import os
+import struct
+import threading
+import zlib
+
+# Map-style tile pyramid for drawing pages (the digitizer pulls only visible tiles).
+#
+# Level `max_level` is the page at the requested DPI; every level below halves the
+# scale, down to level 0 where the page fits in one tile. A tile is rendered on its
+# first request by cropping the page in PDFium, so a large A0 scan is never rasterized
+# as a whole. Tiles are PNG files in a disk cache with an LRU size cap: hits refresh
+# the file mtime and, when the cache grows past TILE_CACHE_MB, the least recently
+# used files are removed. The extracted source.pdf of each drawing counts towards the
+# cap and is evicted the same way (it is extracted again on the next request).
+# PDFium is not thread safe, so rendering is serialized. pypdfium2 is optional (tile
+# endpoints answer 503 without it); it and numpy are imported on the first render.
+
+TILE_SIZE = 256
+MAX_DPI = 600
+
+_render_lock = threading.Lock()
+_cache_lock = threading.Lock()
+_cache_bytes = None # Approximate cache size of this process, scanned on first use
+
+
+def available():
+    return importlib.util.find_spec("pypdfium2") is not None
+
+
+def cache_dir():
+    from config import config
+    return os.path.join(str(config.DB_DIR), "cache", "tiles")
+
+
+def source_path(file_id):
+    """Local copy of a stored PDF drawing (extracted once, PDFium reads it lazily)."""
+    return os.path.join(cache_dir(), str(file_id), "source.pdf")
+
+
+def ensure_source(file_id, conn_f, max_bytes=None):
+    path = source_path(file_id)
+    try:
+        os.utime(path) # LRU: a drawing being viewed keeps its source
+        return path
+    except FileNotFoundError:
+        pass
+    from upload_utils import CHUNK_SIZE
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as out, conn_f.blobopen("files", "data", file_id, readonly=True) as blob:
+        while True:
+            chunk = blob.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            out.write(chunk)
+    os.replace(tmp, path)
+    _account(os.path.getsize(path), max_bytes)
+    return path
+
+
+def encode_png(rgb):
+    """Minimal RGB PNG encoder (filter 0 on every row, zlib level 6): no imaging library needed."""
+    import numpy as np
+    height, width = rgb.shape[:2]
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgb.reshape(height, width * 3)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+            + chunk(b"IEND", b""))
+
+
+def pyramid(width_pt, height_pt, dpi, tile_size=TILE_SIZE):
+    """Geometry of a page pyramid: full-resolution pixel size and the number of levels below it."""
+    width = math.ceil(width_pt * dpi / 72.0)
+    height = math.ceil(height_pt * dpi / 72.0)
+    max_level = math.ceil(math.log2(max(width, height, 1) / tile_size)) if max(width, height) > tile_size else 0
+    return width, height, max_level
+
+
+def level_info(width, height, max_level, level, tile_size=TILE_SIZE):
+    """(scale factor, pixel width, pixel height, columns, rows) of a pyramid level."""
+    factor = 2.0 ** (level - max_level)
+    w, h = max(1, math.ceil(width * factor)), max(1, math.ceil(height * factor))
+    return factor, w, h, -(-w // tile_size), -(-h // tile_size)
+
+
+def page_info(path, page, dpi):
+    import pypdfium2 as pdfium
+    with _render_lock:
+        doc = pdfium.PdfDocument(path)
+        try:
+            if not 0 <= page < len(doc):
+                raise IndexError(page)
+            width_pt, height_pt = doc[page].get_size()
+            pages = len(doc)
+        finally:
+            doc.close()
+    width, height, max_level = pyramid(width_pt, height_pt, dpi)
+    return {"pages": pages, "page": page + 1, "dpi": dpi, "width": width, "height": height,
+            "tile_size": TILE_SIZE, "max_level": max_level}
+
+
+def render_tile(path, page, dpi, level, col, row):
+    """PNG bytes of one tile, or None if the tile lies outside the level."""
+    import numpy as np
+    import pypdfium2 as pdfium
+    with _render_lock:
+        doc = pdfium.PdfDocument(path)
+        try:
+            if not 0 <= page < len(doc):
+                raise IndexError(page)
+            pdf_page = doc[page]
+            width_pt, height_pt = pdf_page.get_size()
+            width, height, max_level = pyramid(width_pt, height_pt, dpi)
+            if not 0 <= level <= max_level:
+                return None
+            factor, w, h, cols, rows = level_info(width, height, max_level, level)
+            if not (0 <= col < cols and 0 <= row < rows):
+                return None
+            scale = dpi / 72.0 * factor # pixels per point at this level
+            x0, y0 = col * TILE_SIZE, row * TILE_SIZE
+            x1, y1 = min(x0 + TILE_SIZE, w), min(y0 + TILE_SIZE, h)
+            # crop = points cut from (left, bottom, right, top)
+            crop = (x0 / scale, max(0.0, height_pt - y1 / scale), max(0.0, width_pt - x1 / scale), y0 / scale)
+            bitmap = pdf_page.render(scale=scale, crop=crop, rev_byteorder=True)
+            rgb = np.array(bitmap.to_numpy()[:, :, :3])
+        finally:
+            doc.close()
+    return encode_png(rgb)
+
+
+def tile_path(file_id, page, dpi, level, col, row):
+    return os.path.join(cache_dir(), str(file_id), f"p{page + 1}_{dpi}", str(level), f"{col}_{row}.png")
+
+
+def _cached_files():
+    """Paths of every file counted against the cache cap: tiles and extracted sources."""
+    for root, _, files in os.walk(cache_dir()):
+        for name in files:
+            if name.endswith(".png") or name == "source.pdf":
+                yield os.path.join(root, name)
+
+
+def _scan_size():
+    total = 0
+    for full in _cached_files():
+        try:
+            total += os.path.getsize(full)
+        except OSError:
+            pass
+    return total
+
+
+def _account(size, max_bytes):
+    """Adds a newly written file to the cache size and evicts when over max_bytes (None: no cap check)."""
+    global _cache_bytes
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = _scan_size()
+        else:
+            _cache_bytes += size
+        over = max_bytes is not None and _cache_bytes > max_bytes
+    if over:
+        evict(max_bytes)
+
+
+def evict(max_bytes):
+    """Removes least recently used tiles and sources until the cache is below 90% of max_bytes;
+    returns bytes freed."""
+    global _cache_bytes
+    entries = []
+    for full in _cached_files():
+        try:
+            st = os.stat(full)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, full))
+    total = sum(e[1] for e in entries)
+    freed = 0
+    target = max_bytes * 0.9
+    for _, size, full in sorted(entries):
+        if total - freed <= target:
+            break
+        try:
+            os.remove(full)
+            freed += size
+        except OSError:
+            pass
+    with _cache_lock:
+        _cache_bytes = total - freed
+    return freed
+
+
+def get_tile(file_id, path, page, dpi, level, col, row, max_bytes):
+    """Cached tile bytes, rendering and storing the tile on a miss; None outside the pyramid."""
+    cached = tile_path(file_id, page, dpi, level, col, row)
+    try:
+        with open(cached, "rb") as f:
+            data = f.read()
+        os.utime(cached) # LRU: a hit makes the tile recent
+        return data
+    except FileNotFoundError:
+        pass
+    data = render_tile(path, page, dpi, level, col, row)
+    if data is None:
+        return None
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    tmp = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, cached)
+    _account(len(data), max_bytes)
+    return data
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import tempfile
+
+from fastapi import HTTPException
+
+# Streaming drawing uploads.
+#
+# An upload is copied chunk by chunk into a temp file while it is hashed and its
+# size checked, so memory use does not grow with the file. The temp file is then
+# written into drawings.db through an incremental BLOB handle (zeroblob + blobopen)
+# inside one transaction: a failed or oversized upload leaves no row behind.
+
+CHUNK_SIZE = 1024 * 1024
+
+# Extension -> MIME type the content must match (None: no reliable signature)
+ALLOWED_TYPES = {
+    ".pdf": "application/pdf",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".dwg": "image/vnd.dwg",
+}
+
+_SIGNATURES = (
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"AC10", "image/vnd.dwg"),
+)
+
+
+def sniff_mime(head: bytes):
+    """MIME type from the first bytes of a file, or None if unknown."""
+    for signature, mime in _SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    return None
+
+
+class SpooledUpload:
+    def __init__(self, path, filename, size, sha256, mime):
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+        self.mime = mime
+
+    def chunks(self):
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    def discard(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def spool_upload(upload, max_bytes, temp_dir=None) -> SpooledUpload:
+    """Copies an UploadFile to a temp file (hash, size cap, MIME sniffing). Caller must discard() it.
+
+    Raises HTTPException 415 for disallowed or mismatching types and 413 above max_bytes.
+    """
+    filename = os.path.basename(upload.filename or "drawing")
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in ALLOWED_TYPES:
+        raise HTTPException(status_code=415, detail=f"File type '{ext}' is not allowed. Allowed: {', '.join(ALLOWED_TYPES)}")
+
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=ext, dir=temp_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File is larger than {max_bytes // (1024 * 1024)} MB")
+                if len(head) < 16:
+                    head += chunk[:16 - len(head)]
+                digest.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty file")
+        mime = sniff_mime(head)
+        if mime != ALLOWED_TYPES[ext]:
+            raise HTTPException(status_code=415, detail=f"File content does not match its '{ext}' extension")
+    except BaseException:
+        os.remove(path)
+        raise
+    return SpooledUpload(path, filename, size, digest.hexdigest(), mime)
+
+
+def store_drawing(conn_f, spooled: SpooledUpload, org_id):
+    """Writes a spooled upload into drawings.db and commits; returns the file id.
+
+    An identical file (same sha256) already stored for the organization is reused.
+    """
+    row = conn_f.execute("SELECT id FROM files WHERE org_id IS ? AND sha256=? AND size=? LIMIT 1",
+                         (org_id, spooled.sha256, spooled.size)).fetchone()
+    if row:
+        return row[0]
+    try:
+        cur = conn_f.execute("INSERT INTO files (filename, data, org_id, sha256, mime, size) VALUES (?, zeroblob(?), ?, ?, ?, ?)",
+                             (spooled.filename, spooled.size, org_id, spooled.sha256, spooled.mime, spooled.size))
+        file_id = cur.lastrowid
+        with conn_f.blobopen("files", "data", file_id) as blob:
+            for chunk in spooled.chunks():
+                blob.write(chunk)
+        conn_f.commit()
+    except BaseException:
+        conn_f.rollback()
+        raise
+    return file_id
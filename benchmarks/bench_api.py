@@ -0,0 +1,190 @@
+"""
+In-process API benchmark for selection, listing, calculation and drawings.
+
+Generates a synthetic catalogue (see synthetic.py) in a temporary data dir,
+then drives the real FastAPI app through httpx.AsyncClient + ASGITransport
+(no network, no uvicorn) and reports latency percentiles and throughput.
+
+Usage:
+    python benchmarks/bench_api.py --sizes 1000,10000 [--requests 50] [--concurrency 4]
+                                   [--output results.json] [--check benchmarks/thresholds.json]
+
+Scenarios: search_pumps, get_pumps, calculate, get_drawing.
+With --check, exits with status 1 if any p95 exceeds its threshold.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+DEFAULT_THRESHOLDS = os.path.join(BENCH_DIR, "thresholds.json")
+
+# Isolated data dir: must be set before the backend reads its config
+DATA_DIR = tempfile.mkdtemp(prefix="ruspump_bench_")
+os.environ["DB_DIR"] = DATA_DIR
+os.environ["UPLOAD_DIR"] = os.path.join(DATA_DIR, "uploads")
+os.environ["FAST_START"] = "true"
+os.environ.setdefault("LOG_SAMPLE_RATE", "0")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false") # One client drives every request
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import numpy as np
+from httpx import AsyncClient, ASGITransport
+
+import synthetic
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def summarize(latencies, elapsed):
+    ms = np.asarray(latencies) * 1000
+    return {
+        "requests": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "throughput_rps": round(len(ms) / elapsed, 2) if elapsed > 0 else None,
+    }
+
+
+async def run_scenario(client, make_request, n_requests, concurrency, warmup=2):
+    """Issues n_requests (make_request(i) -> awaitable response) with bounded concurrency."""
+    for i in range(warmup):
+        await make_request(-1 - i)
+
+    latencies = []
+    errors = 0
+    counter = iter(range(n_requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            response = await make_request(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result = summarize(latencies, time.perf_counter() - start)
+    result["errors"] = errors
+    return result
+
+
+async def bench_size(app, size, args):
+    from db_utils import get_conn, get_sensitive_conn, get_files_conn, bump_revision
+
+    t0 = time.perf_counter()
+    conn, conn_s, conn_f = get_conn(), get_sensitive_conn(), get_files_conn()
+    ids, drawing_ids = synthetic.populate(conn, conn_s, conn_f, size, org_id=1, seed=args.seed)
+    bump_revision(conn, 1); conn.commit()
+    conn.close(); conn_s.close(); conn_f.close()
+    populate_s = time.perf_counter() - t0
+
+    curves = synthetic.generate_curves(size, args.seed)
+    rng = np.random.default_rng(args.seed + 7)
+    # Duty points on real curves, so searches return realistic result counts
+    picks = rng.integers(0, size, max(args.requests, 1))
+    duty = [(float(curves["q_bep"][i]), float(curves["h0"][i] * 0.65)) for i in picks]
+    # Listing scales linearly with catalogue size: cap its requests on large catalogues
+    list_requests = max(5, min(args.requests, int(args.requests * 2000 / size)))
+
+    results = {"populate_s": round(populate_s, 3), "scenarios": {}}
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://bench") as client:
+        scenarios = {
+            "search_pumps": (lambda i: client.post("/api/selection/search", json={
+                "q_req": duty[i % len(duty)][0], "h_req": duty[i % len(duty)][1], "tolerance_percent": 5}),
+                args.requests),
+            "get_pumps": (lambda i: client.get("/api/pumps"), list_requests),
+            "calculate": (lambda i: client.post("/api/calculate", data={
+                "q_text": "0 10 20 30 40 50 60", "h_text": f"{50 + i % 7} 49 47 44 40 35 29",
+                "eff_text": "0 30 50 62 68 66 58", "p2_text": "3 4 5 5.8 6.4 6.9 7.2",
+                "npsh_text": "1 1.2 1.5 2 2.6 3.4 4.4", "save": "false"}), args.requests),
+            "get_drawing": (lambda i: client.get(f"/api/drawings/{drawing_ids[i % len(drawing_ids)]}"), args.requests),
+        }
+        for name, (make_request, n_requests) in scenarios.items():
+            if args.scenarios and name not in args.scenarios:
+                continue
+            results["scenarios"][name] = await run_scenario(client, make_request, n_requests, args.concurrency)
+            print(f"  {size:>7} {name:<13} {results['scenarios'][name]}", file=sys.stderr)
+    return results
+
+
+def check_thresholds(report, thresholds):
+    failures = []
+    for size, size_result in report["results"].items():
+        for name, stats in size_result["scenarios"].items():
+            limit = thresholds.get(name, {}).get(size, {}).get("p95_ms")
+            if limit is not None and stats["p95_ms"] > limit:
+                failures.append(f"{name} @ {size}: p95 {stats['p95_ms']} ms > {limit} ms")
+            if stats["errors"]:
+                failures.append(f"{name} @ {size}: {stats['errors']} error responses")
+    return failures
+
+
+async def main_async(args):
+    from main import app
+    from db_utils import init_db
+    from models import User
+    from auth_utils import get_current_active_user
+
+    init_db()
+    bench_user = User(id=1, email="bench@example.com", hashed_password="", role="admin", org_id=1)
+    app.dependency_overrides[get_current_active_user] = lambda: bench_user
+
+    report = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "seed": args.seed,
+                 "requests": args.requests, "concurrency": args.concurrency},
+        "results": {},
+    }
+    for size in args.sizes:
+        report["results"][str(size)] = await bench_size(app, size, args)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated catalogue sizes, e.g. 1000,10000,100000")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--scenarios", default="", help="Comma-separated subset of scenarios")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    parser.add_argument("--check", nargs="?", const=DEFAULT_THRESHOLDS, default=None,
+                        help="Fail on regression against a thresholds file (default: benchmarks/thresholds.json)")
+    args = parser.parse_args(argv)
+    args.sizes = [int(s) for s in args.sizes.split(",") if s]
+    args.scenarios = [s for s in args.scenarios.split(",") if s]
+
+    report = asyncio.run(main_async(args))
+    if args.check:
+        with open(args.check) as f:
+            report["failures"] = check_thresholds(report, json.load(f))
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    if report.get("failures"):
+        for failure in report["failures"]:
+            print(f"REGRESSION: {failure}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Startup benchmark: measures how long a fresh worker takes to import the app.
+
+Runs `python -X importtime -c "import main"` in a clean subprocess (against a
+temporary, already migrated data dir) and reports the total import time, the
+wall-clock time and the slowest top-level imports as JSON.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--top 15] [--max-ms 1500] [--output startup.json]
+
+Exits with status 1 if the median import time exceeds --max-ms.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+
+
+def _env(data_dir):
+    env = dict(os.environ)
+    env["DB_DIR"] = data_dir
+    env["UPLOAD_DIR"] = os.path.join(data_dir, "uploads")
+    env["FAST_START"] = "true"
+    return env
+
+
+def parse_importtime(stderr):
+    """Parses `-X importtime` output into {module: (self_us, cumulative_us, depth)}."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        except ValueError:
+            continue
+        name = name.rstrip()[1:]
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped)) // 2
+        modules[stripped] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def run_once(data_dir):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=_env(data_dir), capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"Import failed:\n{proc.stderr[-2000:]}")
+    return wall_ms, parse_importtime(proc.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if median import time exceeds this")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    data_dir = tempfile.mkdtemp(prefix="ruspump_bench_")
+    subprocess.run([sys.executable, "manage.py", "migrate"], cwd=BACKEND_DIR, env=_env(data_dir),
+                   check=True, capture_output=True)
+
+    walls, imports, last = [], [], {}
+    for _ in range(args.runs):
+        wall_ms, modules = run_once(data_dir)
+        walls.append(wall_ms)
+        imports.append(modules.get("main", (0, 0, 0))[1] / 1000)
+        last = modules
+
+    top_level = [(name, cum) for name, (_, cum, depth) in last.items() if depth == 1]
+    top_level.sort(key=lambda item: item[1], reverse=True)
+
+    report = {
+        "runs": args.runs,
+        "import_ms": {"median": statistics.median(imports), "min": min(imports), "max": max(imports)},
+        "wall_ms": {"median": statistics.median(walls), "min": min(walls), "max": max(walls)},
+        "heavy_modules_loaded": {m: m in last for m in ("numpy", "passlib", "jose", "bcrypt")},
+        "slowest_imports": [{"module": name, "cumulative_ms": cum / 1000} for name, cum in top_level[:args.top]],
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+    if args.max_ms is not None and report["import_ms"]["median"] > args.max_ms:
+        print(f"FAIL: median import {report['import_ms']['median']:.1f} ms > {args.max_ms} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
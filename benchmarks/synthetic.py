@@ -0,0 +1,145 @@
+"""
+Synthetic pump catalogues for benchmarks.
+
+Curves are generated from a simple but realistic centrifugal pump model around
+a best efficiency point (BEP) and fitted with cubic polynomials, exactly like
+`calc_utils.get_fit` does for digitized points:
+
+    H(q)   = H0 * (1 - 0.35 x^2 - 0.05 x^3),   x = q / q_bep
+    eta(q) = eta_bep * x * (2 - x)
+    P2(q)  = rho g q H / eta
+    NPSH(q)= n0 * (1 + 0.8 x^2)
+"""
+import json
+import numpy as np
+
+N_POINTS = 8
+COMPANIES = ["RusPump", "Grundfos", "Wilo", "KSB", "CNP", "Ebara", "Lowara", "DAB"]
+RPMS = [960, 1450, 2900]
+DNS = [32, 40, 50, 65, 80, 100, 125, 150, 200, 250, 300]
+
+PUMP_COLUMNS = (
+    "name", "oem_name", "company", "executor", "dn_suction", "dn_discharge", "rpm", "p2_nom", "impeller_actual",
+    "q_text", "h_text", "npsh_text", "p2_text", "eff_text",
+    "h_coeffs", "eff_coeffs", "p2_coeffs", "npsh_coeffs",
+    "q_max", "q_min", "h_max", "h_min", "q_req", "h_req", "h_st",
+    "drawing_path", "drawing_filename", "price", "currency", "comment", "save_source", "org_id",
+    "created_at", "updated_at",
+)
+
+# Normalized shapes on x = q / q_bep in [0, 1.3]
+_X = np.linspace(0.0, 1.3, N_POINTS)
+_H_SHAPE = 1 - 0.35 * _X ** 2 - 0.05 * _X ** 3
+_EFF_SHAPE = _X * (2 - _X)
+_NPSH_SHAPE = 1 + 0.8 * _X ** 2
+
+
+def _scale_coeffs(c_norm, scale):
+    """Converts cubic coeffs fitted on x = q / scale into coeffs on q (highest degree first)."""
+    powers = np.arange(3, -1, -1)
+    return c_norm / scale[:, None] ** powers[None, :]
+
+
+def generate_curves(n, seed=42):
+    """Returns a dict of per-pump arrays (points and cubic coefficients) for n pumps."""
+    rng = np.random.default_rng(seed)
+    q_bep = np.exp(rng.uniform(np.log(2), np.log(2000), n))          # m3/h
+    h0 = np.exp(rng.uniform(np.log(5), np.log(250), n))              # m
+    eta_bep = rng.uniform(45, 88, n)                                  # %
+    n0 = rng.uniform(1.0, 8.0, n)                                     # m
+
+    q = q_bep[:, None] * _X[None, :]
+    h = h0[:, None] * _H_SHAPE[None, :]
+    eff = eta_bep[:, None] * _EFF_SHAPE[None, :]
+    npsh = n0[:, None] * _NPSH_SHAPE[None, :]
+    # P2 [kW] = rho g Q H / eta, with Q in m3/s; eta at q=0 is 0, use the shutoff power instead
+    eff_safe = np.maximum(eff, eta_bep[:, None] * 0.25)
+    p2 = 1000 * 9.81 * (q / 3600) * h / (eff_safe / 100) / 1000 + 0.1 * q_bep[:, None] ** 0.5
+
+    def fit(y):
+        # One least-squares solve for all pumps on the shared normalized grid
+        c_norm = np.polyfit(_X, (y / y.max(axis=1, keepdims=True)).T, 3).T * y.max(axis=1, keepdims=True)
+        return _scale_coeffs(c_norm, q_bep)
+
+    return {
+        "q": q, "h": h, "eff": eff, "p2": p2, "npsh": npsh,
+        "h_coeffs": fit(h), "eff_coeffs": fit(eff), "p2_coeffs": fit(p2), "npsh_coeffs": fit(npsh),
+        "q_bep": q_bep, "h0": h0, "rng": rng,
+    }
+
+
+def _text(row):
+    return " ".join(f"{v:.3f}" for v in row)
+
+
+def generate_pump_rows(n, org_id=1, seed=42, drawing_ids=None):
+    """Yields INSERT parameter tuples for `pumps` in PUMP_COLUMNS order."""
+    c = generate_curves(n, seed)
+    rng = c["rng"]
+    companies = rng.integers(0, len(COMPANIES), n)
+    rpms = rng.integers(0, len(RPMS), n)
+    dns = rng.integers(0, len(DNS) - 1, n)
+    now = "01.01.2026 00:00"
+    for i in range(n):
+        name = f"{COMPANIES[companies[i]]} {int(c['q_bep'][i])}-{int(c['h0'][i])} #{i}"
+        p2_max = float(c["p2"][i].max())
+        drawing = drawing_ids[i % len(drawing_ids)] if drawing_ids else None
+        yield (
+            name, name, COMPANIES[companies[i]], "bench", str(DNS[dns[i] + 1]), str(DNS[dns[i]]),
+            str(RPMS[rpms[i]]), f"{p2_max:.1f}", "",
+            _text(c["q"][i]), _text(c["h"][i]), _text(c["npsh"][i]), _text(c["p2"][i]), _text(c["eff"][i]),
+            json.dumps(c["h_coeffs"][i].tolist()), json.dumps(c["eff_coeffs"][i].tolist()),
+            json.dumps(c["p2_coeffs"][i].tolist()), json.dumps(c["npsh_coeffs"][i].tolist()),
+            float(c["q"][i, -1]), 0.0, float(c["h"][i].max()), float(c["h"][i].min()), 0.0, 0.0, 0.0,
+            f"/api/drawings/{drawing}" if drawing else "", f"drawing_{drawing}.pdf" if drawing else "",
+            0.0, "", "", "points", org_id, now, now,
+        )
+
+
+def synthetic_pdf(size_kb=200, seed=0):
+    """A syntactically valid single-page PDF padded with a binary stream to roughly size_kb."""
+    payload = np.random.default_rng(seed).bytes(size_kb * 1024)
+    stream = b"q 1 0 0 1 0 0 cm Q\n" + payload
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 842 595] /Contents 4 0 R >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def populate(conn_pumps, conn_sens, conn_files, n, org_id=1, seed=42, n_drawings=20, drawing_kb=200):
+    """Replaces the org's catalogue with n synthetic pumps (plus prices and shared drawings)."""
+    conn_pumps.execute("DELETE FROM pumps WHERE org_id=?", (org_id,))
+    conn_files.execute("DELETE FROM files WHERE org_id=?", (org_id,))
+    drawing_ids = []
+    for k in range(n_drawings):
+        cur = conn_files.execute("INSERT INTO files (filename, data, org_id) VALUES (?, ?, ?)",
+                                 (f"drawing_{k}.pdf", synthetic_pdf(drawing_kb, seed + k), org_id))
+        drawing_ids.append(cur.lastrowid)
+    conn_files.commit()
+
+    placeholders = ",".join(["?"] * len(PUMP_COLUMNS))
+    conn_pumps.executemany(f"INSERT INTO pumps ({','.join(PUMP_COLUMNS)}) VALUES ({placeholders})",
+                           generate_pump_rows(n, org_id, seed, drawing_ids))
+    ids = [r[0] for r in conn_pumps.execute("SELECT id FROM pumps WHERE org_id=? ORDER BY id", (org_id,))]
+    conn_pumps.commit()
+
+    rng = np.random.default_rng(seed + 1)
+    prices = rng.uniform(50_000, 5_000_000, len(ids)).round(-2)
+    conn_sens.execute("DELETE FROM private_data")
+    conn_sens.executemany("INSERT INTO private_data (id, original_name, price, currency) VALUES (?, ?, ?, 'RUB')",
+                          ((pid, f"Internal #{pid}", float(p)) for pid, p in zip(ids, prices)))
+    conn_sens.commit()
+    return ids, drawing_ids
@@ -7,6 +7,17 @@ export class CloudSqlAdapter {
     }
 
     async getPumps() {
+        // Incremental sync: after the first full load only the changes since the
+        // last known catalogue revision are fetched (/api/pumps/changes).
+        const token = authManager.token;
+        if (this.archive && this.archive.token === token) {
+            const changes = await this.fetchChanges(this.archive.revision);
+            if (changes && !changes.reset) {
+                this.applyChanges(changes);
+                return [...this.archive.pumps];
+            }
+        }
+
         const response = await fetch('/api/pumps', {
             headers: authManager.getAuthHeader()
         });
@@ -14,6 +25,43 @@ export class CloudSqlAdapter {
             if (response.status === 401) throw new Error('401 Unauthorized');
             throw new Error(`Failed to fetch pumps: ${response.status}`);
         }
+        const pumps = await response.json();
+        const revision = parseInt(response.headers.get('X-Catalogue-Revision'), 10);
+        this.archive = Number.isNaN(revision) ? null : { token, revision, pumps };
+        return [...pumps];
+    }
+
+    async fetchChanges(since) {
+        const response = await fetch(`/api/pumps/changes?since=${since}`, {
+            headers: authManager.getAuthHeader()
+        });
+        if (!response.ok) {
+            if (response.status === 401) throw new Error('401 Unauthorized');
+            return null; // Fall back to a full reload
+        }
+        return await response.json();
+    }
+
+    applyChanges(changes) {
+        const removed = new Set([...changes.deletes, ...changes.upserts.map(p => p.id)]);
+        const pumps = this.archive.pumps.filter(p => !removed.has(p.id)).concat(changes.upserts);
+        pumps.sort((a, b) => b.id - a.id); // Same order as /api/pumps (newest first)
+        this.archive = { ...this.archive, revision: changes.revision, pumps };
+    }
+
+    async getCurves(ids, { samples = 100, qReq, hReq, hSt } = {}) {
+        // Pre-sampled chart data (curves, system curve, operating point) for one or many pumps
+        const params = new URLSearchParams({ ids: ids.join(','), samples });
+        if (qReq !== undefined) params.set('q_req', qReq);
+        if (hReq !== undefined) params.set('h_req', hReq);
+        if (hSt !== undefined) params.set('h_st', hSt);
+        const response = await fetch(`/api/curves?${params}`, {
+            headers: authManager.getAuthHeader()
+        });
+        if (!response.ok) {
+            if (response.status === 401) throw new Error('401 Unauthorized');
+            throw new Error(`Failed to fetch curves: ${response.status}`);
+        }
         return await response.json();
     }
 
@@ -1,3 +1,5 @@
+import { authManager } from './AuthManager';
+
 
 const SelectionCore = (() => {
     let results = [];
@@ -19,7 +21,7 @@ const SelectionCore = (() => {
             const api = window.API_URL || "http://localhost:8000";
             const response = await fetch(`${api}/api/selection/search`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: { 'Content-Type': 'application/json', ...authManager.getAuthHeader() },
                 body: JSON.stringify({ q_req: qReq, h_req: hReq, tolerance_percent: tol || 10 })
             });
 
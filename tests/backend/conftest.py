@@ -2,18 +2,32 @@ import pytest
 from httpx import AsyncClient, ASGITransport
 import os
 import sys
+import tempfile
 
 # Ensure backend dir is in path
 BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "backend")
 sys.path.append(BACKEND_DIR)
 
 # IMPORTANT: Mock DB paths or env here if needed to avoid touching production DB
-os.environ["DB_DIR"] = "." # Local dir for tests
+TEST_DATA_DIR = tempfile.mkdtemp(prefix="ruspump_test_")
+os.environ["DB_DIR"] = TEST_DATA_DIR
+os.environ["UPLOAD_DIR"] = os.path.join(TEST_DATA_DIR, "uploads")
 
 from main import app
+from db_utils import init_db
+from models import User
+from auth_utils import get_current_active_user
+import ratelimit
+
+init_db()
+
+TEST_USER = User(id=1, email="test@example.com", hashed_password="", role="admin", org_id=1)
 
 @pytest.fixture
 async def ac():
+    app.dependency_overrides[get_current_active_user] = lambda: TEST_USER
+    ratelimit.reset()
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as client:
         yield client
+    app.dependency_overrides.pop(get_current_active_user, None)
@@ -0,0 +1,29 @@
+import pytest
+
+from test_selection import save_pump
+
+
+@pytest.mark.asyncio
+async def test_curves_sample_chart_data_and_operating_point(ac):
+    # H = 49 - 0.01 Q^2 meets the system curve 10 + Q^2/30 at (30, 40)
+    pid = await save_pump(ac, [0, -0.01, 0, 49], name="Curves", q_req="30", h_req="40", h_st="10")
+    response = await ac.get("/api/curves", params={"ids": f"{pid},999999", "samples": 11})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["missing"] == [999999]
+
+    pump = data["pumps"][0]
+    assert pump["id"] == pid
+    assert pump["curves"]["q"] == pytest.approx([10 * i for i in range(11)])
+    assert pump["curves"]["h"][3] == pytest.approx(40)
+    assert pump["curves"]["eff"][3] == pytest.approx(42)
+    assert len(pump["system"]["h"]) == 11 and pump["system"]["h"][0] == pytest.approx(10)
+    assert pump["operating_point"]["q"] == pytest.approx(30, abs=0.01)
+    assert pump["operating_point"]["h"] == pytest.approx(40, abs=0.01)
+    assert pump["operating_point"]["p2"] == pytest.approx(8, abs=0.01)
+
+    # Duty override changes the system curve; a second identical call is served from the memo
+    override = (await ac.get("/api/curves", params={"ids": pid, "samples": 11, "h_st": 40})).json()["pumps"][0]
+    assert override["operating_point"]["q"] == pytest.approx(30, abs=0.01)
+    assert override["system"]["h"][0] == pytest.approx(40)
+    await ac.delete(f"/api/pumps/{pid}")
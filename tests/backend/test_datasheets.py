@@ -0,0 +1,41 @@
+import pytest
+
+import datasheet_utils
+from test_jobs import wait_for
+from test_selection import save_pump
+
+
+@pytest.mark.asyncio
+async def test_datasheet_unavailable_without_matplotlib(ac, monkeypatch):
+    monkeypatch.setattr(datasheet_utils, "available", lambda: False)
+    pid = await save_pump(ac, [0, -0.01, 0, 49], "Datasheet 503")
+    assert (await ac.get(f"/api/pumps/{pid}/datasheet")).status_code == 503
+    assert (await ac.post("/api/datasheets/bulk", json={"ids": [pid]})).status_code == 503
+    await ac.delete(f"/api/pumps/{pid}")
+
+
+def test_cache_path_follows_revision():
+    pump = {"id": 5, "org_id": 1, "revision": 3}
+    assert datasheet_utils.cache_path(pump, "pdf").endswith("5_r3_v1.pdf")
+    assert datasheet_utils.cache_path({**pump, "revision": 4}, "pdf") != datasheet_utils.cache_path(pump, "pdf")
+
+
+@pytest.mark.asyncio
+async def test_datasheet_render_cache_and_bulk_zip(ac):
+    pytest.importorskip("matplotlib")
+    pid = await save_pump(ac, [0, -0.01, 0, 49], "Datasheet", q_req="30", h_req="40")
+    first = await ac.get(f"/api/pumps/{pid}/datasheet")
+    assert first.status_code == 200 and first.content.startswith(b"%PDF")
+    png = await ac.get(f"/api/pumps/{pid}/datasheet?format=png")
+    assert png.content.startswith(b"\x89PNG")
+    assert (await ac.get(f"/api/pumps/{pid}/datasheet")).content == first.content  # served from the cache
+    assert (await ac.get("/api/pumps/999999/datasheet")).status_code == 404
+
+    started = await ac.post("/api/datasheets/bulk", json={"ids": [pid, 999999]})
+    assert started.status_code == 202
+    job = await wait_for(ac, started.json()["job_id"], timeout=60)
+    assert job["status"] == "succeeded", job
+    assert job["result"]["count"] == 1 and job["result"]["missing"] == [999999]
+    archive = await ac.get(f"/api/datasheets/bulk/{job['id']}")
+    assert archive.headers["content-type"] == "application/zip"
+    await ac.delete(f"/api/pumps/{pid}")
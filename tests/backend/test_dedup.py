@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from dedup_utils import curve_hash, curve_signature, signature_matrix
+from test_selection import save_pump
+
+
+def test_hash_ignores_formatting_noise():
+    base = curve_hash([0, -0.01, 0, 49], [0, 0, 1, 0], [], [], 0, 100, "Pump  A", company="ACME ")
+    assert base == curve_hash([0.0, -0.0100000001, 0, 49.0], [0, 0, 1, 0], [], [], 0.0, 100, "pump a", company="acme")
+    assert base != curve_hash([0, -0.01, 0, 50], [0, 0, 1, 0], [], [], 0, 100, "Pump A", company="ACME")
+
+
+def test_signature_tolerates_small_refits():
+    sig = signature_matrix(np.array([[0, -0.01, 0, 49], [0, -0.01, 0.001, 49.02], [0, -0.02, 0, 49]]), [0] * 3, [50] * 3)
+    assert (sig[0] == sig[1]).all() and not (sig[0] == sig[2]).all()
+    assert curve_signature([0, 0, 0, 0], 0, 100) is None
+
+
+@pytest.mark.asyncio
+async def test_duplicates_warned_on_save_and_reported(ac):
+    first = await save_pump(ac, [0, -0.004, 0, 61], "Dup sheet")
+    r = await ac.post("/api/calculate", data={
+        "name": "Dup sheet", "q_text": "MODES", "h_text": "[0, -0.004, 0, 61]",
+        "eff_text": "[0, -0.02, 2, 0]", "p2_text": "[0, 0, 0.1, 5]", "npsh_text": "[0, 0.001, 0, 2]",
+        "q_min": "0", "q_max": "100", "save": "true"})
+    second = int(r.json()["id"])
+    assert {"id": first, "name": "Dup sheet", "match": "exact"} in r.json()["duplicates"]
+    renamed = await save_pump(ac, [0, -0.004, 0.0001, 61], "Dup sheet rev B")
+
+    report = (await ac.get("/api/pumps/duplicates")).json()
+    exact = [sorted(p["id"] for p in g) for g in report["exact"]]
+    near = [sorted(p["id"] for p in g) for g in report["near"]]
+    assert [first, second] in exact
+    assert any({first, second, renamed} <= set(g) for g in near)
+    for pid in (first, second, renamed):
+        await ac.delete(f"/api/pumps/{pid}")
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from config import config
+
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 4096 + b"\n%%EOF\n"  # ~1 MB, several upload chunks
+
+
+@pytest.mark.asyncio
+async def test_streamed_upload_dedup_and_link(ac):
+    first = await ac.post("/api/drawings", files={"file": ("scheme.pdf", PDF, "application/pdf")})
+    assert first.status_code == 200, first.text
+    info = first.json()
+    assert info["size"] == len(PDF) and info["mime"] == "application/pdf" and len(info["sha256"]) == 64
+
+    again = await ac.post("/api/drawings", files={"file": ("copy.pdf", PDF, "application/pdf")})
+    assert again.json()["id"] == info["id"]  # identical content is stored once per organization
+
+    download = await ac.get(info["path"])
+    assert download.content == PDF
+    assert download.headers["content-type"] == "application/pdf"
+
+    saved = await ac.post("/api/calculate", data={
+        "name": "With drawing", "q_text": "MODES", "h_text": json.dumps([0, 0, -0.01, 50]),
+        "eff_text": "[0,0,0,0]", "p2_text": "[0,0,0,0]", "npsh_text": "[0,0,0,0]",
+        "save": "true", "drawing_id": str(info["id"])})
+    assert saved.json()["draw_path"] == info["path"]
+    await ac.delete(f"/api/pumps/{saved.json()['id']}")
+
+
+@pytest.mark.asyncio
+async def test_upload_rejects_wrong_type_and_oversize(ac, monkeypatch):
+    fake = await ac.post("/api/drawings", files={"file": ("scheme.pdf", b"MZ\x90\x00 not a pdf", "application/pdf")})
+    assert fake.status_code == 415
+    exe = await ac.post("/api/drawings", files={"file": ("tool.exe", b"MZ", "application/octet-stream")})
+    assert exe.status_code == 415
+
+    monkeypatch.setattr(config, "MAX_UPLOAD_MB", 0)
+    too_big = await ac.post("/api/drawings", files={"file": ("scheme.pdf", PDF, "application/pdf")})
+    assert too_big.status_code == 413
@@ -0,0 +1,82 @@
+import json
+
+import numpy as np
+import pytest
+
+import extraction_utils
+from calc_utils import get_fit, parse_float_list
+
+# Plot area: Q 0..100 on columns 50..450, H 0..50 on rows 350..50, P2 0..10 on the same rows
+X_AXIS = (50, 450, 0, 100)
+H_AXIS = (350, 50, 0, 50)
+P2_AXIS = (350, 50, 0, 10)
+
+
+def chart(width=500, height=400):
+    rgb = np.full((height, width, 3), 255, dtype=np.uint8)
+    rgb[50:351:50, 50:451] = (200, 200, 200)  # grid lines
+    cols = np.arange(60, 441)
+    q = (cols - 50) / 4.0
+    for values, axis_max, color in ((50 - 0.003 * q * q, 50, (0, 64, 133)), (2 + 0.05 * q, 10, (255, 165, 0))):
+        rows = np.round(350 - values / axis_max * 300).astype(int)
+        for dy in (-1, 0, 1):  # 3 px line
+            rgb[rows + dy, cols] = color
+    rgb[60:70, 300:320] = (0, 64, 133)  # legend swatch: too tall to be a line, dropped
+    return rgb
+
+
+def test_extract_curves_on_common_grid():
+    result = extraction_utils.extract_curves(chart(), X_AXIS, [
+        {"mode": "QH", "color": "#004085", "y_axis": H_AXIS},
+        {"mode": "QP", "color": "#ffa500", "tolerance": 40, "y_axis": P2_AXIS},
+    ], points=10)
+    q = parse_float_list(result["q_text"])
+    assert len(q) == 10 and q[0] == pytest.approx(2.5) and q[-1] == pytest.approx(97.5)
+    h = np.array(parse_float_list(result["h_text"]))
+    assert np.allclose(h, 50 - 0.003 * np.array(q) ** 2, atol=0.3)
+    assert np.allclose(parse_float_list(result["p2_text"]), 2 + 0.05 * np.array(q), atol=0.1)
+    assert get_fit(q, result["h_text"])[1] == pytest.approx(-0.003, abs=3e-4)
+
+
+def test_missing_curve_is_an_error():
+    with pytest.raises(extraction_utils.ExtractionError):
+        extraction_utils.extract_curves(chart(), X_AXIS, [{"mode": "QE", "color": "#28a745", "y_axis": H_AXIS}])
+
+
+@pytest.mark.asyncio
+async def test_trace_endpoint_validation(ac, monkeypatch):
+    monkeypatch.setattr(extraction_utils, "supports", lambda mime: False)
+    spec = json.dumps({"x_axis": X_AXIS, "curves": [{"mode": "QH", "color": "#004085", "y_axis": H_AXIS}]})
+    png = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+    r = await ac.post("/api/extraction/trace", data={"calibration": spec}, files={"file": ("chart.png", png, "image/png")})
+    assert r.status_code == 503
+    bad = await ac.post("/api/extraction/trace", data={"calibration": json.dumps({"x_axis": [1, 2], "curves": []})},
+                        files={"file": ("chart.png", png, "image/png")})
+    assert bad.status_code == 422
+
+
+def test_page_ranges_checked_before_expansion():
+    from fastapi import HTTPException
+    from routers.extraction import _parse_pages
+    assert _parse_pages("1-3,2,5", 5) == [0, 1, 2, 4]
+    assert _parse_pages("", 2) == [0, 1]
+    for text in ("1-2000000000", "0-1", "3-2", "a-b"):
+        with pytest.raises(HTTPException) as e:
+            _parse_pages(text, 5)
+        assert e.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_trace_rejects_untraceable_files(ac):
+    spec = json.dumps({"x_axis": X_AXIS, "curves": [{"mode": "QH", "color": "#004085", "y_axis": H_AXIS}]})
+    r = await ac.post("/api/extraction/trace", data={"calibration": spec},
+                      files={"file": ("plan.dwg", b"AC1032" + b"\x00" * 64, "application/octet-stream")})
+    assert r.status_code == 415
+
+
+def test_corrupt_image_is_an_extraction_error(tmp_path):
+    pytest.importorskip("PIL")
+    path = tmp_path / "chart.png"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n" + b"\x00" * 64)
+    result = extraction_utils.extract_page((str(path), "image/png", 0, 150, X_AXIS, [], 15))
+    assert result["page"] == 1 and "error" in result
@@ -0,0 +1,140 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+import jobs
+
+
+async def wait_for(ac, job_id, timeout=10):
+    for _ in range(int(timeout / 0.05)):
+        job = (await ac.get(f"/api/jobs/{job_id}")).json()
+        if job["status"] in jobs.FINISHED:
+            return job
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish: {job}")
+
+
+@pytest.mark.asyncio
+async def test_background_import_merge(ac, tmp_path):
+    src = tmp_path / "upload.db"
+    conn = sqlite3.connect(src)
+    numeric = ", ".join(f"{c} REAL DEFAULT 0" for c in ("q_max", "q_min", "h_max", "h_min", "q_req", "h_req", "h_st", "price"))
+    conn.execute(f"CREATE TABLE pumps (id INTEGER PRIMARY KEY, name TEXT, oem_name TEXT, org_id INTEGER, {numeric})")
+    conn.executemany("INSERT INTO pumps (name, oem_name, org_id) VALUES (?, ?, 1)", [(f"Job {i}", f"Job {i}") for i in range(3)])
+    conn.commit(); conn.close()
+
+    with open(src, "rb") as f:
+        response = await ac.post("/api/admin/import_db/background", files={"file": ("upload.db", f.read())},
+                                 data={"merge": "true"})
+    assert response.status_code == 202
+    job = await wait_for(ac, response.json()["job_id"])
+    assert job["status"] == "succeeded", job
+    assert job["result"]["count"] == 3 and job["progress"] == 1.0
+
+    names = {p["oem_name"]: p["id"] for p in (await ac.get("/api/pumps")).json()}
+    for i in range(3):
+        await ac.delete(f"/api/pumps/{names[f'Job {i}']}")
+
+
+@pytest.mark.asyncio
+async def test_merge_backfills_bep_of_older_sources(ac, tmp_path):
+    src = tmp_path / "old.db"
+    conn = sqlite3.connect(src)
+    numeric = ", ".join(f"{c} REAL DEFAULT 0" for c in ("h_max", "h_min", "q_req", "h_req", "h_st", "price"))
+    conn.execute("CREATE TABLE pumps (id INTEGER PRIMARY KEY, name TEXT, oem_name TEXT, org_id INTEGER,"
+                 f" h_coeffs TEXT, eff_coeffs TEXT, q_min REAL, q_max REAL, {numeric})")  # No BEP columns yet
+    conn.execute("INSERT INTO pumps (name, oem_name, org_id, h_coeffs, eff_coeffs, q_min, q_max)"
+                 " VALUES ('Old BEP', 'Old BEP', 1, '[0, -0.01, 0, 49]', '[0, -0.02, 2, 0]', 0, 100)")
+    conn.commit(); conn.close()
+
+    with open(src, "rb") as f:
+        response = await ac.post("/api/admin/import_db", files={"file": ("old.db", f.read())}, data={"merge": "true"})
+    assert response.status_code == 200, response.text
+    pump = [p for p in (await ac.get("/api/pumps")).json() if p["oem_name"] == "Old BEP"][0]
+    assert (pump["bep_q"], pump["por_q_min"], pump["por_q_max"]) == pytest.approx((50, 35, 60))
+    await ac.delete(f"/api/pumps/{pump['id']}")
+
+
+@pytest.mark.asyncio
+async def test_failed_job_retries_and_cancel(ac):
+    calls = []
+
+    @jobs.job_handler("test_flaky")
+    def flaky(job, fail_times):
+        calls.append(job.attempt)
+        if len(calls) <= fail_times:
+            raise RuntimeError("boom")
+        return {"attempt": job.attempt}
+
+    failed = await wait_for(ac, jobs.submit("test_flaky", {"fail_times": 1}, org_id=1))
+    assert failed["status"] == "failed" and "boom" in failed["error"]
+
+    retried = await ac.post(f"/api/jobs/{failed['id']}/retry")
+    assert retried.status_code == 200
+    done = await wait_for(ac, failed["id"])
+    assert done["status"] == "succeeded" and done["result"] == {"attempt": 2}
+
+    assert (await ac.post(f"/api/jobs/{failed['id']}/cancel")).status_code == 409
+    assert (await ac.get("/api/jobs/999999")).status_code == 404
+
+
+def test_running_job_stops_at_progress_when_cancelled():
+    started, release = jobs.threading.Event(), jobs.threading.Event()
+
+    @jobs.job_handler("test_slow")
+    def slow(job):
+        started.set()
+        release.wait(5)
+        job.progress(0.5, force=True)
+        return {"finished": True}
+
+    job_id = jobs.submit("test_slow")
+    assert started.wait(5)
+    jobs.cancel(job_id)
+    release.set()
+    for _ in range(200):
+        if jobs.get_job(job_id)["status"] in jobs.FINISHED:
+            break
+        jobs.time.sleep(0.025)
+    assert jobs.get_job(job_id)["status"] == "cancelled"
+
+
+@pytest.mark.asyncio
+async def test_admin_jobs_and_backups_need_admin(ac):
+    from main import app
+    from auth_utils import get_current_active_user
+    from models import User
+    import ratelimit
+    app.dependency_overrides.pop(get_current_active_user)
+    for method, url in [("post", "/api/admin/backup"), ("get", "/api/admin/backups/20250101000000_sensitive.db"),
+                        ("post", "/api/admin/backfill-bep"), ("post", "/api/admin/import_db/background")]:
+        ratelimit.reset() # The admin scope allows only a few anonymous calls
+        assert (await getattr(ac, method)(url)).status_code == 401, url
+    app.dependency_overrides[get_current_active_user] = lambda: User(id=2, email="u@example.com", hashed_password="", role="user", org_id=1)
+    assert (await ac.post("/api/admin/backup")).status_code == 403
+
+
+def test_pooled_connections_follow_a_replaced_file(tmp_path):
+    import os
+    import db_utils
+    from sqlmodel import Session, text
+
+    def make(path, value):
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE t (v INTEGER)")
+        conn.execute("INSERT INTO t VALUES (?)", (value,))
+        conn.commit(); conn.close()
+
+    path = str(tmp_path / "pumps.db")
+    make(path, 1)
+    engine = db_utils._get_engine(path)
+    with Session(engine) as session:
+        assert session.exec(text("SELECT v FROM t")).one()[0] == 1
+    # As another worker's import does: a new file renamed over the pooled one
+    make(path + ".tmp", 2)
+    os.replace(path + ".tmp", path)
+    with Session(engine) as session:
+        assert session.exec(text("SELECT v FROM t")).one()[0] == 2
+    engine.dispose()
+    db_utils._engines.pop(path)
@@ -0,0 +1,49 @@
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_metrics_exposes_route_latency_and_db_queries(ac):
+    await ac.get("/api/pumps")
+    response = await ac.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'ruspump_http_request_duration_seconds_count{method="GET",route="/api/pumps",status="200"}' in body
+    assert 'ruspump_db_queries_per_request_count{route="/api/pumps"}' in body
+    assert 'ruspump_db_query_duration_seconds_bucket{db="pumps.db",le="+Inf"}' in body
+
+
+@pytest.mark.asyncio
+async def test_unhandled_errors_recorded_as_500():
+    from httpx import ASGITransport, AsyncClient
+    from main import app
+    import metrics
+
+    def boom():
+        raise RuntimeError("boom")
+
+    app.add_api_route("/api/test-boom", boom)
+    labels = ("GET", "/api/test-boom", 500)
+    before = metrics.HTTP_LATENCY.count(labels)
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app, raise_app_exceptions=False), base_url="http://test") as client:
+            assert (await client.get("/api/test-boom")).status_code == 500
+    finally:
+        app.router.routes[:] = [r for r in app.router.routes if getattr(r, "path", None) != "/api/test-boom"]
+    assert metrics.HTTP_LATENCY.count(labels) == before + 1
+
+
+def test_failed_statement_pops_its_start_time(tmp_path):
+    import metrics
+    from sqlalchemy import create_engine, exc, text
+
+    engine = metrics.instrument_engine(create_engine(f"sqlite:///{tmp_path / 'errors.db'}"), "errors.db")
+    before = metrics.DB_QUERY_LATENCY.count(("errors.db",))
+    with engine.connect() as conn:
+        with pytest.raises(exc.OperationalError):
+            conn.execute(text("SELECT * FROM missing_table"))
+        assert conn.info.get("ruspump_query_start") == []
+        conn.execute(text("SELECT 1"))
+        assert conn.info.get("ruspump_query_start") == []
+    assert metrics.DB_QUERY_LATENCY.count(("errors.db",)) == before + 2
+    engine.dispose()
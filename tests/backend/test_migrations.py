@@ -0,0 +1,80 @@
+import sqlite3
+
+from migrations import migrate, get_schema_version, LATEST_VERSION
+
+
+def _legacy_db(tmp_path):
+    """Builds a pre-migration pumps.db / drawings.db pair like the old init_db left behind."""
+    db = tmp_path / "pumps.db"
+    files = tmp_path / "drawings.db"
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE pumps (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, oem_name TEXT, "
+                 "drawing_path TEXT, price REAL, currency TEXT)")
+    conn.execute("INSERT INTO pumps (name, oem_name, drawing_path, price, currency) "
+                 "VALUES ('Secret', 'OEM-1', '/api/drawings/1', 100, 'RUB')")
+    conn.commit(); conn.close()
+    conn_f = sqlite3.connect(files)
+    conn_f.execute("CREATE TABLE files (id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT, data BLOB)")
+    conn_f.execute("INSERT INTO files (filename, data) VALUES ('900ZLB-70.pdf', x'00')")
+    conn_f.commit(); conn_f.close()
+    return db, tmp_path / "sensitive.db", files
+
+
+def test_migrate_legacy_db(tmp_path):
+    db, sens, files = _legacy_db(tmp_path)
+    assert migrate(db, sens, files) == LATEST_VERSION
+    assert get_schema_version(db) == LATEST_VERSION
+
+    conn = sqlite3.connect(db)
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(pumps)")}
+    assert {"h_st", "org_id", "drawing_filename", "save_source"} <= cols
+    row = conn.execute("SELECT name, price, drawing_filename FROM pumps").fetchone()
+    conn.close()
+    assert row == ("OEM-1", 0, "900ZLB-70.pdf")
+
+    conn_s = sqlite3.connect(sens)
+    assert conn_s.execute("SELECT original_name, price FROM private_data").fetchone() == ("Secret", 100)
+    conn_s.close()
+
+
+def test_migrate_is_noop_when_current(tmp_path):
+    db, sens, files = _legacy_db(tmp_path)
+    migrate(db, sens, files)
+    assert migrate(db, sens, files) == 0
+
+
+def test_orphans_adopted_once_an_organization_exists(tmp_path):
+    db, sens, files = _legacy_db(tmp_path)
+    migrate(db, sens, files)  # No organization yet: the legacy pump stays orphaned
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT org_id FROM pumps").fetchone() == (None,)
+    conn.execute("INSERT INTO organizations (name, admin_email) VALUES ('Late org', 'a@example.com')")
+    conn.commit()
+    org_id = conn.execute("SELECT id FROM organizations").fetchone()[0]
+
+    assert migrate(db, sens, files) == 0
+    assert conn.execute("SELECT org_id FROM pumps").fetchone() == (org_id,)
+    revision = conn.execute("SELECT revision FROM catalogue_revisions WHERE org_id = ?", (org_id,)).fetchone()[0]
+    assert conn.execute("SELECT revision FROM pumps").fetchone() == (revision,)
+    conn.close()
+    conn_f = sqlite3.connect(files)
+    assert conn_f.execute("SELECT org_id FROM files").fetchone() == (org_id,)
+    conn_f.close()
+
+
+def test_migrate_backfills_best_efficiency_point(tmp_path):
+    db, sens, files = _legacy_db(tmp_path)
+    conn = sqlite3.connect(db)
+    for col in ("h_coeffs", "eff_coeffs"):
+        conn.execute(f"ALTER TABLE pumps ADD COLUMN {col} TEXT")
+    conn.execute("ALTER TABLE pumps ADD COLUMN q_max REAL")
+    conn.execute("UPDATE pumps SET h_coeffs = '[0, -0.01, 0, 49]', eff_coeffs = '[0, -0.02, 2, 0]', q_max = 100")
+    conn.commit(); conn.close()
+
+    migrate(db, sens, files)
+    conn = sqlite3.connect(db)
+    row = conn.execute("SELECT bep_q, bep_h, bep_eff, por_q_min, por_q_max, aor_q_max FROM pumps").fetchone()
+    indexes = {r[1] for r in conn.execute("PRAGMA index_list(pumps)")}
+    conn.close()
+    assert row == (50, 24, 50, 35, 60, 65)
+    assert {"ix_pumps_org_bep", "ix_pumps_org_por"} <= indexes
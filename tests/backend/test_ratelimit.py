@@ -0,0 +1,54 @@
+import pytest
+
+import ratelimit
+from auth_utils import create_access_token
+from ratelimit import MemoryBuckets, Policy, SqliteBuckets
+
+
+def test_token_bucket_refills():
+    buckets = MemoryBuckets()
+    assert buckets.take("k", rpm=60, burst=2, now=0.0) == 0
+    assert buckets.take("k", rpm=60, burst=2, now=0.0) == 0
+    assert buckets.take("k", rpm=60, burst=2, now=0.0) == pytest.approx(1.0)
+    assert buckets.take("k", rpm=60, burst=2, now=1.0) == 0
+
+
+def test_sqlite_buckets_persist(tmp_path):
+    path = str(tmp_path / "rate.db")
+    assert SqliteBuckets(path).take("k", rpm=60, burst=1, now=100.0) == 0
+    assert SqliteBuckets(path).take("k", rpm=60, burst=1, now=100.5) == pytest.approx(0.5)
+
+
+@pytest.mark.asyncio
+async def test_selection_returns_429_with_retry_after(ac, monkeypatch):
+    monkeypatch.setitem(ratelimit.POLICIES, "selection", Policy(60, 2, 600, 100, 4))
+    body = {"q_req": 10, "h_req": 10}
+    for _ in range(2):
+        assert (await ac.post("/api/selection/search", json=body)).status_code == 200
+    r = await ac.post("/api/selection/search", json=body)
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) >= 1
+    assert ratelimit.RATE_LIMITED.value(("selection", "user")) >= 1
+
+    # Another user of the same organization has a bucket of their own
+    token = create_access_token({"sub": "other@example.com", "org": 1})
+    r = await ac.post("/api/selection/search", json=body, headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_org_limit_and_concurrency(ac, monkeypatch):
+    monkeypatch.setitem(ratelimit.POLICIES, "selection", Policy(600, 100, 60, 1, 1))
+    body = {"q_req": 10, "h_req": 10}
+    first = {"Authorization": f"Bearer {create_access_token({'sub': 'a@example.com', 'org': 7})}"}
+    second = {"Authorization": f"Bearer {create_access_token({'sub': 'b@example.com', 'org': 7})}"}
+    assert (await ac.post("/api/selection/search", json=body, headers=first)).status_code == 200
+    assert (await ac.post("/api/selection/search", json=body, headers=second)).status_code == 429
+
+    ratelimit.reset()
+    assert ratelimit._slots.acquire("selection:org:7", 1)
+    try:
+        r = await ac.post("/api/selection/search", json=body, headers=first)
+        assert r.status_code == 429 and r.headers["Retry-After"] == "1"
+    finally:
+        ratelimit._slots.release("selection:org:7")
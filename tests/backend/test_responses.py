@@ -0,0 +1,31 @@
+import pytest
+
+from test_selection import save_pump
+
+
+@pytest.mark.asyncio
+async def test_pumps_columnar_and_projection(ac):
+    pid = await save_pump(ac, [0, 0, -0.01, 50], name="Columnar")
+    data = (await ac.get("/api/pumps", params={"format": "columnar", "fields": "id,name"})).json()
+    assert data["format"] == "columnar"
+    assert data["fields"] == ["id", "name"]
+    assert data["count"] == len(data["columns"][0])
+    assert pid in data["columns"][0]
+
+    rows = (await ac.get("/api/pumps", params={"fields": "id,name"})).json()
+    assert all(set(r) == {"id", "name"} for r in rows)
+    await ac.delete(f"/api/pumps/{pid}")
+
+
+@pytest.mark.asyncio
+async def test_gzip_negotiation(ac):
+    pids = [await save_pump(ac, [0, 0, -0.01, 50], name=f"Gzip {i}") for i in range(5)]
+    response = await ac.get("/api/pumps", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert isinstance(response.json(), list)  # httpx decodes transparently
+
+    raw = await ac.get("/api/pumps", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+    for pid in pids:
+        await ac.delete(f"/api/pumps/{pid}")
@@ -0,0 +1,324 @@
+import pytest
+import json
+
+
+async def save_pump(ac, h_coeffs, name="Test Pump", **extra):
+    payload = {
+        "name": name, "oem_name": name,
+        "q_text": "MODES",
+        "h_text": json.dumps(h_coeffs),
+        "eff_text": json.dumps([0, -0.02, 2, 0]),
+        "p2_text": json.dumps([0, 0, 0.1, 5]),
+        "npsh_text": json.dumps([0, 0.001, 0, 2]),
+        "q_min": "0", "q_max": "100",
+        "save": "true",
+    }
+    payload.update(extra)
+    response = await ac.post("/api/calculate", data=payload)
+    data = response.json()
+    assert data["id"] != "ERROR", data
+    return int(data["id"])
+
+
+@pytest.mark.asyncio
+async def test_search_sees_saved_and_deleted_pumps(ac):
+    pid = await save_pump(ac, [0, -0.01, 0, 49])  # H(30) = 40
+    response = await ac.post("/api/selection/search", json={"q_req": 30, "h_req": 40, "tolerance_percent": 1})
+    match = [r for r in response.json() if r["pump"]["id"] == pid]
+    assert len(match) == 1
+    assert match[0]["h_at_point"] == pytest.approx(40)
+    assert match[0]["power_at_point"] == pytest.approx(8)
+    assert match[0]["eff_at_point"] == pytest.approx(42)
+
+    await ac.delete(f"/api/pumps/{pid}")
+    response = await ac.post("/api/selection/search", json={"q_req": 30, "h_req": 40, "tolerance_percent": 1})
+    assert pid not in [r["pump"]["id"] for r in response.json()]
+
+
+@pytest.mark.asyncio
+async def test_search_sorted_by_deviation(ac):
+    far = await save_pump(ac, [0, 0, 0, 43])
+    near = await save_pump(ac, [0, 0, 0, 41])
+    response = await ac.post("/api/selection/search", json={"q_req": 10, "h_req": 40, "tolerance_percent": 10})
+    ids = [r["pump"]["id"] for r in response.json()]
+    assert ids.index(near) < ids.index(far)
+    for pid in (far, near):
+        await ac.delete(f"/api/pumps/{pid}")
+
+
+@pytest.mark.asyncio
+async def test_combos_find_parallel_and_series_stations(ac):
+    pid = await save_pump(ac, [0, -0.01, 0, 49], name="Station")  # H(30) = 40
+    parallel = (await ac.post("/api/selection/combos", json={
+        "q_req": 60, "h_req": 40, "tolerance_percent": 1, "arrangements": ["parallel"]})).json()
+    match = [r for r in parallel if r["pump"]["id"] == pid]
+    assert [(r["count"], r["arrangement"]) for r in match] == [(2, "parallel")]
+    assert match[0]["flow_per_pump"] == pytest.approx(30)
+    assert match[0]["power_at_point"] == pytest.approx(16)
+
+    series = (await ac.post("/api/selection/combos", json={"q_req": 30, "h_req": 80, "tolerance_percent": 1})).json()
+    match = [r for r in series if r["pump"]["id"] == pid]
+    assert [(r["count"], r["arrangement"]) for r in match] == [(2, "series")]
+    assert match[0]["head_per_pump"] == pytest.approx(40)
+    single = await ac.post("/api/selection/combos", json={"q_req": 30, "h_req": 40, "min_pumps": 1})
+    assert single.status_code == 422  # One pump is not a station
+    await ac.delete(f"/api/pumps/{pid}")
+
+
+@pytest.mark.asyncio
+async def test_combination_operating_point(ac):
+    pid = await save_pump(ac, [0, -0.01, 0, 49], name="Pair")
+    # 2 x (49 - 0.01 Q^2) in parallel = 49 - 0.0025 Q^2, meets 10 + k Q^2 through (60, 40) at Q = 60
+    data = (await ac.post("/api/selection/combination", json={
+        "pump_ids": [pid, pid], "arrangement": "parallel", "q_req": 60, "h_req": 40, "h_st": 10})).json()
+    op = data["operating_point"]
+    assert op["q"] == pytest.approx(60, rel=1e-3)
+    assert op["h"] == pytest.approx(40, rel=1e-3)
+    assert [p["q"] for p in op["pumps"]] == pytest.approx([30, 30], rel=1e-3)
+    assert op["p2_total"] == pytest.approx(16, rel=1e-3)
+
+    missing = await ac.post("/api/selection/combination", json={"pump_ids": [999999], "q_req": 1, "h_req": 1})
+    assert missing.status_code == 404
+    await ac.delete(f"/api/pumps/{pid}")
+
+
+@pytest.mark.asyncio
+async def test_lifecycle_mode_ranks_by_total_cost(ac):
+    import json
+    frugal = await save_pump(ac, [0, -0.01, 0, 49], name="Frugal", price="1000")  # P2(30) = 8 kW
+    cheap = await save_pump(ac, [0, -0.01, 0, 49], name="Cheap", price="100", p2_text=json.dumps([0, 0, 0.2, 5]))  # 11 kW
+    request = {"q_req": 30, "h_req": 40, "tolerance_percent": 1,
+               "load_profile": [{"q": 30, "h": 40, "hours": 1000}], "years": 1}
+
+    async def ranking(tariff):
+        results = (await ac.post("/api/selection/search", json={**request, "tariff": tariff})).json()
+        return [r for r in results if r["pump"]["id"] in (frugal, cheap)]
+
+    expensive_energy = await ranking(1.0)
+    assert [r["pump"]["id"] for r in expensive_energy] == [frugal, cheap]
+    assert expensive_energy[0]["annual_energy_kwh"] == pytest.approx(8000)
+    assert expensive_energy[0]["price"] == 1000
+    assert expensive_energy[0]["lifecycle_cost"] == pytest.approx(9000)
+    assert [r["pump"]["id"] for r in await ranking(0.01)] == [cheap, frugal]
+    for pid in (frugal, cheap):
+        await ac.delete(f"/api/pumps/{pid}")
+
+
+@pytest.mark.asyncio
+async def test_npsh_margin_filter_and_ranking(ac):
+    import json
+    low = await save_pump(ac, [0, -0.01, 0, 49], name="LowNPSH")  # NPSHr(30) = 2.9
+    high = await save_pump(ac, [0, -0.01, 0, 49], name="HighNPSH", npsh_text=json.dumps([0, 0.001, 0, 5]))  # 5.9
+    base = {"q_req": 30, "h_req": 40, "tolerance_percent": 1}
+
+    async def found(**extra):
+        results = (await ac.post("/api/selection/search", json={**base, **extra})).json()
+        return [r for r in results if r["pump"]["id"] in (low, high)]
+
+    filtered = await found(npsh_available=5)
+    assert [r["pump"]["id"] for r in filtered] == [low]
+    assert filtered[0]["npsh_required"] == pytest.approx(2.9)
+    assert filtered[0]["npsh_margin"] == pytest.approx(2.1)
+
+    # 3 m suction lift with 1 m losses at sea level: NPSHa ~ 6.1 m
+    ranked = await found(suction={"static_head": -3, "losses": 1}, npsh_margin=0, sort_by="npsh_margin")
+    assert [r["pump"]["id"] for r in ranked] == [low, high]
+    assert ranked[1]["npsh_margin"] == pytest.approx(0.21, abs=0.01)
+
+    bad = await ac.post("/api/selection/search", json={**base, "sort_by": "npsh_margin"})
+    assert bad.status_code == 400
+    for pid in (low, high):
+        await ac.delete(f"/api/pumps/{pid}")
+
+
+async def save_qh_only(ac, name, **extra):
+    """Pump saved from Q-H points only: the other curves are stored as zero coefficients."""
+    return await save_pump(ac, None, name=name, q_text="0 10 20 30 40", h_text="49 48 45 40 33",
+                           eff_text="", p2_text="", npsh_text="", **extra)
+
+
+@pytest.mark.asyncio
+async def test_pump_without_npsh_curve_has_unknown_margin(ac):
+    known = await save_pump(ac, [0, -0.01, 0, 49], name="KnownNPSH")  # NPSHr(30) = 2.9
+    unknown = await save_qh_only(ac, "NoNPSH")
+    results = (await ac.post("/api/selection/search", json={
+        "q_req": 30, "h_req": 40, "tolerance_percent": 1, "npsh_available": 6, "sort_by": "npsh_margin"})).json()
+    ranked = [r for r in results if r["pump"]["id"] in (known, unknown)]
+    assert [r["pump"]["id"] for r in ranked] == [known, unknown]
+    assert ranked[1]["npsh_required"] is None and ranked[1]["npsh_margin"] is None
+    for pid in (known, unknown):
+        await ac.delete(f"/api/pumps/{pid}")
+
+
+@pytest.mark.asyncio
+async def test_pump_without_p2_curve_has_unknown_lifecycle_cost(ac):
+    known = await save_pump(ac, [0, -0.01, 0, 49], name="KnownP2", price="1000")  # P2(30) = 8 kW
+    unknown = await save_qh_only(ac, "NoP2", price="100")
+    results = (await ac.post("/api/selection/search", json={
+        "q_req": 30, "h_req": 40, "tolerance_percent": 1, "sort_by": "lifecycle_cost",
+        "load_profile": [{"q": 30, "h": 40, "hours": 1000}], "years": 1, "tariff": 1.0})).json()
+    ranked = [r for r in results if r["pump"]["id"] in (known, unknown)]
+    assert [r["pump"]["id"] for r in ranked] == [known, unknown]
+    assert ranked[0]["lifecycle_cost"] == pytest.approx(9000)
+    assert ranked[1]["annual_energy_kwh"] is None and ranked[1]["lifecycle_cost"] is None
+    assert ranked[1]["power_at_point"] is None
+    for pid in (known, unknown):
+        await ac.delete(f"/api/pumps/{pid}")
+
+
+@pytest.mark.asyncio
+async def test_bep_computed_on_save_and_region_filter(ac):
+    pid = await save_pump(ac, [0, -0.01, 0, 49], name="BEP")  # eff = -0.02 Q^2 + 2 Q: BEP at Q = 50
+    saved = [p for p in (await ac.get("/api/pumps")).json() if p["id"] == pid][0]
+    assert (saved["bep_q"], saved["por_q_min"], saved["por_q_max"]) == pytest.approx((50, 35, 60))
+
+    async def ids(**extra):
+        results = (await ac.post("/api/selection/search", json={
+            "q_req": 30, "h_req": 40, "tolerance_percent": 1, **extra})).json()
+        return {r["pump"]["id"]: r for r in results}
+
+    assert pid not in await ids(operating_region="preferred")  # 30 m3/h is 60% of BEP
+    allowable = await ids(operating_region="allowable")
+    assert allowable[pid]["bep_percent"] == pytest.approx(60)
+    assert pid in await ids(bep_percent_min=50, bep_percent_max=70)
+    assert pid not in await ids(bep_percent_min=70)
+    await ac.delete(f"/api/pumps/{pid}")
+
+
+@pytest.mark.asyncio
+async def test_constraints_filter_before_curves(ac):
+    # Same curves (eff(30) = 42 %, BEP efficiency 50 %), different specs
+    a = await save_pump(ac, [0, -0.01, 0, 49], name="Constr A", company="ACME", rpm="2900", dn_suction="DN80", price="900")
+    b = await save_pump(ac, [0, -0.01, 0, 49], name="Constr B", company="Other", rpm="1450", dn_suction="DN100", price="500")
+    c = await save_pump(ac, [0, -0.01, 0, 49], name="Constr C", company=" acme ", rpm="2 900 об/мин", dn_suction='4"')
+
+    async def ids(**constraints):
+        results = (await ac.post("/api/selection/search", json={
+            "q_req": 30, "h_req": 40, "tolerance_percent": 1, "constraints": constraints})).json()
+        return {r["pump"]["id"] for r in results} & {a, b, c}
+
+    assert await ids() == {a, b, c}
+    assert await ids(rpm={"min": 2800, "max": 3000}) == {a, c}
+    assert await ids(rpm={"min": 2800}, dn_suction={"max": 90}) == {a}
+    assert await ids(companies=["Acme"]) == {a, c}
+    assert await ids(max_price=600) == {b}  # c has no price
+    assert await ids(min_efficiency=40) == {a, b, c}
+    assert await ids(min_efficiency=45) == set()
+    for pid in (a, b, c):
+        await ac.delete(f"/api/pumps/{pid}")
+
+
+@pytest.mark.asyncio
+async def test_pareto_mode_returns_non_dominated_pumps(ac):
+    # Same H; efficiency and power at Q = 30: eff 42/51/42 %, P2 8/8/11 kW
+    base = await save_pump(ac, [0, -0.01, 0, 49], name="Pareto base", price="1000")
+    better = await save_pump(ac, [0, -0.01, 0, 49], name="Pareto eff", price="2000", eff_text=json.dumps([0, -0.01, 2, 0]))
+    worse = await save_pump(ac, [0, -0.01, 0, 49], name="Pareto worse", price="900", p2_text=json.dumps([0, 0, 0.2, 5]))
+
+    async def search(**extra):
+        response = await ac.post("/api/selection/search", json={"q_req": 30, "h_req": 40, "tolerance_percent": 1, **extra})
+        assert response.status_code == 200, response.text
+        return [r for r in response.json() if r["pump"]["id"] in (base, better, worse)]
+
+    front = await search(objectives=["efficiency", "power"])
+    assert [r["pump"]["id"] for r in front] == [better]  # better dominates both others
+    front = await search(objectives=["efficiency", "power", "price"])
+    assert {r["pump"]["id"] for r in front} == {base, better, worse}
+    assert front[0]["pump"]["id"] == better and all(r["price"] for r in front)
+    ranked = await search(sort_by="pareto", objectives=["efficiency", "price"], weights={"price": 1})
+    assert [r["pump"]["id"] for r in ranked] == [worse, better]  # base is dominated by worse (same eff, dearer)
+    assert ranked[0]["score"] == 0
+    bad = await ac.post("/api/selection/search", json={"q_req": 30, "h_req": 40, "objectives": ["lifecycle_cost"]})
+    assert bad.status_code == 400
+    for pid in (base, better, worse):
+        await ac.delete(f"/api/pumps/{pid}")
+
+
+@pytest.mark.asyncio
+async def test_pareto_front_skips_pumps_without_data(ac):
+    known = await save_pump(ac, [0, -0.01, 0, 49], name="Pareto known")  # eff 42 %, P2 8 kW
+    unknown = await save_qh_only(ac, "Pareto no data")
+    results = (await ac.post("/api/selection/search", json={
+        "q_req": 30, "h_req": 40, "tolerance_percent": 1, "objectives": ["efficiency", "power"]})).json()
+    assert [r["pump"]["id"] for r in results if r["pump"]["id"] in (known, unknown)] == [known]
+    for pid in (known, unknown):
+        await ac.delete(f"/api/pumps/{pid}")
+
+
+@pytest.mark.asyncio
+async def test_search_results_cached_per_revision(ac):
+    import selection_cache
+    first = await save_pump(ac, [0, -0.01, 0, 49], name="Cached A")
+    request = {"q_req": 30, "h_req": 40, "tolerance_percent": 1}
+    hits = selection_cache.CACHE_LOOKUPS.value(("search", "hit"))
+
+    miss = await ac.post("/api/selection/search", json=request)
+    hit = await ac.post("/api/selection/search", json={"tolerance_percent": 1.0, "h_req": 40.0, "q_req": 30})
+    assert (miss.headers["x-cache"], hit.headers["x-cache"]) == ("MISS", "HIT")
+    assert hit.content == miss.content
+    assert selection_cache.CACHE_LOOKUPS.value(("search", "hit")) == hits + 1
+    columnar = await ac.post("/api/selection/search?format=columnar", json=request)
+    assert columnar.headers["x-cache"] == "MISS"
+
+    # A save bumps the revision: the next search is recomputed and sees the new pump
+    second = await save_pump(ac, [0, -0.01, 0, 49], name="Cached B")
+    after = await ac.post("/api/selection/search", json=request)
+    assert after.headers["x-cache"] == "MISS"
+    assert {first, second} <= {r["pump"]["id"] for r in after.json()}
+    for pid in (first, second):
+        await ac.delete(f"/api/pumps/{pid}")
+    assert first not in {r["pump"]["id"] for r in (await ac.post("/api/selection/search", json=request)).json()}
+
+
+def test_cache_entries_scoped_per_org():
+    import selection_cache
+    from routers.selection import SearchRequest
+    selection_cache.clear()
+    req = SearchRequest(q_req=30, h_req=40)
+    org1, org2 = (selection_cache.request_key("search", org, 5, "json", req) for org in (1, 2))
+    selection_cache.put(org1, b"[1]", "application/json")
+    selection_cache.put(org2, b"[2]", "application/json")
+    assert selection_cache.get(org1)[0] == b"[1]" and selection_cache.get(org2)[0] == b"[2]"
+    # A save in org 1 (newer revision) retires only org 1's entries
+    selection_cache.put(selection_cache.request_key("search", 1, 6, "json", req), b"[3]", "application/json")
+    assert selection_cache.get(org1) is None and selection_cache.get(org2)[0] == b"[2]"
+
+
+@pytest.mark.asyncio
+async def test_selection_needs_login_and_sees_own_org_only(ac):
+    from main import app
+    from auth_utils import get_current_active_user
+    from models import User
+    pid = await save_pump(ac, [0, -0.01, 0, 49], name="Org 1 only", price="12345")
+    request = {"q_req": 30, "h_req": 40, "tolerance_percent": 1, "sort_by": "pareto", "objectives": ["price"],
+               "load_profile": [{"q": 30, "h": 40, "hours": 1000}]}
+    own = (await ac.post("/api/selection/search", json=request)).json()
+    assert [r["price"] for r in own if r["pump"]["id"] == pid] == [12345]
+
+    app.dependency_overrides[get_current_active_user] = lambda: User(
+        id=2, email="other@example.com", hashed_password="", role="user", org_id=2)
+    other = await ac.post("/api/selection/search", json=request)
+    assert other.status_code == 200 and pid not in {r["pump"]["id"] for r in other.json()}
+    app.dependency_overrides.pop(get_current_active_user)
+    assert (await ac.post("/api/selection/search", json=request)).status_code == 401
+
+    from conftest import TEST_USER
+    app.dependency_overrides[get_current_active_user] = lambda: TEST_USER
+    await ac.delete(f"/api/pumps/{pid}")
+
+
+@pytest.mark.asyncio
+async def test_combinations_see_own_org_only(ac):
+    from main import app
+    from auth_utils import get_current_active_user
+    from conftest import TEST_USER
+    from models import User
+    pid = await save_pump(ac, [0, -0.01, 0, 49], name="Org 1 pair")
+    app.dependency_overrides[get_current_active_user] = lambda: User(
+        id=2, email="other@example.com", hashed_password="", role="user", org_id=2)
+    curve = await ac.post("/api/selection/combination", json={"pump_ids": [pid, pid], "q_req": 60, "h_req": 40})
+    assert curve.status_code == 404
+    combos = await ac.post("/api/selection/combos", json={"q_req": 60, "h_req": 40, "tolerance_percent": 1})
+    assert pid not in {r["pump"]["id"] for r in combos.json()}
+    app.dependency_overrides[get_current_active_user] = lambda: TEST_USER
+    await ac.delete(f"/api/pumps/{pid}")
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from test_selection import save_pump
+
+
+@pytest.mark.asyncio
+async def test_similar_pumps_ranked_by_curve_fingerprint(ac):
+    base = await save_pump(ac, [0, -0.002, 0, 40], "Similar base")
+    near = await save_pump(ac, [0, -0.002, 0, 41], "Similar near")
+    far = await save_pump(ac, [0, -0.02, 0, 200], "Similar far")
+
+    r = await ac.get(f"/api/pumps/{base}/similar?k=50")
+    assert r.status_code == 200
+    ranked = [item["pump"]["id"] for item in r.json()["results"]]
+    assert base not in ranked
+    assert ranked.index(near) < ranked.index(far)
+    first = r.json()["results"][0]
+    assert first["pump"]["id"] == near and 0 < first["similarity"] <= 1
+
+    assert (await ac.get("/api/pumps/999999/similar")).status_code == 404
+    for pid in (base, near, far):
+        await ac.delete(f"/api/pumps/{pid}")
+
+
+class FakeCatalogue:
+    def __init__(self, n, seed=1):
+        rng = np.random.default_rng(seed)
+        self.h = np.zeros((n, 4)); self.h[:, 2] = -rng.uniform(0.001, 0.01, n); self.h[:, 3] = rng.uniform(10, 100, n)
+        self.eff = np.zeros((n, 4)); self.eff[:, 1] = -0.02; self.eff[:, 2] = 2
+        self.p2 = np.zeros((n, 4)); self.p2[:, 2] = 0.1; self.p2[:, 3] = rng.uniform(1, 10, n)
+        self.has_h = self.has_eff = self.has_p2 = np.ones(n, dtype=bool)
+        self.q_min = np.zeros(n)
+        self.q_max = rng.uniform(50, 100, n)
+
+    def __len__(self):
+        return len(self.q_max)
+
+
+def test_fingerprint_knn_matches_brute_force():
+    from similarity_utils import Fingerprints, BLOCKS, WEIGHTS
+
+    fp = Fingerprints(FakeCatalogue(500))
+    rows, dist = fp.nearest(0, 5)
+    x = fp.matrix.astype(float)
+    brute = sum(WEIGHTS[b] * ((x[:, s] - x[0, s]) ** 2).mean(axis=1) for b, s in BLOCKS.items())
+    brute[0] = np.inf
+    assert rows.tolist() == np.argsort(brute)[:5].tolist()
+    assert np.allclose(dist, np.sqrt(np.sort(brute)[:5]), atol=1e-3)
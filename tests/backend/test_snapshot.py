@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+import pytest
+from sqlmodel import Session
+
+import catalogue
+from db_utils import get_pumps_engine
+from test_selection import save_pump
+
+
+@pytest.mark.asyncio
+async def test_catalogue_snapshot_shared_read_only(ac):
+    pid = await save_pump(ac, [0, -0.01, 0, 49], name="Snapshot", rpm="2900")
+    with Session(get_pumps_engine()) as session:
+        built = catalogue.load_catalogue(session, 1)
+        path = catalogue.snapshot_dir(1, built.revision)
+        assert os.path.isfile(os.path.join(path, "h.npy"))
+
+        catalogue.clear_cache() # As a freshly started worker
+        mapped = catalogue.load_catalogue(session, 1)
+    assert isinstance(mapped.h, np.memmap) and not mapped.h.flags.writeable
+    for name in catalogue.ARRAY_FIELDS:
+        assert np.array_equal(getattr(mapped, name), getattr(built, name),
+                              equal_nan=name not in ("company", "curve_hash")), name
+    # Records are not loaded with the arrays, only on demand for given rows
+    assert mapped._records == {}
+    row = int(np.searchsorted(mapped.ids, pid))
+    assert mapped.rpm_value[row] == 2900
+    assert [r["name"] for r in mapped.records_at([row])] == ["Snapshot"]
+
+    # A save moves the scope to a new revision and retires the old snapshot
+    await ac.delete(f"/api/pumps/{pid}")
+    with Session(get_pumps_engine()) as session:
+        newer = catalogue.load_catalogue(session, 1)
+    assert newer.revision > built.revision and pid not in newer.ids
+    assert os.path.isdir(catalogue.snapshot_dir(1, newer.revision)) and not os.path.isdir(path)
@@ -0,0 +1,35 @@
+import pytest
+
+from spec_utils import numeric_specs, parse_spec
+from test_selection import save_pump
+
+
+def test_parse_spec_units():
+    assert parse_spec("rpm", "2 900 об/мин") == 2900
+    assert parse_spec("p2_nom", "5,5 кВт") == 5.5
+    assert parse_spec("p2_nom", "750 W") == 0.75
+    assert parse_spec("p2_nom", "75 hp") == pytest.approx(55.93, abs=0.01)
+    assert parse_spec("dn_suction", "DN-100") == 100
+    assert parse_spec("dn_discharge", '4"') == 100
+    assert parse_spec("impeller_actual", "25 см") == 250
+    assert parse_spec("rpm", "n/a") is None
+    assert numeric_specs({"rpm": "1450"})["dn_suction_mm"] is None
+
+
+@pytest.mark.asyncio
+async def test_archive_range_filters(ac):
+    fast = await save_pump(ac, [0, -0.01, 0, 49], "Spec fast", rpm="2900 rpm", dn_suction="DN80", p2_nom="7,5 кВт")
+    slow = await save_pump(ac, [0, -0.01, 0, 49], "Spec slow", rpm="1450", dn_suction='6"', p2_nom="4 kW")
+    blank = await save_pump(ac, [0, -0.01, 0, 49], "Spec blank")
+
+    ids = lambda r: {p["id"] for p in r.json()}
+    r = await ac.get("/api/pumps", params={"rpm_min": 2800, "rpm_max": 3000, "dn_suction_max": 100})
+    assert fast in ids(r) and slow not in ids(r) and blank not in ids(r)
+    r = await ac.get("/api/pumps", params={"dn_suction_min": 150, "p2_nom_max": 5})
+    assert ids(r) & {fast, slow, blank} == {slow}
+    unfiltered = await ac.get("/api/pumps")
+    assert {fast, slow, blank} <= ids(unfiltered)
+    assert r.headers["etag"] != unfiltered.headers["etag"]
+    assert (await ac.get("/api/pumps", params={"rpm_min": "fast"})).status_code == 422
+    for pid in (fast, slow, blank):
+        await ac.delete(f"/api/pumps/{pid}")
@@ -0,0 +1,50 @@
+import pytest
+
+from test_selection import save_pump
+
+
+@pytest.mark.asyncio
+async def test_listing_etag_returns_304_until_changed(ac):
+    first = await ac.get("/api/pumps")
+    etag = first.headers["etag"]
+    assert (await ac.get("/api/pumps", headers={"If-None-Match": etag})).status_code == 304
+
+    pid = await save_pump(ac, [0, 0, -0.01, 50], name="ETag")
+    changed = await ac.get("/api/pumps", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    await ac.delete(f"/api/pumps/{pid}")
+
+
+@pytest.mark.asyncio
+async def test_changes_feed_reports_upserts_and_deletes(ac):
+    base = int((await ac.get("/api/pumps")).headers["x-catalogue-revision"])
+    kept = await save_pump(ac, [0, 0, -0.01, 50], name="Kept")
+    gone = await save_pump(ac, [0, 0, -0.01, 50], name="Gone")
+    await ac.delete(f"/api/pumps/{gone}")
+
+    data = (await ac.get("/api/pumps/changes", params={"since": base})).json()
+    assert not data["reset"]
+    assert [p["id"] for p in data["upserts"]] == [kept]
+    assert data["upserts"][0]["name"] == "Kept"  # private data merged
+    assert data["deletes"] == [gone]
+
+    empty = (await ac.get("/api/pumps/changes", params={"since": data["revision"]})).json()
+    assert empty["upserts"] == [] and empty["deletes"] == []
+    assert (await ac.get("/api/pumps/changes", params={"since": data["revision"] + 100})).json()["reset"]
+    await ac.delete(f"/api/pumps/{kept}")
+
+
+@pytest.mark.asyncio
+async def test_changes_feed_resets_after_database_replace(ac):
+    backup = (await ac.get("/api/admin/export_db")).content
+    pid = await save_pump(ac, [0, 0, -0.01, 50], name="Not in backup")
+    synced = (await ac.get("/api/pumps/changes", params={"since": 0})).json()["revision"]
+
+    replaced = await ac.post("/api/admin/import_db", files={"file": ("pumps.db", backup)}, data={"merge": "false"})
+    assert replaced.json()["status"] == "ok"
+    data = (await ac.get("/api/pumps/changes", params={"since": synced})).json()
+    assert data["reset"] and data["revision"] > synced
+    assert pid not in {p["id"] for p in (await ac.get("/api/pumps")).json()}
+    # Clients that reloaded after the replace sync incrementally again
+    assert not (await ac.get("/api/pumps/changes", params={"since": data["revision"]})).json()["reset"]
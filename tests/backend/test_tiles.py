@@ -0,0 +1,67 @@
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+import pytest
+
+import tile_utils
+from test_drawings import PDF
+
+
+def test_encode_png_roundtrip():
+    rgb = np.random.default_rng(0).integers(0, 256, (5, 7, 3), dtype=np.uint8)
+    png = tile_utils.encode_png(rgb)
+    assert png.startswith(b"\x89PNG\r\n\x1a\n")
+    width, height = struct.unpack(">II", png[16:24])
+    assert (width, height) == (7, 5)
+    idat_len = struct.unpack(">I", png[33:37])[0]
+    raw = np.frombuffer(zlib.decompress(png[41:41 + idat_len]), dtype=np.uint8).reshape(5, 22)
+    assert (raw[:, 0] == 0).all() and (raw[:, 1:].reshape(5, 7, 3) == rgb).all()
+
+
+def test_pyramid_levels():
+    # A0 at 150 dpi: 7022 x 4967 px -> 28 x 20 tiles at full resolution, one tile at level 0
+    width, height, max_level = tile_utils.pyramid(3370.4, 2383.9, 150)
+    assert (width, height, max_level) == (7022, 4967, 5)
+    assert tile_utils.level_info(width, height, max_level, max_level)[3:] == (28, 20)
+    assert tile_utils.level_info(width, height, max_level, 0)[3:] == (1, 1)
+
+
+def test_lru_eviction_keeps_recent_tiles(monkeypatch, tmp_path):
+    monkeypatch.setattr(tile_utils, "cache_dir", lambda: str(tmp_path))
+    paths = []
+    for i in range(10):
+        path = tmp_path / "1" / f"{i}.png"
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+        paths.append(path)
+    os.utime(paths[0])  # recently used
+    freed = tile_utils.evict(max_bytes=500)
+    assert freed == 600
+    assert paths[0].exists() and paths[9].exists() and not paths[1].exists()
+
+
+def test_eviction_counts_extracted_sources(monkeypatch, tmp_path):
+    monkeypatch.setattr(tile_utils, "cache_dir", lambda: str(tmp_path))
+    source = tmp_path / "7" / "source.pdf"
+    source.parent.mkdir()
+    source.write_bytes(b"%" * 1000)
+    os.utime(source, (time.time() - 100, time.time() - 100))
+    tile = tmp_path / "7" / "p1_150" / "0" / "0_0.png"
+    tile.parent.mkdir(parents=True)
+    tile.write_bytes(b"x" * 100)
+    assert tile_utils._scan_size() == 1100
+    assert tile_utils.evict(max_bytes=500) == 1000
+    assert tile.exists() and not source.exists()
+
+
+@pytest.mark.asyncio
+async def test_tile_endpoints(ac):
+    info = (await ac.post("/api/drawings", files={"file": ("sheet.pdf", PDF, "application/pdf")})).json()
+    if not tile_utils.available():
+        assert (await ac.get(f"/api/drawings/{info['id']}/pages/1/info")).status_code == 503
+        return
+    assert (await ac.get("/api/drawings/999999/pages/1/info")).status_code == 404